@@ -0,0 +1,115 @@
+import threading
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core.cache import cache
+from .models import *
+
+# the trie of subreddit names for this process, and the search generation it
+# was built for (see tasks.get_top_submissions)
+_trie = None
+_trie_generation = None
+_trie_lock = threading.Lock()
+
+
+class PrefixTrie(object):
+    """A trie of names which answers prefix queries with the best matches.
+
+    Each node keeps the highest scoring names below it, up to limit, so a
+    completion only walks the characters of the prefix.
+
+    Args:
+        names: an iterable of (name, score) tuples;
+        limit: the most completions which can be returned for a prefix
+    """
+
+    def __init__(self, names, limit):
+        self.limit = limit
+        self.root = ({}, [])
+        for name, score in sorted(names, key=lambda n: (-n[1], n[0].lower())):
+            self.insert(name)
+
+    def insert(self, name):
+        """Adds a name, which must score no higher than any added before."""
+        node = self.root
+        for char in name.lower():
+            if len(node[1]) < self.limit:
+                node[1].append(name)
+            node = node[0].setdefault(char, ({}, []))
+        if len(node[1]) < self.limit:
+            node[1].append(name)
+
+    def complete(self, prefix) -> list:
+        """Finds the highest scoring names starting with a prefix.
+
+        Args:
+            prefix: the start of a name, in any case
+
+        Returns:
+            list: up to limit names, best first
+        """
+        node = self.root
+        for char in prefix.lower():
+            node = node[0].get(char)
+            if node is None:
+                return []
+        return list(node[1])
+
+
+def subreddit_trie() -> PrefixTrie:
+    """Gets the trie of subreddit names, rebuilding it after each ingest.
+
+    Returns:
+        PrefixTrie: every subreddit name, ranked by score
+    """
+    global _trie, _trie_generation
+    generation = cache.get_or_set("search_generation", 0, None)
+    if _trie is None or _trie_generation != generation:
+        with _trie_lock:
+            if _trie is None or _trie_generation != generation:
+                names = Subreddit.objects.values_list('name', 'score')
+                _trie = PrefixTrie(names, settings.AUTOCOMPLETE_LIMIT)
+                _trie_generation = generation
+    return _trie
+
+
+def subreddits(query) -> list:
+    """Finds subreddit names which complete, or are similar to, a query.
+
+    Args:
+        query: the partially typed subreddit name
+
+    Returns:
+        list: up to settings.AUTOCOMPLETE_LIMIT subreddit names
+    """
+    names = subreddit_trie().complete(query)
+
+    # fall back to the trigram index for misspelled names
+    limit = settings.AUTOCOMPLETE_LIMIT
+    if len(names) < limit and len(query) >= 3:
+        similar = Subreddit.objects.filter(name__trigram_similar=query) \
+            .exclude(name__in=names) \
+            .annotate(similarity=TrigramSimilarity('name', query)) \
+            .order_by('-similarity', '-score') \
+            .values_list('name', flat=True)[:limit - len(names)]
+        names.extend(similar)
+    return names
+
+
+def submissions(query) -> list:
+    """Finds submissions whose titles contain a query.
+
+    The search is answered by the trigram index on UPPER(title), so it needs
+    at least three characters.
+
+    Args:
+        query: the partially typed title
+
+    Returns:
+        list: up to settings.AUTOCOMPLETE_LIMIT dicts of submission id and
+            title, highest scoring first
+    """
+    if len(query) < 3:
+        return []
+    return list(Submission.objects.filter(title__icontains=query)
+                .order_by('-score')
+                .values('id', 'title')[:settings.AUTOCOMPLETE_LIMIT])
@@ -0,0 +1,478 @@
+import array
+import itertools
+import os
+import pickle
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.cache import RedisCache
+from django_redis.compressors.base import BaseCompressor
+from django_redis.exceptions import CompressorError
+from django_redis.serializers.pickle import PickleSerializer
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# sentinel for values missing from the local tier, since None can't be used
+_MISSING = object()
+
+# values the local tier can share between readers without copying them
+_IMMUTABLE = (str, bytes, int, float, type(None))
+
+# one local tier per process and Redis location, shared by every thread's
+# cache instance (Django creates a separate backend instance per thread)
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class LocalTier(object):
+    """A bounded, thread-safe LRU cache with a short per-entry expiry.
+
+    Mutable values are stored pickled, so like values read from Redis, each
+    read gets its own copy which may be mutated without affecting other
+    readers. Unpickling costs less than a read from Redis (about 15ms against
+    40ms for a year of cumulative data), but more than sharing one object,
+    so immutable values, such as names, are stored as they are.
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.origin = uuid.uuid4().hex
+        self.pid = os.getpid()
+        self.listener = None
+        self.stats = _new_stats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, tier, result):
+        """Increments one of the hit/miss counters in self.stats.
+
+        Args:
+            tier: the tier the lookup was made against, 'local' or 'redis';
+            result: the outcome of the lookup, 'hits' or 'misses'
+        """
+        with self._lock:
+            self.stats[tier][result] += 1
+
+    def get(self, key):
+        """Retrieves a value, refreshing its position in the LRU order.
+
+        Args:
+            key: the full (prefixed and versioned) cache key
+
+        Returns:
+            the cached value, or _MISSING if it is absent or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, pickled, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+        return pickle.loads(value) if pickled else value
+
+    def set(self, key, value, timeout=None):
+        """Stores a value, evicting the least recently used entry if full.
+
+        Args:
+            key: the full (prefixed and versioned) cache key;
+            value: the value to store;
+            timeout: seconds the value may live in this tier, capped at the
+                tier's own timeout
+        """
+        if timeout is None or timeout > self.timeout:
+            timeout = self.timeout
+        if timeout <= 0:
+            self.delete(key)
+            return
+
+        pickled = not isinstance(value, _IMMUTABLE)
+        if pickled:
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, pickled, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TwoTierRedisCache(RedisCache):
+    """A django_redis cache with an in-process LRU tier in front of Redis.
+
+    Reads are served from the local tier when possible and fall back to Redis.
+    Every write or delete publishes the affected keys on a Redis pub/sub
+    channel, which each process listens to in order to evict stale local
+    copies. Hit and miss counters for both tiers are available from stats().
+
+    Extra OPTIONS:
+        LOCAL_MAX_ENTRIES: maximum number of values kept in-process;
+        LOCAL_TIMEOUT: maximum seconds a value is kept in-process;
+        INVALIDATION_CHANNEL: name of the pub/sub channel for evictions
+    """
+
+    def __init__(self, server, params):
+        super(TwoTierRedisCache, self).__init__(server, params)
+        options = params.get("OPTIONS", {})
+        self._local_max_entries = int(options.get("LOCAL_MAX_ENTRIES", 256))
+        self._local_timeout = float(options.get("LOCAL_TIMEOUT", 10))
+        self._channel = options.get("INVALIDATION_CHANNEL",
+                                    "cache_invalidation")
+
+    @property
+    def local(self) -> LocalTier:
+        """The local tier for this process, started on first use."""
+        tier_id = (str(self._server), self._channel)
+        tier = _local_tiers.get(tier_id)
+        if tier is None or tier.pid != os.getpid():
+            with _local_tiers_lock:
+                tier = _local_tiers.get(tier_id)
+                # a forked child must not reuse its parent's tier or listener
+                if tier is None or tier.pid != os.getpid():
+                    tier = LocalTier(self._local_max_entries,
+                                     self._local_timeout)
+                    tier.listener = threading.Thread(
+                        target=self._listen, args=(tier,), daemon=True)
+                    tier.listener.start()
+                    _local_tiers[tier_id] = tier
+        return tier
+
+    def _listen(self, tier):
+        """Evicts local entries when other processes publish invalidations.
+
+        Runs in a daemon thread for the lifetime of the process. If the
+        subscription is lost, the local tier is cleared since invalidations
+        may have been missed in the meantime.
+        """
+        while True:
+            try:
+                pubsub = self.client.get_client(write=True).pubsub(
+                    ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                for message in pubsub.listen():
+                    origin, _, keys = message['data'].decode().partition(':')
+                    if origin == tier.origin:
+                        continue
+                    for key in keys.split('\n'):
+                        if key == '*':
+                            tier.clear()
+                        else:
+                            tier.delete(key)
+            except Exception:
+                tier.clear()
+                time.sleep(1)
+
+    def _publish(self, *keys):
+        """Notifies other processes that the given keys have changed, in one
+        message of newline separated keys."""
+        if keys:
+            self.client.get_client(write=True).publish(
+                self._channel, "%s:%s" % (self.local.origin, '\n'.join(keys)))
+
+    def _local_key(self, key, version=None) -> str:
+        return str(self.client.make_key(key, version=version))
+
+    def _count(self, tier, result):
+        self.local.count(tier, result)
+
+    def stats(self) -> dict:
+        """Returns hit and miss counters for each tier of this process.
+
+        Returns:
+            dict: counters by tier, i.e. stats()['local']['hits']
+        """
+        return {tier: dict(counts)
+                for tier, counts in self.local.stats.items()}
+
+    def reset_stats(self):
+        self.local.stats = _new_stats()
+
+    def get(self, key, default=None, version=None, client=None):
+        local_key = self._local_key(key, version)
+        value = self.local.get(local_key)
+        if value is not _MISSING:
+            self._count('local', 'hits')
+            return value
+        self._count('local', 'misses')
+
+        value = super(TwoTierRedisCache, self).get(
+            key, default=_MISSING, version=version, client=client)
+        if value is _MISSING:
+            self._count('redis', 'misses')
+            return default
+        self._count('redis', 'hits')
+        self.local.set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None, client=None):
+        found = {}
+        remote_keys = []
+        for key in keys:
+            value = self.local.get(self._local_key(key, version))
+            if value is _MISSING:
+                self._count('local', 'misses')
+                remote_keys.append(key)
+            else:
+                self._count('local', 'hits')
+                found[key] = value
+
+        if remote_keys:
+            remote = super(TwoTierRedisCache, self).get_many(
+                remote_keys, version=version, client=client)
+            for key in remote_keys:
+                if key in remote:
+                    self._count('redis', 'hits')
+                    self.local.set(self._local_key(key, version), remote[key])
+                    found[key] = remote[key]
+                else:
+                    self._count('redis', 'misses')
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None,
+            client=None, nx=False, xx=False):
+        result = super(TwoTierRedisCache, self).set(
+            key, value, timeout=timeout, version=version, client=client,
+            nx=nx, xx=xx)
+        local_key = self._local_key(key, version)
+        if result and not nx and not xx:
+            self.local.set(local_key, value, self._timeout(timeout))
+        else:
+            self.local.delete(local_key)
+        self._publish(local_key)
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None,
+            client=None):
+        return self.set(key, value, timeout=timeout, version=version,
+                        client=client, nx=True)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None,
+                 client=None):
+        result = super(TwoTierRedisCache, self).set_many(
+            data, timeout=timeout, version=version, client=client)
+        local_keys = []
+        for key, value in data.items():
+            local_key = self._local_key(key, version)
+            self.local.set(local_key, value, self._timeout(timeout))
+            local_keys.append(local_key)
+        self._publish(*local_keys)
+        return result
+
+    def delete(self, key, version=None, prefix=None, client=None):
+        result = super(TwoTierRedisCache, self).delete(
+            key, version=version, prefix=prefix, client=client)
+        local_key = str(self.client.make_key(key, version=version,
+                                             prefix=prefix))
+        self.local.delete(local_key)
+        self._publish(local_key)
+        return result
+
+    def delete_many(self, keys, version=None, client=None):
+        result = super(TwoTierRedisCache, self).delete_many(
+            keys, version=version, client=client)
+        local_keys = [self._local_key(key, version) for key in keys]
+        for local_key in local_keys:
+            self.local.delete(local_key)
+        self._publish(*local_keys)
+        return result
+
+    def delete_pattern(self, *args, **kwargs):
+        result = super(TwoTierRedisCache, self).delete_pattern(*args, **kwargs)
+        self.local.clear()
+        self._publish('*')
+        return result
+
+    def clear(self):
+        result = super(TwoTierRedisCache, self).clear()
+        self.local.clear()
+        self._publish('*')
+        return result
+
+    def incr(self, key, delta=1, version=None, client=None):
+        result = super(TwoTierRedisCache, self).incr(
+            key, delta=delta, version=version, client=client)
+        local_key = self._local_key(key, version)
+        self.local.delete(local_key)
+        self._publish(local_key)
+        return result
+
+    def decr(self, key, delta=1, version=None, client=None):
+        return self.incr(key, delta=-delta, version=version, client=client)
+
+    def _timeout(self, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            return self.default_timeout
+        return timeout
+
+
+def isolated_settings() -> dict:
+    """Gets settings which move the cache off the one the site uses.
+
+    The cache is pointed at settings.TEST_CACHE_LOCATION, and the pub/sub
+    channels used alongside it are renamed, since channels are shared by
+    every Redis database. For use with override_settings by tests and
+    benchmarks, which flush the cache.
+
+    Returns:
+        dict: the settings to override
+    """
+    caches = {alias: dict(config, OPTIONS=dict(config.get('OPTIONS', {})))
+              for alias, config in settings.CACHES.items()}
+    default = caches['default']
+    default['LOCATION'] = settings.TEST_CACHE_LOCATION
+    default['OPTIONS']['INVALIDATION_CHANNEL'] = "test_%s" % default[
+        'OPTIONS'].get('INVALIDATION_CHANNEL', "cache_invalidation")
+    return {'CACHES': caches,
+            'FRONTPAGE_CHANNEL': "test_%s" % settings.FRONTPAGE_CHANNEL}
+
+
+def _new_stats() -> dict:
+    return {
+        'local': {'hits': 0, 'misses': 0},
+        'redis': {'hits': 0, 'misses': 0},
+    }
+
+
+class PackedSeries(object):
+    """A [[ms_float, value], ...] series packed into two typed arrays.
+
+    Timestamps from timestamp_to_ms() are whole numbers of milliseconds, so
+    they (and integer values) are stored as deltas from the previous point,
+    which keeps them small and highly compressible. When unpickled, a
+    PackedSeries turns straight back into the original list of pairs.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __reduce__(self):
+        return (_unpack_series, tuple(self.columns))
+
+
+def _pack_column(column):
+    """Packs a list of numbers into (kind, bytes).
+
+    Kinds are 'i' for delta-encoded ints, 'f' for delta-encoded integral
+    floats and 'd' for raw doubles.
+
+    Returns:
+        tuple: the packed column, or None if the column can't be packed
+            without changing the type of its elements
+    """
+    types = set(map(type, column))
+    if types == {int}:
+        kind, typecode = 'i', 'q'
+    elif types == {float}:
+        if not all(n.is_integer() and abs(n) < 2 ** 52 for n in column):
+            return ('d', array.array('d', column).tobytes())
+        kind, typecode = 'f', 'd'
+    else:
+        return None
+
+    deltas = [column[0]]
+    deltas.extend(b - a for a, b in zip(column, column[1:]))
+    try:
+        return (kind, array.array(typecode, deltas).tobytes())
+    except OverflowError:
+        return None
+
+
+def _unpack_column(kind, data):
+    column = array.array('q' if kind == 'i' else 'd')
+    column.frombytes(data)
+    if kind == 'd':
+        return column
+    return itertools.accumulate(column)
+
+
+def _unpack_series(times, values) -> list:
+    return list(map(list, zip(_unpack_column(*times),
+                              _unpack_column(*values))))
+
+
+def _pack(value):
+    """Recursively replaces series in dicts and lists with PackedSeries."""
+    if isinstance(value, dict):
+        return {k: _pack(v) for k, v in value.items()}
+    if isinstance(value, list):
+        if (len(value) >= SeriesSerializer.min_series_length and
+                all(type(point) is list and len(point) == 2
+                    for point in value)):
+            columns = [_pack_column([point[i] for point in value])
+                       for i in (0, 1)]
+            if None not in columns:
+                return PackedSeries(columns)
+        return [_pack(v) for v in value]
+    return value
+
+
+class SeriesSerializer(PickleSerializer):
+    """Pickle serializer which stores report series as packed arrays.
+
+    Report dicts from reports.* are mostly long lists of [ms_float, value]
+    pairs, which pickle stores as one list, one float and one int object per
+    point. Those lists are packed into PackedSeries before pickling; every
+    other value (including whole HttpResponses) is pickled as usual.
+    """
+    min_series_length = 16
+
+    def dumps(self, value):
+        if isinstance(value, (dict, list)):
+            value = _pack(value)
+        return pickle.dumps(value, self._pickle_version)
+
+
+class ThresholdCompressor(BaseCompressor):
+    """Compresses values larger than COMPRESS_MIN_LENGTH bytes.
+
+    Uses lz4 when COMPRESS_LIBRARY is 'lz4' and the lz4 package is installed,
+    and zlib otherwise. Compressed values are prefixed with a marker byte;
+    anything else (including values cached before this compressor was
+    enabled) is passed through to the serializer untouched.
+    """
+
+    def __init__(self, options):
+        super(ThresholdCompressor, self).__init__(options)
+        self.min_length = int(options.get("COMPRESS_MIN_LENGTH", 1024))
+        self.level = int(options.get("COMPRESS_LEVEL", 1))
+        self.use_lz4 = (options.get("COMPRESS_LIBRARY") == 'lz4' and
+                        lz4 is not None)
+
+    def compress(self, value):
+        if len(value) <= self.min_length:
+            return value
+        if self.use_lz4:
+            return b'L' + lz4.frame.compress(value)
+        return b'Z' + zlib.compress(value, self.level)
+
+    def decompress(self, value):
+        marker, data = value[:1], value[1:]
+        try:
+            if marker == b'Z':
+                return zlib.decompress(data)
+            if marker == b'L' and lz4 is not None:
+                return lz4.frame.decompress(data)
+        except Exception as e:
+            raise CompressorError(e)
+        raise CompressorError("value is not compressed")
@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+# extends or releases the cycle lock, but only for the cycle holding it
+HEARTBEAT_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def lock_key() -> str:
+    """Gets the Redis key holding the id of the running ingestion cycle."""
+    return cache.make_key("cycle_lock")
+
+
+def pending_key(cycle) -> str:
+    """Gets the Redis key of the set of a cycle's submissions not yet saved."""
+    return cache.make_key("cycle_pending_%s" % cycle)
+
+
+def acquire(cycle) -> bool:
+    """Takes the cycle lock, unless another cycle is still running.
+
+    The lock expires after settings.CYCLE_LOCK_TIMEOUT seconds without a
+    heartbeat(), so a cycle whose workers have died doesn't block the next.
+
+    Args:
+        cycle: the id of the cycle
+
+    Returns:
+        bool: whether the lock was taken
+    """
+    return bool(get_redis_connection('default').set(
+        lock_key(), cycle, nx=True, ex=settings.CYCLE_LOCK_TIMEOUT))
+
+
+def heartbeat(cycle) -> bool:
+    """Extends the cycle lock while a cycle makes progress.
+
+    Args:
+        cycle: the id of the cycle
+
+    Returns:
+        bool: whether the cycle still holds the lock; if not, it has been
+            abandoned and its remaining work should be dropped
+    """
+    connection = get_redis_connection('default')
+    extend = connection.register_script(HEARTBEAT_SCRIPT)
+    return bool(extend(keys=[lock_key()],
+                       args=[cycle, settings.CYCLE_LOCK_TIMEOUT]))
+
+
+def release(cycle):
+    """Releases the cycle lock once a cycle is finalized.
+
+    Args:
+        cycle: the id of the cycle
+    """
+    connection = get_redis_connection('default')
+    connection.register_script(RELEASE_SCRIPT)(keys=[lock_key()],
+                                               args=[cycle])
+
+
+def start(cycle, ids):
+    """Records the new submissions a cycle has to save before it's finalized.
+
+    Args:
+        cycle: the id of the cycle;
+        ids: the ids of the submissions
+    """
+    if not ids:
+        return
+    pipeline = get_redis_connection('default').pipeline()
+    pipeline.sadd(pending_key(cycle), *ids)
+    pipeline.expire(pending_key(cycle), settings.PIPELINE_CYCLE_TIMEOUT)
+    pipeline.execute()
+
+
+def pending(cycle) -> list:
+    """Gets the ids of a cycle's submissions which are still to be saved.
+
+    Args:
+        cycle: the id of the cycle
+
+    Returns:
+        list: the ids of the submissions
+    """
+    return sorted(id.decode() for id in
+                  get_redis_connection('default').smembers(pending_key(cycle)))
+
+
+def is_pending(cycle, id) -> bool:
+    """Checks whether one of a cycle's submissions is still to be saved.
+
+    Args:
+        cycle: the id of the cycle;
+        id: the id of the submission
+
+    Returns:
+        bool: False if the submission is already saved, or was given up on
+    """
+    return bool(get_redis_connection('default').sismember(
+        pending_key(cycle), id))
+
+
+def done(cycle, id) -> bool:
+    """Checkpoints one of a cycle's submissions as saved, or given up on.
+
+    Args:
+        cycle: the id of the cycle;
+        id: the id of the submission
+
+    Returns:
+        bool: whether this was the last submission the cycle was waiting on;
+            True only once per cycle, even if a submission is retried
+    """
+    pipeline = get_redis_connection('default').pipeline()
+    pipeline.srem(pending_key(cycle), id)
+    pipeline.scard(pending_key(cycle))
+    removed, remaining = pipeline.execute()
+    return bool(removed) and remaining == 0
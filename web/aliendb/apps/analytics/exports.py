@@ -0,0 +1,121 @@
+import csv
+import json
+from django.conf import settings
+from django.http import Http404
+from .helpers import *
+from .models import *
+
+# tracker models for each exportable series, as (model, parent field, value
+# field), keyed by the name of the data set and then the name of the series
+SERIES = {
+    'submission': {
+        'scores': (SubmissionScore, 'submission', 'score'),
+        'comments': (SubmissionNumComments, 'submission', 'num_comments'),
+        'upvote_ratios': (SubmissionUpvoteRatio, 'submission', 'upvote_ratio')
+    },
+    'subreddit': {
+        'scores': (SubredditScore, 'subreddit', 'score'),
+        'comments': (SubredditNumComments, 'subreddit', 'num_comments')
+    },
+    'cumulative': {
+        'total_scores': (TotalScore, None, 'score'),
+        'total_comments': (TotalNumComments, None, 'num_comments'),
+        'average_scores': (AverageScore, None, 'score'),
+        'average_comments': (AverageNumComments, None, 'num_comments')
+    }
+}
+
+
+class Echo(object):
+    """A file-like object which returns what is written to it.
+
+    Lets csv.writer format single rows for a streaming response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def series_querysets(request) -> list:
+    """Determines which tracker rows to export for a request.
+
+    Args:
+        request: a standard HttpRequest;
+        name: (HTTP parameter) the data set, one of SERIES;
+        id: (HTTP parameter) the submission id or subreddit name, if
+            applicable;
+        series: (HTTP parameter) comma separated names of the series to
+            export, defaults to every series of the data set;
+        timerange: (HTTP parameter) the time range for cumulative data, one
+            of TIMERANGES, defaults to all time
+
+    Returns:
+        list: (series name, queryset of (timestamp, value) tuples) tuples
+    """
+    name = request.GET.get('name', '')
+    id = request.GET.get('id', '')
+    timerange = request.GET.get('timerange', '')
+
+    if name not in SERIES:
+        raise Http404("Invalid name parameter")
+    series = request.GET.get('series', '') or ','.join(SERIES[name])
+    series = series.split(',')
+    if any(s not in SERIES[name] for s in series):
+        raise Http404("Invalid series parameter")
+
+    if name == 'submission':
+        if not Submission.objects.filter(id=id).exists():
+            raise Http404("Submission was not found")
+    elif name == 'subreddit':
+        if not Subreddit.objects.filter(name=id).exists():
+            raise Http404("Subreddit was not found")
+
+    if timerange and timerange not in TIMERANGES:
+        raise Http404("Invalid timerange parameter")
+
+    querysets = []
+    for s in series:
+        model, parent, field = SERIES[name][s]
+        queryset = model.objects.all()
+        if parent is not None:
+            queryset = queryset.filter(**{parent: id})
+        if timerange:
+            queryset = queryset.filter(
+                timestamp__gt=timerange_start(timerange))
+        queryset = queryset.order_by('timestamp') \
+            .values_list('timestamp', field)
+        querysets.append((s, queryset))
+    return querysets
+
+
+def rows(querysets):
+    """Yields (series, ms, value) rows from the given querysets.
+
+    Rows are read in chunks from a server-side cursor, so only one chunk of
+    each series is held in memory at a time.
+
+    Args:
+        querysets: (series name, queryset) tuples from series_querysets()
+    """
+    for series, queryset in querysets:
+        for timestamp, value in queryset.iterator(
+                chunk_size=settings.EXPORT_CHUNK_SIZE):
+            yield series, timestamp_to_ms(timestamp), value
+
+
+def ndjson(querysets):
+    """Yields one line of JSON per row."""
+    for series, timestamp, value in rows(querysets):
+        yield json.dumps({
+            'series': series,
+            'timestamp': timestamp,
+            'value': value
+        }) + '\n'
+
+
+def csv_lines(querysets):
+    """Yields a header line, then one line of CSV per row."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(['series', 'timestamp', 'value'])
+    for row in rows(querysets):
+        yield writer.writerow(row)
@@ -0,0 +1,93 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import praw
+from django.conf import settings
+from . import ratelimit
+
+
+def create_client(**options) -> praw.Reddit:
+    """Creates a Reddit client from the PRAW_* environment variables.
+
+    The client's requests share one budget with every other client's, see
+    ratelimit.py.
+
+    Args:
+        options: settings passed on to praw.Reddit, such as oauth_url and
+            reddit_url to use a server other than Reddit's
+
+    Returns:
+        praw.Reddit: the client
+    """
+    return praw.Reddit(client_id=os.environ['PRAW_CLIENT_ID'],
+                       client_secret=os.environ['PRAW_CLIENT_SECRET'],
+                       username=os.environ['PRAW_REDDIT_USERNAME'],
+                       password=os.environ['PRAW_REDDIT_PASSWORD'],
+                       user_agent=os.environ['PRAW_USER_AGENT'],
+                       requestor_class=ratelimit.RateLimitedRequestor,
+                       **options)
+
+
+class Fetcher(object):
+    """Makes Reddit requests on a pool of threads, so their round trips overlap.
+
+    PRAW clients aren't thread-safe, so each thread uses its own, created the
+    first time the thread makes a request. The pool is kept between calls to
+    fetch(), so clients are reused.
+
+    Args:
+        max_in_flight: the most requests made at once, defaults to
+            settings.FETCH_MAX_IN_FLIGHT;
+        options: settings passed on to create_client()
+    """
+
+    def __init__(self, max_in_flight=None, **options):
+        self.max_in_flight = max_in_flight or settings.FETCH_MAX_IN_FLIGHT
+        self.options = options
+        self.local = threading.local()
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def client(self) -> praw.Reddit:
+        """Gets the current thread's Reddit client."""
+        if not hasattr(self.local, 'reddit'):
+            self.local.reddit = create_client(**self.options)
+        return self.local.reddit
+
+    def fetch(self, function, ids, priority=ratelimit.COLD):
+        """Calls a function for each id concurrently, yielding results as they
+        complete.
+
+        Args:
+            function: the function to call with a Reddit client and an id;
+            ids: the ids to call it with;
+            priority: the priority of the requests it makes, see ratelimit.py
+
+        Yields:
+            tuple: each id, with the function's result and None, or with None
+                and the exception it raised
+        """
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.max_in_flight)
+
+        futures = {self.executor.submit(self.call, function, id, priority): id
+                   for id in ids}
+        for future in as_completed(futures):
+            error = future.exception()
+            if error is not None:
+                yield futures[future], None, error
+            else:
+                yield futures[future], future.result(), None
+
+    def call(self, function, id, priority):
+        with ratelimit.prioritized(priority):
+            return function(self.client(), id)
+
+    def shutdown(self):
+        """Stops the pool's threads, once their requests have completed."""
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
@@ -0,0 +1,196 @@
+import json
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from .helpers import timestamp_to_ms
+from .models import *
+
+
+def version_key() -> str:
+    """Gets the Redis key of the hash holding the version counter of the top
+    100 and the epoch it counts within."""
+    return cache.make_key("frontpage_version")
+
+
+def next_version() -> str:
+    """Counts a new version of the top 100.
+
+    Versions are "<epoch>:<number>". The epoch is chosen when the counter is
+    first used, so if the counter is lost, e.g. when the cache is flushed, new
+    versions can't be mistaken for those clients were given before.
+
+    Returns:
+        str: the new version
+    """
+    pipeline = get_redis_connection('default').pipeline()
+    pipeline.hsetnx(version_key(), 'epoch', uuid.uuid4().hex[:8])
+    pipeline.hincrby(version_key(), 'number', 1)
+    pipeline.hget(version_key(), 'epoch')
+    _, number, epoch = pipeline.execute()
+    return '%s:%d' % (epoch.decode(), number)
+
+
+def snapshot() -> dict:
+    """Gets the current rank, score and number of comments of the top 100.
+
+    Returns:
+        dict: [rank, score, num_comments] lists keyed by submission id
+    """
+    return {id: [rank, score, num_comments]
+            for id, rank, score, num_comments in Submission.objects
+            .filter(rank__gt=0)
+            .values_list('id', 'rank', 'score', 'num_comments')}
+
+
+def diff(old, new) -> dict:
+    """Finds what changed between two snapshots of the top 100.
+
+    Args:
+        old: the previous snapshot;
+        new: the current snapshot
+
+    Returns:
+        dict: 'changed' and 'entered' map submission ids to their current
+            [rank, score, num_comments], and 'exited' lists the ids which
+            have left the top 100
+    """
+    return {
+        'changed': {id: stats for id, stats in new.items()
+                    if id in old and old[id] != stats},
+        'entered': {id: stats for id, stats in new.items() if id not in old},
+        'exited': sorted(id for id in old if id not in new)
+    }
+
+
+def details(ids) -> dict:
+    """Gets what clients need to show new rows for submissions.
+
+    Args:
+        ids: the ids of submissions which entered the top 100
+
+    Returns:
+        dict: title, subreddit and creation time (in ms) keyed by id
+    """
+    return {id: {'title': title, 'subreddit': subreddit,
+                 'created_at': timestamp_to_ms(created_at)}
+            for id, title, subreddit, created_at in Submission.objects
+            .filter(id__in=ids)
+            .values_list('id', 'title', 'subreddit', 'created_at')}
+
+
+def publish_cycle():
+    """Versions the top 100, and publishes what changed since the last cycle.
+
+    The current snapshot is stored along with the previous
+    settings.FRONTPAGE_VERSIONS versions. The changes from each of those to
+    the current version are built once here, for the /frontpage view to
+    serve as they are. The change from the previous version is also sent as
+    JSON on settings.FRONTPAGE_CHANNEL, for the /stream view to pass on to
+    connected clients.
+    """
+    version = next_version()
+    epoch, number = version.split(':')
+    number = int(number)
+    submissions = snapshot()
+    new = {
+        'version': version,
+        'submissions': submissions,
+        'details': details(submissions)
+    }
+
+    # build the changes from each recent version to this one
+    versions = ['%s:%d' % (epoch, n) for n in
+                range(max(number - settings.FRONTPAGE_VERSIONS, 1), number)]
+    old = cache.get_many(["frontpage_snapshot_%s" % v for v in versions])
+    deltas = {}
+    for v in versions:
+        snapshot_v = old.get("frontpage_snapshot_%s" % v)
+        if snapshot_v is not None:
+            deltas["frontpage_delta_%s" % v] = delta(snapshot_v, new)
+
+    cache.set_many(deltas, None)
+    cache.set_many({"frontpage_snapshot": new,
+                    "frontpage_snapshot_%s" % version: new}, None)
+    expired = '%s:%d' % (epoch, number - settings.FRONTPAGE_VERSIONS)
+    cache.delete_many(["frontpage_snapshot_%s" % expired,
+                       "frontpage_delta_%s" % expired])
+
+    changes = deltas.get("frontpage_delta_%s:%d" % (epoch, number - 1)) or \
+        delta({'submissions': {}}, new)
+    get_redis_connection('default').publish(
+        settings.FRONTPAGE_CHANNEL,
+        json.dumps(changes, separators=(',', ':')))
+
+
+def delta(old, new) -> dict:
+    """Builds the changes from one versioned snapshot to another.
+
+    Args:
+        old: the earlier snapshot;
+        new: the later snapshot
+
+    Returns:
+        dict: the diff() of their submissions, with the later version and the
+            details of submissions which entered the top 100
+    """
+    changes = diff(old['submissions'], new['submissions'])
+    changes['version'] = new['version']
+    changes['details'] = {id: new['details'][id]
+                          for id in changes['entered']}
+    return changes
+
+
+def since(version) -> dict:
+    """Gets the top 100, or just what changed since a recent version of it.
+
+    Args:
+        version: the version the client has, or None
+
+    Returns:
+        dict: the delta() from the given version to the current one, or if
+            that isn't available, the current snapshot
+    """
+    current = cache.get("frontpage_snapshot")
+    if current is None:
+        # nothing has been published since the cache was emptied
+        submissions = snapshot()
+        return {'version': None, 'submissions': submissions,
+                'details': details(submissions)}
+
+    if version == current['version']:
+        return {'version': version, 'changed': {}, 'entered': {},
+                'exited': [], 'details': {}}
+    if version is not None:
+        changes = cache.get("frontpage_delta_%s" % version)
+        if changes is not None and changes['version'] == current['version']:
+            return changes
+    return current
+
+
+def events():
+    """Yields server-sent events for each ingest cycle, for a while.
+
+    Comments are sent between events to keep the connection alive. The stream
+    ends after settings.STREAM_DURATION seconds, when clients reconnect, so
+    that no connection is held open indefinitely.
+    """
+    pubsub = get_redis_connection('default').pubsub(
+        ignore_subscribe_messages=True)
+    pubsub.subscribe(settings.FRONTPAGE_CHANNEL)
+    try:
+        yield 'retry: %d\n\n' % settings.STREAM_RETRY
+        end = time.monotonic() + settings.STREAM_DURATION
+        keepalive = time.monotonic() + settings.STREAM_KEEPALIVE
+        while time.monotonic() < end:
+            message = pubsub.get_message(timeout=max(
+                min(end, keepalive) - time.monotonic(), 0))
+            if message is not None:
+                yield 'event: frontpage\ndata: %s\n\n' % \
+                    message['data'].decode()
+            elif time.monotonic() >= keepalive:
+                yield ': keepalive\n\n'
+                keepalive = time.monotonic() + settings.STREAM_KEEPALIVE
+    finally:
+        pubsub.close()
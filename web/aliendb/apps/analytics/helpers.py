@@ -1,4 +1,14 @@
 import datetime
+import hashlib
+
+# lengths of the time ranges which cumulative data can be requested for
+TIMERANGES = {
+    'day': datetime.timedelta(hours=24),
+    'week': datetime.timedelta(weeks=1),
+    'fortnight': datetime.timedelta(weeks=2),
+    'month': datetime.timedelta(weeks=4),
+    'year': datetime.timedelta(weeks=52)
+}
 
 
 def update_average(field, value, tracked) -> float:
@@ -32,6 +42,59 @@ def timestamp_to_ms(timestamp) -> float:
     return seconds * 1000.0
 
 
+def format_duration(delta) -> str:
+    """Formats a timedelta as hours, minutes and seconds.
+
+    Unlike time.strftime, hours keep counting past a day.
+
+    Args:
+        delta: a datetime.timedelta, or None
+
+    Returns:
+        str: the duration as HH:MM:SS, or 00:00:00 if there is none
+    """
+    seconds = max(int(delta.total_seconds()), 0) if delta else 0
+    return '%02d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60,
+                               seconds % 60)
+
+
+def timerange_start(timerange) -> datetime.datetime:
+    """Determines the earliest date within a named time range.
+
+    Args:
+        timerange: the name of a time range in TIMERANGES
+
+    Returns:
+        datetime: the current time minus the length of the time range
+    """
+    return datetime.datetime.now() - TIMERANGES[timerange]
+
+
+def search_cache_key(generation, query, order_by, time,
+                     from_subreddits) -> str:
+    """Builds the cache key for the results of a search.
+
+    Searches which differ only in case, whitespace or the order of the
+    requested subreddits share a key, as they have the same results.
+
+    Args:
+        generation: the current search generation, see tasks.py;
+        query: the search query;
+        order_by: how the results are sorted;
+        time: time frame which the results must be within;
+        from_subreddits: comma separated list of subreddits
+
+    Returns:
+        str: the cache key
+    """
+    from_subreddits = sorted(set(name.strip().lower()
+                                 for name in from_subreddits.split(',')) - {''})
+    normalized = '\n'.join([' '.join(query.lower().split()), order_by, time,
+                            ','.join(from_subreddits)])
+    digest = hashlib.md5(normalized.encode('utf-8')).hexdigest()
+    return "search_%s_%s" % (generation, digest)
+
+
 def remove_near_elements(arr, time_difference, time_idx) -> list:
     """Remove list elements within a specified time difference.
 
@@ -50,3 +113,86 @@ def remove_near_elements(arr, time_difference, time_idx) -> list:
             new.append(arr[i])
             time_to_beat = arr[i][time_idx] + time_difference
     return new
+
+
+def group_tallies(rows) -> dict:
+    """Groups tracker rows into tallies for each of their parent objects.
+
+    Args:
+        rows: an iterable of (key, timestamp, value) tuples, such as from
+            values_list('submission', 'timestamp', 'score')
+
+    Returns:
+        dict: lists of [ms, value] tallies keyed by each row's key, in the
+            order the rows were given
+    """
+    tallies = {}
+    for key, timestamp, value in rows:
+        tallies.setdefault(key, []).append([timestamp_to_ms(timestamp), value])
+    return tallies
+
+
+def lttb(data, threshold) -> list:
+    """Downsamples a series with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always kept. The points in between are
+    split into threshold - 2 buckets, and from each bucket the point forming
+    the largest triangle with the previously selected point and the average
+    of the next bucket is kept. This preserves the visual shape of the series
+    (peaks and troughs) much better than keeping every nth point.
+
+    Args:
+        data: a list of [x, y] points, sorted by x;
+        threshold: the maximum number of points to keep
+
+    Returns:
+        list: the downsampled points, or data itself if it already has no
+            more than threshold points
+    """
+    length = len(data)
+    if threshold >= length or threshold < 3:
+        return data
+
+    sampled = [data[0]]
+    every = (length - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # average point of the next bucket
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, length)
+        avg_x = sum(p[0] for p in data[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(p[1] for p in data[avg_start:avg_end]) / (avg_end - avg_start)
+
+        # point of the current bucket with the largest triangle
+        ax, ay = data[a]
+        max_area = -1
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((ax - avg_x) * (data[j][1] - ay) -
+                       (ax - data[j][0]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                next_a = j
+
+        sampled.append(data[next_a])
+        a = next_a
+
+    sampled.append(data[-1])
+    return sampled
+
+
+def downsample(data, threshold):
+    """Applies lttb() to every series within a report's data.
+
+    Args:
+        data: a dict from one of the reports, or any value within one;
+        threshold: the maximum number of points to keep in each series
+
+    Returns:
+        a copy of data with every list of [x, y] points downsampled
+    """
+    if isinstance(data, dict):
+        return {k: downsample(v, threshold) for k, v in data.items()}
+    if isinstance(data, list) and all(
+            isinstance(p, list) and len(p) == 2 for p in data):
+        return lttb(data, threshold)
+    return data
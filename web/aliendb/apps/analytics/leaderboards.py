@@ -0,0 +1,181 @@
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from .models import *
+
+# the least tracked submissions a subreddit needs to be ranked by upvote ratio
+MIN_TRACKED_SUBMISSIONS = 30
+
+# fields ranking subreddits and each subreddit's submissions
+SUBREDDIT_FIELDS = ('tracked_submissions', 'average_upvote_ratio',
+                    'created_at')
+SUBMISSION_FIELDS = ('score', 'upvote_ratio', 'created_at')
+
+# fields shown for ranked rows by templates/subreddits.html and
+# templates/subreddit.html, the only ones loaded
+SUBREDDIT_LISTED_FIELDS = ('name', 'score', 'num_comments',
+                           'tracked_submissions', 'average_upvote_ratio',
+                           'created_at')
+SUBMISSION_LISTED_FIELDS = ('id', 'title', 'score', 'num_comments',
+                            'upvote_ratio', 'created_at')
+
+
+def subreddits_key(field) -> str:
+    """Gets the Redis key of the sorted set ranking subreddits by a field."""
+    return cache.make_key("leaderboard_subreddits_%s" % field)
+
+
+def submissions_key(subreddit, field) -> str:
+    """Gets the Redis key of the sorted set ranking a subreddit's submissions
+    by a field."""
+    return cache.make_key("leaderboard_subreddit_%s_%s" % (subreddit, field))
+
+
+def ranking(value) -> float:
+    """Converts a field value to a sorted set score."""
+    if hasattr(value, 'timestamp'):
+        return value.timestamp()
+    return float(value)
+
+
+def add_subreddits(pipeline, subreddits):
+    """Queues ZADDs ranking subreddits on a Redis pipeline.
+
+    Args:
+        pipeline: a Redis pipeline;
+        subreddits: an iterable of (name, tracked_submissions,
+            average_upvote_ratio, created_at) tuples
+    """
+    rankings = {field: {} for field in SUBREDDIT_FIELDS}
+    for name, tracked, upvote_ratio, created_at in subreddits:
+        rankings['tracked_submissions'][name] = tracked
+        rankings['created_at'][name] = ranking(created_at)
+        if tracked >= MIN_TRACKED_SUBMISSIONS:
+            rankings['average_upvote_ratio'][name] = upvote_ratio
+    for field, mapping in rankings.items():
+        if mapping:
+            pipeline.zadd(subreddits_key(field), mapping)
+
+
+def add_submissions(pipeline, subreddit, submissions):
+    """Queues ZADDs ranking a subreddit's submissions on a Redis pipeline.
+
+    Args:
+        pipeline: a Redis pipeline;
+        subreddit: the name of the subreddit;
+        submissions: an iterable of (id, score, upvote_ratio, created_at)
+            tuples
+    """
+    rankings = {field: {} for field in SUBMISSION_FIELDS}
+    for row in submissions:
+        for field, value in zip(SUBMISSION_FIELDS, row[1:]):
+            rankings[field][row[0]] = ranking(value)
+    for field, mapping in rankings.items():
+        if mapping:
+            pipeline.zadd(submissions_key(subreddit, field), mapping)
+
+
+def update_subreddit(subreddit):
+    """Updates the rankings of a subreddit after it has been saved.
+
+    Args:
+        subreddit: the models.Subreddit object
+    """
+    pipeline = get_redis_connection('default').pipeline()
+    add_subreddits(pipeline, [(subreddit.name, subreddit.tracked_submissions,
+                               subreddit.average_upvote_ratio,
+                               subreddit.created_at)])
+    pipeline.execute()
+
+
+def update_submission(submission_obj):
+    """Updates the rankings of a submission after it has been saved.
+
+    Args:
+        submission_obj: the models.Submission object
+    """
+    pipeline = get_redis_connection('default').pipeline()
+    add_submissions(pipeline, submission_obj.subreddit_id, [(
+        submission_obj.id, submission_obj.score, submission_obj.upvote_ratio,
+        submission_obj.created_at)])
+    pipeline.execute()
+
+
+def ranked(queryset, ranges, built_key, rebuild) -> list:
+    """Reads ranges of sorted sets, then fetches their members in one query.
+
+    If the sorted sets haven't been built yet, such as after Redis is
+    flushed, they are first rebuilt from the database.
+
+    Args:
+        queryset: the queryset whose primary keys are the members of the
+            sets;
+        ranges: (key, count, descending) tuples for each range to read;
+        built_key: a key which is set once the sorted sets are built;
+        rebuild: a function queueing ZADDs for every member on a pipeline
+
+    Returns:
+        list: a list of model objects for each range, in ranked order
+    """
+    connection = get_redis_connection('default')
+    if not connection.exists(built_key):
+        pipeline = connection.pipeline()
+        rebuild(pipeline)
+        pipeline.set(built_key, 1)
+        pipeline.execute()
+
+    pipeline = connection.pipeline()
+    for key, count, descending in ranges:
+        pipeline.zrange(key, 0, count - 1, desc=descending)
+    results = [[pk.decode() for pk in pks] for pks in pipeline.execute()]
+
+    objs = queryset.in_bulk(set(pk for pks in results for pk in pks))
+    return [[objs[pk] for pk in pks if pk in objs] for pks in results]
+
+
+def top_subreddits() -> dict:
+    """Gets the subreddits listed on the subreddits page.
+
+    Returns:
+        dict: lists of models.Subreddit objects, keyed by list name
+    """
+    def rebuild(pipeline):
+        add_subreddits(pipeline, Subreddit.objects.values_list(
+            'name', *SUBREDDIT_FIELDS).iterator())
+
+    built_key = subreddits_key('built')
+    queryset = Subreddit.objects.only(*SUBREDDIT_LISTED_FIELDS)
+    lists = ranked(queryset, [
+        (subreddits_key('tracked_submissions'), 50, True),
+        (subreddits_key('average_upvote_ratio'), 5, True),
+        (subreddits_key('average_upvote_ratio'), 5, False),
+        (subreddits_key('created_at'), 10, True)
+    ], built_key, rebuild)
+    return dict(zip(['subreddits', 'agreeable_subreddits',
+                     'controversial_subreddits', 'recent_subreddits'], lists))
+
+
+def top_submissions(subreddit) -> dict:
+    """Gets the submissions listed on a subreddit's page.
+
+    Args:
+        subreddit: the name of the subreddit
+
+    Returns:
+        dict: lists of models.Submission objects, keyed by list name
+    """
+    def rebuild(pipeline):
+        add_submissions(pipeline, subreddit, Submission.objects.filter(
+            subreddit=subreddit).values_list(
+            'id', *SUBMISSION_FIELDS).iterator())
+
+    built_key = submissions_key(subreddit, 'built')
+    queryset = Submission.objects.only(*SUBMISSION_LISTED_FIELDS)
+    lists = ranked(queryset, [
+        (submissions_key(subreddit, 'score'), 50, True),
+        (submissions_key(subreddit, 'created_at'), 10, True),
+        (submissions_key(subreddit, 'upvote_ratio'), 5, True),
+        (submissions_key(subreddit, 'upvote_ratio'), 5, False)
+    ], built_key, rebuild)
+    return dict(zip(['top_submissions', 'recent_submissions',
+                     'agreeable_submissions', 'controversial_submissions'],
+                    lists))
@@ -0,0 +1,130 @@
+import random
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test.utils import override_settings
+from django_redis import get_redis_connection
+from django_redis.compressors.identity import IdentityCompressor
+from django_redis.serializers.pickle import PickleSerializer
+
+from ...cache import SeriesSerializer, ThresholdCompressor, \
+    isolated_settings
+
+
+def build_series(points, start, step, value, volatility, integer=True) -> list:
+    """Builds a synthetic [[ms_float, value], ...] series.
+
+    Args:
+        points: number of points in the series;
+        start: the first timestamp, in ms;
+        step: the gap between timestamps, in ms;
+        value: the first value;
+        volatility: the maximum change between consecutive values;
+        integer: whether values are ints (scores) or floats (ratios)
+
+    Returns:
+        list: the generated series
+    """
+    series = []
+    for i in range(points):
+        series.append([float(start + i * step),
+                       int(value) if integer else round(value, 2)])
+        value += random.uniform(0, volatility)
+    return series
+
+
+def build_payloads() -> dict:
+    """Builds cache payloads shaped like the largest ones the site stores."""
+    start = 1514764800000
+    hour = 3600000
+    poll = 1200000
+
+    # cumulative data for timerange=year, one point per hour
+    cumulative_year = {
+        name: {
+            'scores': build_series(8736, start, hour, 10 ** 9, 50000),
+            'comments': build_series(8736, start, hour, 10 ** 7, 5000)
+        } for name in ('total', 'average', 'front')
+    }
+
+    # a submission tracked for a week, one point per ingest cycle
+    submission = {
+        'activity': {
+            'scores': build_series(504, start, poll, 100, 500),
+            'comments': build_series(504, start, poll, 10, 50)
+        },
+        'upvote_ratio': {
+            'upvote_ratios': build_series(504, start, poll, 0.5, 0.001,
+                                          integer=False),
+            'average_upvote_ratio': 0.91
+        },
+        'gilded': {'submission': [1, 2, 0], 'comments': [4, 5, 6]}
+    }
+
+    rows = ''.join('<tr><td>%d</td><td><a href="/submission/%06d">Title of '
+                   'submission number %d</a></td></tr>' % (i, i, i)
+                   for i in range(100))
+    home_response = HttpResponse('<html><body><table>%s</table></body>'
+                                 '</html>' % (rows * 5))
+
+    return {
+        'cumulative_data_year': cumulative_year,
+        'submission_data': submission,
+        'home_response': home_response
+    }
+
+
+class Command(BaseCommand):
+    help = ("Compares Redis memory and encode/decode time of cached payloads "
+            "between plain pickling and the compact series serializer. Uses "
+            "the test cache, settings.TEST_CACHE_LOCATION.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # leave the site's cache alone
+        with override_settings(**isolated_settings()):
+            self.benchmark(options['iterations'])
+
+    def benchmark(self, iterations):
+        cache_options = settings.CACHES['default'].get('OPTIONS', {})
+        strategies = [
+            ('pickle', PickleSerializer(cache_options),
+             IdentityCompressor(cache_options)),
+            ('compact', SeriesSerializer(cache_options),
+             ThresholdCompressor(cache_options)),
+        ]
+        connection = get_redis_connection('default')
+        random.seed(0)
+
+        self.stdout.write("%-22s %-8s %10s %10s %11s %11s" % (
+            'payload', 'strategy', 'bytes', 'redis', 'encode ms', 'decode ms'))
+        for name, payload in build_payloads().items():
+            for strategy, serializer, compressor in strategies:
+                def encode():
+                    return compressor.compress(serializer.dumps(payload))
+
+                def decode():
+                    try:
+                        value = compressor.decompress(encoded)
+                    except Exception:
+                        value = encoded
+                    return serializer.loads(value)
+
+                encoded = encode()
+                encode_ms = timeit.timeit(encode, number=iterations) \
+                    / iterations * 1000
+                decode_ms = timeit.timeit(decode, number=iterations) \
+                    / iterations * 1000
+
+                key = 'benchmark_cache:%s:%s' % (strategy, name)
+                connection.set(key, encoded)
+                memory = connection.execute_command('MEMORY', 'USAGE', key)
+                connection.delete(key)
+
+                self.stdout.write("%-22s %-8s %10d %10d %11.3f %11.3f" % (
+                    name, strategy, len(encoded), memory, encode_ms,
+                    decode_ms))
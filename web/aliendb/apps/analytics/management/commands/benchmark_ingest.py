@@ -0,0 +1,74 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from ...cache import isolated_settings
+from ...replay import Replay, SyntheticReddit
+
+STAGES = ('fetch', 'analyze', 'persist', 'finalize')
+
+
+class Command(BaseCommand):
+    help = ("Replays synthetic ingest cycles through the ingestion pipeline "
+            "against a local stand-in for Reddit, and reports the wall time, "
+            "CPU time of the thread running tasks, queries and rows written "
+            "by each stage. Runs against a throwaway test database and the "
+            "test cache, settings.TEST_CACHE_LOCATION.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cycles', type=int, default=3)
+        parser.add_argument('--submissions', type=int, default=100)
+        parser.add_argument('--comments', type=int, default=200,
+                            help="median number of comments per submission")
+        parser.add_argument('--max-comments', type=int, default=20000)
+        parser.add_argument('--turnover', type=int, default=10,
+                            help="submissions replaced each cycle")
+        parser.add_argument('--latency', type=float, default=50,
+                            help="milliseconds each request takes")
+        parser.add_argument('--max-in-flight', type=int, default=None)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        synthetic = SyntheticReddit(submissions=options['submissions'],
+                                    comments=options['comments'],
+                                    max_comments=options['max_comments'],
+                                    seed=options['seed'])
+        replay = Replay(synthetic, latency=options['latency'] / 1000,
+                        max_in_flight=options['max_in_flight'])
+
+        old_name = connection.creation.create_test_db(verbosity=0,
+                                                      autoclobber=True,
+                                                      serialize=False)
+        # leave the site's cache alone, and measure the pipeline, not the
+        # request budget
+        try:
+            with override_settings(RATELIMIT_REQUESTS=10 ** 6,
+                                   RATELIMIT_PERIOD=1,
+                                   RATELIMIT_BURST=10 ** 6,
+                                   **isolated_settings()):
+                cache.clear()
+                try:
+                    results = replay.run(options['cycles'],
+                                         options['turnover'])
+                finally:
+                    cache.clear()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write("%-6s %-9s %6s %9s %9s %8s %8s" % (
+            'cycle', 'stage', 'tasks', 'wall s', 'cpu s', 'queries', 'rows'))
+        for cycle, metrics in enumerate(results, 1):
+            for stage in STAGES:
+                counters = metrics.stage(stage)
+                self.stdout.write("%-6d %-9s %6d %9.3f %9.3f %8d %8d" % (
+                    cycle, stage, counters['tasks'], counters['wall'],
+                    counters['cpu'], counters['queries'], counters['rows']))
+            self.stdout.write("%-6d %-9s %6s %9.3f %9s %8s %8s  %d requests" % (
+                cycle, 'total', '', metrics.wall, '', '', '',
+                metrics.requests))
+
+        comments = sum(len(comments)
+                       for comments in synthetic.comments.values())
+        self.stdout.write("%d submissions and %d comments generated" % (
+            len(synthetic.submissions), comments))
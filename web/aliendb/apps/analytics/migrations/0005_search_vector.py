@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.1.7 on 2026-10-19 18:29
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def populate_search_vector(apps, schema_editor):
+    Submission = apps.get_model('analytics', 'Submission')
+    Submission.objects.update(search_vector=SearchVector('title'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_gildings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(null=True),
+        ),
+        migrations.RunPython(populate_search_vector,
+                             migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='submission',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='analytics_s_search__eb1237_gin'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_search_vector'),
+    ]
+
+    # case-insensitive subreddit lookups filter on LOWER(name)
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX analytics_subreddit_lower_name '
+            'ON analytics_subreddit (LOWER(name));',
+            'DROP INDEX analytics_subreddit_lower_name;'
+        ),
+    ]
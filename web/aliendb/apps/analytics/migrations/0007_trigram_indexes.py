@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_subreddit_lower_name'),
+    ]
+
+    # autocompletion matches subreddit names with the % operator and titles
+    # with icontains, which compares UPPER(title)
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(
+            'CREATE INDEX analytics_subreddit_name_trgm '
+            'ON analytics_subreddit USING gin (name gin_trgm_ops);',
+            'DROP INDEX analytics_subreddit_name_trgm;'
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX analytics_submission_title_trgm '
+            'ON analytics_submission USING gin (UPPER(title) gin_trgm_ops);',
+            'DROP INDEX analytics_submission_title_trgm;'
+        ),
+    ]
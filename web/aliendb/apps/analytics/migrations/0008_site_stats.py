@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.1.7 on 2026-10-19 18:36
+from django.db import migrations, models
+
+
+def populate_site_stats(apps, schema_editor):
+    SiteStats = apps.get_model('analytics', 'SiteStats')
+    Submission = apps.get_model('analytics', 'Submission')
+    Subreddit = apps.get_model('analytics', 'Subreddit')
+    TotalScore = apps.get_model('analytics', 'TotalScore')
+    TotalNumComments = apps.get_model('analytics', 'TotalNumComments')
+
+    total_score = TotalScore.objects.order_by('-timestamp').first()
+    total_num_comments = TotalNumComments.objects.order_by(
+        '-timestamp').first()
+    SiteStats.objects.create(
+        id=1,
+        submissions=Submission.objects.count(),
+        subreddits=Subreddit.objects.count(),
+        score=total_score.score if total_score else 0,
+        num_comments=total_num_comments.num_comments
+        if total_num_comments else 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0007_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('submissions', models.IntegerField(default=0)),
+                ('subreddits', models.IntegerField(default=0)),
+                ('score', models.BigIntegerField(default=0)),
+                ('num_comments', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(populate_site_stats,
+                             migrations.RunPython.noop),
+    ]
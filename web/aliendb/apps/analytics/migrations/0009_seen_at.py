@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.1.7 on 2026-10-19 18:40
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_seen_at(apps, schema_editor):
+    Submission = apps.get_model('analytics', 'Submission')
+    SubmissionScore = apps.get_model('analytics', 'SubmissionScore')
+
+    scores = SubmissionScore.objects.filter(submission=OuterRef('pk')) \
+        .values('timestamp')
+    Submission.objects.update(
+        first_seen_at=Subquery(scores.order_by('timestamp')[:1]),
+        last_seen_at=Subquery(scores.order_by('-timestamp')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0008_site_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='first_seen_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='last_seen_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(populate_seen_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.1.7 on 2026-10-19 21:10
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0009_seen_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='averagescore',
+            name='cycle',
+            field=models.CharField(max_length=32, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='averagenumcomments',
+            name='cycle',
+            field=models.CharField(max_length=32, null=True, unique=True),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 
@@ -14,11 +16,27 @@ class TotalNumComments(models.Model):
 class AverageScore(models.Model):
     score = models.IntegerField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # the ingestion cycle averaged, so that each is averaged once
+    cycle = models.CharField(max_length=32, null=True, unique=True)
 
 
 class AverageNumComments(models.Model):
     num_comments = models.IntegerField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    cycle = models.CharField(max_length=32, null=True, unique=True)
+
+
+class SiteStats(models.Model):
+    """Running totals shown on the home page, kept in a single row by ingest.
+
+    These replace counting every Submission and Subreddit row, and reading
+    the latest TotalScore and TotalNumComments, whenever the page is built.
+    """
+    submissions = models.IntegerField(default=0)
+    subreddits = models.IntegerField(default=0)
+    score = models.BigIntegerField(default=0)
+    num_comments = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
 
 class Subreddit(models.Model):
@@ -68,10 +86,20 @@ class Submission(models.Model):
     gilded_silver = models.IntegerField(default=0)
     gilded_gold = models.IntegerField(default=0)
     gilded_platinum = models.IntegerField(default=0)
+    search_vector = SearchVectorField(null=True)
+
+    # times of the first and latest SubmissionScore, kept by ingest
+    first_seen_at = models.DateTimeField(null=True)
+    last_seen_at = models.DateTimeField(null=True)
 
     created_at = models.DateTimeField()
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'])
+        ]
+
 
 class SubredditScore(models.Model):
     subreddit = models.ForeignKey(Subreddit, on_delete=models.CASCADE)
@@ -0,0 +1,159 @@
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from prawcore.requestor import Requestor
+
+# request priorities, highest first: the /r/all listing, comment trees of
+# submissions which are new or near the top, then those of the rest
+LISTING = 0
+HOT = 1
+COLD = 2
+PRIORITY_NAMES = ('listing', 'hot', 'cold')
+
+# refills the bucket for the time since it was last used, then takes a token
+# if more than the priority's reserve is left; returns how long to wait if not
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local bucket = redis.call('hmget', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+if now > updated then
+    tokens = math.min(capacity, tokens + (now - updated) * rate)
+    updated = now
+end
+local wait = 0
+if tokens >= reserve + 1 then
+    tokens = tokens - 1
+else
+    wait = (reserve + 1 - tokens) / rate
+end
+redis.call('hmset', KEYS[1], 'tokens', tostring(tokens),
+           'updated', tostring(updated))
+return tostring(wait)
+"""
+
+local = threading.local()
+
+
+def bucket_key() -> str:
+    """Gets the Redis key of the token bucket shared by all Reddit clients."""
+    return cache.make_key("ratelimit_bucket")
+
+
+def stats_key() -> str:
+    """Gets the Redis key of the rate limiter's counters."""
+    return cache.make_key("ratelimit_stats")
+
+
+def take(priority, now=None) -> float:
+    """Tries to take a token from the bucket for one request.
+
+    The bucket holds up to settings.RATELIMIT_BURST tokens, refilled at
+    settings.RATELIMIT_REQUESTS per settings.RATELIMIT_PERIOD seconds. The
+    last settings.RATELIMIT_RESERVE[priority] tokens are kept for requests of
+    higher priorities, so lower ones wait longer when the budget runs low.
+
+    Args:
+        priority: the priority of the request, e.g. LISTING;
+        now: the current Unix time, defaults to time.time()
+
+    Returns:
+        float: 0 if a token was taken, otherwise the number of seconds until
+            one may be
+    """
+    now = time.time() if now is None else now
+    connection = get_redis_connection('default')
+    script = connection.register_script(TAKE_SCRIPT)
+    return float(script(keys=[bucket_key()], args=[
+        settings.RATELIMIT_REQUESTS / settings.RATELIMIT_PERIOD,
+        settings.RATELIMIT_BURST,
+        settings.RATELIMIT_RESERVE[priority],
+        now]))
+
+
+def acquire(priority) -> float:
+    """Waits until a request may be made, and records the wait.
+
+    Args:
+        priority: the priority of the request, e.g. LISTING
+
+    Returns:
+        float: the number of seconds waited
+    """
+    started = time.monotonic()
+    wait = take(priority)
+    while wait > 0:
+        time.sleep(wait)
+        wait = take(priority)
+    waited = time.monotonic() - started
+
+    name = PRIORITY_NAMES[priority]
+    pipeline = get_redis_connection('default').pipeline()
+    pipeline.hincrby(stats_key(), '%s_requests' % name, 1)
+    pipeline.hincrbyfloat(stats_key(), '%s_waited' % name, waited)
+    pipeline.execute()
+    return waited
+
+
+def stats() -> dict:
+    """Gets how much of the request budget has been used, and waited for.
+
+    Returns:
+        dict: the tokens left in the bucket, and for each priority by name,
+            the number of requests made and the total and average number of
+            seconds they waited, i.e. stats()['cold']['average_wait']
+    """
+    connection = get_redis_connection('default')
+    counters = {key.decode(): float(value) for key, value in
+                connection.hgetall(stats_key()).items()}
+    tokens = connection.hget(bucket_key(), 'tokens')
+
+    result = {'tokens': settings.RATELIMIT_BURST if tokens is None
+              else float(tokens)}
+    for name in PRIORITY_NAMES:
+        requests = int(counters.get('%s_requests' % name, 0))
+        waited = counters.get('%s_waited' % name, 0.0)
+        result[name] = {'requests': requests,
+                        'waited': waited,
+                        'average_wait': waited / requests if requests else 0.0}
+    return result
+
+
+def reset_stats():
+    """Zeroes the counters returned by stats()."""
+    get_redis_connection('default').delete(stats_key())
+
+
+@contextmanager
+def prioritized(priority):
+    """Sets the priority of the Reddit requests made by the current thread.
+
+    Args:
+        priority: the priority, e.g. LISTING
+    """
+    previous = current_priority()
+    local.priority = priority
+    try:
+        yield
+    finally:
+        local.priority = previous
+
+
+def current_priority() -> int:
+    """Gets the priority of the current thread's requests, COLD by default."""
+    return getattr(local, 'priority', COLD)
+
+
+class RateLimitedRequestor(Requestor):
+    """A prawcore requestor which waits for the shared budget before each
+    request, at the current thread's priority."""
+
+    def request(self, *args, **kwargs):
+        acquire(current_priority())
+        return super(RateLimitedRequestor, self).request(*args, **kwargs)
@@ -0,0 +1,474 @@
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse
+from celery.signals import task_postrun, task_prerun
+from django.db import connection
+from . import scheduler, tasks
+from .fetcher import Fetcher, create_client
+from .models import Submission
+
+# words synthetic titles and comments are made of, including some which
+# TextBlob scores for sentiment
+WORDS = ('the a this that it is was really very not so just my your their '
+         'cat dog picture game movie thread post comment people time year '
+         'good great amazing beautiful happy best love funny cool nice '
+         'bad terrible awful sad worst hate boring wrong stupid ugly '
+         'think know see make look want find give tell feel').split()
+
+
+def submission_thing(submission) -> dict:
+    """Wraps a submission's fields as the API returns them.
+
+    Args:
+        submission: the fields of the submission, as in submission_data()
+            from tasks.py
+
+    Returns:
+        dict: the t3 thing
+    """
+    data = {'name': 't3_%s' % submission['id'],
+            'permalink': '/r/%s/comments/%s/' % (submission['subreddit'],
+                                                 submission['id'])}
+    data.update((key, value) for key, value in submission.items()
+                if key not in ('subreddit_title', 'subreddit_description'))
+    data['author'] = submission['author'] or '[deleted]'
+    return {'kind': 't3', 'data': data}
+
+
+def comment_thing(comment, submission_id) -> dict:
+    """Wraps a comment's fields as the API returns them.
+
+    Args:
+        comment: the fields of the comment, as in comment_data() from
+            tasks.py;
+        submission_id: the id of the comment's submission
+
+    Returns:
+        dict: the t1 thing, without replies
+    """
+    data = {'name': 't1_%s' % comment['id'],
+            'link_id': 't3_%s' % submission_id,
+            'parent_id': comment.get('parent_id', 't3_%s' % submission_id),
+            'replies': ''}
+    data.update((key, value) for key, value in comment.items()
+                if key not in ('is_root', 'parent_id'))
+    # deleted accounts are named [deleted], which PRAW reads as None
+    data['author'] = comment['author'] or '[deleted]'
+    return {'kind': 't1', 'data': data}
+
+
+def listing(things) -> dict:
+    """Wraps things in a listing, as the API returns them."""
+    return {'kind': 'Listing',
+            'data': {'children': things, 'after': None, 'before': None}}
+
+
+class FakeRedditHandler(BaseHTTPRequestHandler):
+    """Answers the Reddit API requests made by tasks.py."""
+    routes = [
+        (re.compile(r'^/api/v1/access_token/?$'), 'access_token'),
+        (re.compile(r'^/r/all/hot/?$'), 'hot'),
+        (re.compile(r'^/r/([^/]+)/about/?$'), 'about'),
+        (re.compile(r'^/comments/([^/]+)/?$'), 'comments'),
+    ]
+
+    def do_GET(self):
+        self.route()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        self.route()
+
+    def route(self):
+        path = urlparse(self.path).path
+        self.server.started(path)
+        try:
+            time.sleep(self.server.latency)
+            for pattern, name in self.routes:
+                match = pattern.match(path)
+                if match:
+                    body = getattr(self, name)(*match.groups())
+                    if body is not None:
+                        return self.respond(200, body)
+            self.respond(404, {'error': 404})
+        finally:
+            self.server.finished()
+
+    def respond(self, status, body):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def access_token(self):
+        return {'access_token': 'replay', 'token_type': 'bearer',
+                'expires_in': 3600, 'scope': '*'}
+
+    def hot(self):
+        return listing([submission_thing(self.server.submissions[id])
+                        for id in self.server.hot])
+
+    def about(self, name):
+        subreddit = self.server.subreddits.get(name.lower())
+        if subreddit is not None:
+            return {'kind': 't5', 'data': subreddit}
+
+    def comments(self, id):
+        submission = self.server.submissions.get(id)
+        if submission is not None:
+            comments = self.server.comments.get(id, [])
+            return [listing([submission_thing(submission)]),
+                    listing([comment_thing(comment, id)
+                             for comment in comments])]
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeRedditServer(ThreadingMixIn, HTTPServer):
+    """A local stand-in for the Reddit API, serving fixed fixtures.
+
+    Point Reddit clients at it with the oauth_url and reddit_url options, see
+    fetcher.create_client(). Fixtures can be replaced between requests.
+
+    Attributes:
+        submissions: the fields of each submission, keyed by id;
+        comments: the fields of each submission's comments, keyed by
+            submission id;
+        subreddits: the title and public_description of each subreddit, keyed
+            by lowercase name;
+        hot: the ids of the submissions in /r/all/hot, in order;
+        latency: the number of seconds each request takes;
+        requests: the number of requests made to each path;
+        max_in_flight: the most requests which were being answered at once
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super(FakeRedditServer, self).__init__(('127.0.0.1', 0),
+                                               FakeRedditHandler)
+        self.submissions = {}
+        self.comments = {}
+        self.subreddits = {}
+        self.hot = []
+        self.latency = 0
+        self.requests = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def started(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finished(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def start(self):
+        """Serves requests on a background thread, until shutdown()."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+def base36(number) -> str:
+    """Formats a number the way Reddit formats ids."""
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    result = ''
+    while True:
+        number, digit = divmod(number, 36)
+        result = digits[digit] + result
+        if not number:
+            return result
+
+
+class SyntheticReddit(object):
+    """Generates /r/all over successive ingest cycles, for FakeRedditServer.
+
+    Each submission is given an eventual score and number of comments, which
+    it grows towards over its first cycles. Comment counts follow a
+    heavy-tailed distribution, so a few submissions have far more comments
+    than the rest. Comments are flat replies to their submission.
+
+    Args:
+        submissions: the number of submissions in /r/all/hot;
+        comments: the median eventual number of comments per submission;
+        max_comments: the most comments any submission has;
+        subreddits: the number of subreddits submissions are spread across;
+        seed: seeds the generator, so runs can be repeated
+    """
+
+    def __init__(self, submissions=100, comments=200, max_comments=20000,
+                 subreddits=50, seed=0):
+        self.random = random.Random(seed)
+        self.size = submissions
+        self.median_comments = comments
+        self.max_comments = max_comments
+        self.time = 1500000000.0
+        self.submission_ids = itertools.count(1)
+        self.comment_ids = itertools.count(1)
+        self.subreddits = {
+            'subreddit%d' % i: {'display_name': 'Subreddit%d' % i,
+                                'title': 'Subreddit number %d' % i,
+                                'public_description': self.text(5, 20)}
+            for i in range(subreddits)}
+        self.submissions = {}
+        self.comments = {}
+        self.targets = {}
+        self.born = {}
+        self.cycle = 0
+        self.hot = [self.submit() for i in range(submissions)]
+        self.rank()
+
+    def text(self, least, most) -> str:
+        words = self.random.randint(least, most)
+        return ' '.join(self.random.choice(WORDS) for i in range(words))
+
+    def submit(self) -> str:
+        """Creates a submission, with a few of its eventual comments."""
+        id = base36(next(self.submission_ids))
+        # pareto variates have a median of 2 ** (1 / alpha)
+        comments = self.median_comments * \
+            self.random.paretovariate(1.5) / 2 ** (1 / 1.5)
+        self.targets[id] = (self.random.randint(5000, 80000),
+                            max(1, min(int(comments), self.max_comments)))
+        self.born[id] = self.cycle
+
+        name = self.random.choice(sorted(self.subreddits))
+        self.submissions[id] = {
+            'id': id,
+            'subreddit': self.subreddits[name]['display_name'],
+            'title': self.text(3, 15),
+            'author': 'user%d' % self.random.randint(1, 100000),
+            'score': 0,
+            'num_comments': 0,
+            'domain': 'i.redd.it',
+            'link_flair_text': None,
+            'upvote_ratio': round(self.random.uniform(0.6, 0.99), 2),
+            'stickied': False,
+            'over_18': self.random.random() < 0.05,
+            'spoiler': False,
+            'locked': False,
+            'gildings': {'gid_1': 0, 'gid_2': 0, 'gid_3': 0},
+            'created_utc': self.time - self.random.randint(0, 7200)}
+        self.comments[id] = []
+        self.grow(id)
+        return id
+
+    def grow(self, id):
+        """Moves a submission's score and comments towards their eventual
+        values, by a random fraction of them."""
+        submission = self.submissions[id]
+        score, comments = self.targets[id]
+        fraction = self.random.uniform(0.1, 0.4)
+        submission['score'] = min(score, submission['score'] +
+                                  int(score * fraction) + 1)
+        submission['upvote_ratio'] = round(min(0.99, max(0.5, (
+            submission['upvote_ratio'] +
+            self.random.uniform(-0.02, 0.02)))), 2)
+
+        added = min(comments - len(self.comments[id]),
+                    int(comments * fraction) + 1)
+        for i in range(added):
+            author = 'user%d' % self.random.randint(1, 100000)
+            self.comments[id].append({
+                'id': base36(next(self.comment_ids)),
+                'body': self.text(3, 40),
+                'author': None if self.random.random() < 0.02 else author,
+                'distinguished': 'moderator'
+                if self.random.random() < 0.001 else None,
+                'score': self.random.randint(-10, 2000),
+                'gildings': {'gid_1': int(self.random.random() < 0.005),
+                             'gid_2': 0, 'gid_3': 0},
+                'created_utc': self.time - self.random.randint(0, 1200)})
+        submission['num_comments'] = len(self.comments[id])
+
+    def rank(self):
+        """Orders /r/all/hot by score, decayed by age."""
+        self.hot.sort(key=lambda id: -self.submissions[id]['score'] /
+                      (self.cycle - self.born[id] + 2) ** 1.5)
+
+    def advance(self, turnover=10):
+        """Moves on to the next ingest cycle.
+
+        Every submission's score and comments grow, the lowest ranked
+        submissions are replaced by new ones, and /r/all/hot is reordered.
+
+        Args:
+            turnover: the number of submissions replaced
+        """
+        self.cycle += 1
+        self.time += 1200
+        for id in self.hot:
+            self.grow(id)
+        self.rank()
+        self.hot = self.hot[:self.size - turnover] + \
+            [self.submit() for i in range(turnover)]
+        self.rank()
+
+    def serve(self, server):
+        """Has a FakeRedditServer serve this generator's submissions."""
+        server.submissions = self.submissions
+        server.comments = self.comments
+        server.subreddits = {name: subreddit for name, subreddit
+                             in self.subreddits.items()}
+        server.hot = self.hot
+
+
+def thread_time() -> float:
+    """Gets the CPU time of the current thread, like Python 3.7's
+    time.thread_time()."""
+    return time.clock_gettime(time.CLOCK_THREAD_CPUTIME_ID)
+
+
+class StageMetrics(object):
+    """Measures the Celery tasks run in-process, totalled by queue.
+
+    Time spent in tasks called by a task is counted towards their own stages,
+    not the caller's. Queries made on the current thread's database
+    connection are counted towards the stage running at the time.
+
+    CPU time is that of the thread running the tasks, so it leaves out the
+    FakeRedditServer's threads and the Fetcher's pool, whose requests only
+    show in the stages' wall time.
+
+    Attributes:
+        stages: 'tasks', 'wall', 'cpu', 'queries' and 'rows' (written)
+            counters, keyed by queue name;
+        wall: the number of seconds the whole cycle took, set by Replay;
+        requests: the number of requests made to Reddit, set by Replay
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.stack = []
+        self.wall = 0.0
+        self.requests = 0
+
+    def stage(self, name) -> dict:
+        return self.stages.setdefault(name, {'tasks': 0, 'wall': 0.0,
+                                             'cpu': 0.0, 'queries': 0,
+                                             'rows': 0})
+
+    def started(self, sender=None, **kwargs):
+        route = tasks.app.conf.task_routes.get(sender.name, {})
+        self.stack.append([route.get('queue', 'default'), time.perf_counter(),
+                           thread_time(), 0.0, 0.0])
+
+    def finished(self, sender=None, **kwargs):
+        name, wall, cpu, child_wall, child_cpu = self.stack.pop()
+        wall = time.perf_counter() - wall
+        cpu = thread_time() - cpu
+        stage = self.stage(name)
+        stage['tasks'] += 1
+        stage['wall'] += wall - child_wall
+        stage['cpu'] += cpu - child_cpu
+        if self.stack:
+            self.stack[-1][3] += wall
+            self.stack[-1][4] += cpu
+
+    def execute(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        stage = self.stage(self.stack[-1][0] if self.stack else 'none')
+        stage['queries'] += 1
+        if sql.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+            stage['rows'] += max(context['cursor'].rowcount, 0)
+        return result
+
+    def __enter__(self):
+        task_prerun.connect(self.started)
+        task_postrun.connect(self.finished)
+        self.wrapper = connection.execute_wrapper(self.execute)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self.wrapper.__exit__(*args)
+        task_prerun.disconnect(self.started)
+        task_postrun.disconnect(self.finished)
+
+
+class Replay(object):
+    """Feeds synthetic ingest cycles through tasks.py, in-process.
+
+    Tasks run eagerly, against a FakeRedditServer serving a SyntheticReddit.
+    Each cycle runs get_top_submissions, then polls the submissions tracked
+    before the cycle once each.
+
+    Args:
+        synthetic: the SyntheticReddit to serve;
+        latency: the number of seconds each request to the server takes;
+        max_in_flight: the most requests made at once while fetching
+    """
+
+    def __init__(self, synthetic, latency=0, max_in_flight=None):
+        self.synthetic = synthetic
+        self.latency = latency
+        self.max_in_flight = max_in_flight
+
+    def run(self, cycles, turnover=10) -> list:
+        """Runs ingest cycles, measuring each.
+
+        Args:
+            cycles: the number of cycles;
+            turnover: the number of submissions replaced each cycle, see
+                SyntheticReddit.advance
+
+        Returns:
+            list: the StageMetrics of each cycle
+        """
+        server = FakeRedditServer()
+        server.latency = self.latency
+        self.synthetic.serve(server)
+        server.start()
+
+        options = {'oauth_url': server.url, 'reddit_url': server.url,
+                   'check_for_updates': False}
+        reddit, fetcher = tasks.reddit, tasks.submission_fetcher
+        tasks.reddit = create_client(**options)
+        tasks.submission_fetcher = Fetcher(self.max_in_flight, **options)
+        eager = (tasks.app.conf.task_always_eager,
+                 tasks.app.conf.task_eager_propagates)
+        tasks.app.conf.update(task_always_eager=True,
+                              task_eager_propagates=True)
+
+        results = []
+        try:
+            for cycle in range(cycles):
+                if cycle:
+                    self.synthetic.advance(turnover)
+                    self.synthetic.serve(server)
+                tracked = list(Submission.objects.filter(rank__gt=0)
+                               .values_list('id', flat=True))
+
+                with StageMetrics() as metrics:
+                    started = time.perf_counter()
+                    tasks.get_top_submissions.delay()
+                    scheduler.schedule({id: 0 for id in tracked})
+                    tasks.poll_submissions.delay()
+                    metrics.wall = time.perf_counter() - started
+                metrics.requests = sum(server.requests.values())
+                server.requests = {}
+                results.append(metrics)
+        finally:
+            tasks.app.conf.update(task_always_eager=eager[0],
+                                  task_eager_propagates=eager[1])
+            tasks.submission_fetcher.shutdown()
+            tasks.reddit, tasks.submission_fetcher = reddit, fetcher
+            server.shutdown()
+            server.server_close()
+        return results
@@ -1,11 +1,76 @@
-import datetime
 from django.conf import settings
 from django.core.cache import cache
+from django.db.models import Avg, Count, Q, Sum
 from django.http import Http404
 from .helpers import *
 from .models import *
 
 
+def points_parameter(request) -> int:
+    """Reads the optional points parameter of a request.
+
+    Args:
+        request: a standard HttpRequest;
+        points: (HTTP parameter) the maximum number of points in each series
+
+    Returns:
+        int: the number of points, or None if the parameter wasn't given
+    """
+    points = request.GET.get('points', '')
+    if not points:
+        return None
+    try:
+        points = int(points)
+    except ValueError:
+        # should probably be 400
+        raise Http404("Invalid points parameter")
+    if points < 3 or points > settings.API_MAX_POINTS:
+        raise Http404("Invalid points parameter")
+    return points
+
+
+def downsampled(ids, key_format, points, retrieve, timeout) -> dict:
+    """Retrieves report data with each series downsampled to a set size.
+
+    Downsampled data is cached separately for each number of points, so
+    repeated requests don't need to fetch and downsample the full series.
+
+    Args:
+        ids: a list of identifiers to get data for;
+        key_format: the cache key format of the downsampled data, given the
+            number of points and an id; kept apart from the keys of the full
+            data, which ids may otherwise collide with;
+        points: the maximum number of points in each series;
+        retrieve: a function returning the full data of a list of ids, keyed
+            by id (None for ids which weren't found);
+        timeout: number of seconds to cache the downsampled data for
+
+    Returns:
+        dict: the downsampled data of each id, or None for ids which weren't
+            found
+    """
+    data = {id: None for id in ids}
+
+    # try to get downsampled data variables from cache
+    keys = {key_format % (points, id): id for id in ids}
+    if settings.DEBUG is False:
+        for key, value in cache.get_many(list(keys)).items():
+            data[keys[key]] = value
+
+    missing = [id for id, value in data.items() if value is None]
+    if not missing:
+        return data
+
+    computed = {}
+    for id, value in retrieve(missing).items():
+        if value is not None:
+            data[id] = downsample(value, points)
+            computed[key_format % (points, id)] = data[id]
+    cache.set_many(computed, timeout)
+
+    return data
+
+
 def submission(request) -> dict:
     """Retrieves data needed to generate graphs for a submission's page.
 
@@ -19,125 +84,168 @@ def submission(request) -> dict:
 
     Args:
         request: a standard HttpRequest;
-        id: (HTTP parameter) the submission id
+        id: (HTTP parameter) the submission id;
+        points: (HTTP parameter) if given, the maximum number of points in
+            each series
 
     Returns:
         dict: data needed to generate graphs for the submission page.
     """
     id = request.GET.get('id', '')
+    points = points_parameter(request)
 
-    try:
-        submission = Submission.objects.get(id=id)
-    except Submission.DoesNotExist:
+    data = submissions([id], points)[id]
+    if data is None:
         raise Http404("Submission was not found")
+    return data
 
-    # try to get full data variable from cache
-    data = cache.get("submission_data_%s" % id)
-    if data is not None and settings.DEBUG is False:
-        return data
 
-    subreddit = submission.subreddit
-    comments = Comment.objects.filter(submission=submission)
-    submission_scores = SubmissionScore.objects.filter(
-        submission=submission).order_by('timestamp')
-    submission_num_comments = SubmissionNumComments.objects.filter(
-        submission=submission).order_by('timestamp')
-    submission_upvote_ratios = SubmissionUpvoteRatio.objects.filter(
-        submission=submission).order_by('timestamp')
-
-    # activity
-    score_tallies = [[timestamp_to_ms(s.timestamp), s.score]
-                     for s in submission_scores]
-    comment_tallies = [
-        [timestamp_to_ms(c.timestamp), c.num_comments] for c in submission_num_comments]
-
-    # upvote_ratio
-    upvote_ratios = [[timestamp_to_ms(s.timestamp), s.upvote_ratio]
-                     for s in submission_upvote_ratios]
-
-    # special_users
-    special_users_submission = [
-        [c.is_op for c in comments].count(True),
-        [c.is_mod for c in comments].count(True),
-        [c.is_admin for c in comments].count(True),
-        [c.is_special for c in comments].count(True)
-    ]
-    special_users_subreddit = [
-        float("{0:.2f}".format(subreddit.average_is_op)),
-        float("{0:.2f}".format(subreddit.average_is_mod)),
-        float("{0:.2f}".format(subreddit.average_is_admin)),
-        float("{0:.2f}".format(subreddit.average_is_special)),
-    ]
+def submissions(ids, points=None) -> dict:
+    """Retrieves graph data for many submissions at once.
 
-    # gilded
-    gilded_submission = [
-        submission.gilded_silver,
-        submission.gilded_gold,
-        submission.gilded_platinum
-    ]
-    gilded_comments = [
-        sum(c.gilded_silver for c in comments),
-        sum(c.gilded_gold for c in comments),
-        sum(c.gilded_platinum for c in comments),
-    ]
-    gilded_subreddit = [
-        float("{0:.2f}".format(subreddit.average_gilded_silver)),
-        float("{0:.2f}".format(subreddit.average_gilded_gold)),
-        float("{0:.2f}".format(subreddit.average_gilded_platinum))
-    ]
+    Cached data for all submissions is retrieved with a single cache lookup.
+    Data for the remaining submissions is computed with one query per table
+    rather than one set of queries per submission, and is then cached.
 
-    # polarity
-    polarity_submission = [
-        float("{0:.4f}".format(submission.polarity)),
-        float("{0:.4f}".format(sum(c.polarity for c in comments) / len(comments)))
-    ]
-    polarity_subreddit = [
-        float("{0:.4f}".format(subreddit.average_submission_polarity)),
-        float("{0:.4f}".format(subreddit.average_comments_polarity))
-    ]
+    Args:
+        ids: a list of submission ids;
+        points: if given, the maximum number of points in each series
 
-    # subjectivity
-    subjectivity_submission = [
-        float("{0:.4f}".format(submission.subjectivity)),
-        float("{0:.4f}".format(
-            sum(c.subjectivity for c in comments) / len(comments)))
-    ]
-    subjectivity_subreddit = [
-        float("{0:.4f}".format(subreddit.average_submission_subjectivity)),
-        float("{0:.4f}".format(subreddit.average_comments_subjectivity))
-    ]
+    Returns:
+        dict: the data of each submission (see submission()) keyed by id, or
+            None for ids which don't match a submission
+    """
+    if points:
+        return downsampled(ids, "submission_points_%d_%s", points, submissions,
+                           1200)
+
+    data = {id: None for id in ids}
+
+    # try to get data variables from cache
+    keys = {"submission_data_%s" % id: id for id in ids}
+    if settings.DEBUG is False:
+        for key, value in cache.get_many(list(keys)).items():
+            data[keys[key]] = value
+
+    missing = [id for id, value in data.items() if value is None]
+    submission_objs = Submission.objects.select_related('subreddit') \
+        .in_bulk(missing)
+    if not submission_objs:
+        return data
 
-    data = {
-        'activity': {
-            'scores': score_tallies,
-            'comments': comment_tallies
-        },
-        'upvote_ratio': {
-            'upvote_ratios': upvote_ratios,
-            'average_upvote_ratio': float("{0:.2f}".format(subreddit.average_upvote_ratio))
-        },
-        'special_users': {
-            'submission': special_users_submission,
-            'subreddit': special_users_subreddit
-        },
-        'gilded': {
-            'submission': gilded_submission,
-            'comments': gilded_comments,
-            'subreddit': gilded_subreddit
-        },
-        'polarity': {
-            'submission': polarity_submission,
-            'subreddit': polarity_subreddit
-        },
-        'subjectivity': {
-            'submission': subjectivity_submission,
-            'subreddit': subjectivity_subreddit
-        }
+    comment_stats = {
+        stats['submission']: stats for stats in
+        Comment.objects.filter(submission__in=submission_objs)
+        .values('submission')
+        .annotate(is_op=Count('id', filter=Q(is_op=True)),
+                  is_mod=Count('id', filter=Q(is_mod=True)),
+                  is_admin=Count('id', filter=Q(is_admin=True)),
+                  is_special=Count('id', filter=Q(is_special=True)),
+                  gilded_silver=Sum('gilded_silver'),
+                  gilded_gold=Sum('gilded_gold'),
+                  gilded_platinum=Sum('gilded_platinum'),
+                  polarity=Avg('polarity'),
+                  subjectivity=Avg('subjectivity'))
     }
+    score_tallies = group_tallies(SubmissionScore.objects.filter(
+        submission__in=submission_objs).order_by('timestamp')
+        .values_list('submission', 'timestamp', 'score'))
+    comment_tallies = group_tallies(SubmissionNumComments.objects.filter(
+        submission__in=submission_objs).order_by('timestamp')
+        .values_list('submission', 'timestamp', 'num_comments'))
+    upvote_ratios = group_tallies(SubmissionUpvoteRatio.objects.filter(
+        submission__in=submission_objs).order_by('timestamp')
+        .values_list('submission', 'timestamp', 'upvote_ratio'))
+
+    computed = {}
+    for id, submission in submission_objs.items():
+        subreddit = submission.subreddit
+        comments = comment_stats.get(id, {})
+
+        # special_users
+        special_users_submission = [
+            comments.get('is_op', 0),
+            comments.get('is_mod', 0),
+            comments.get('is_admin', 0),
+            comments.get('is_special', 0)
+        ]
+        special_users_subreddit = [
+            float("{0:.2f}".format(subreddit.average_is_op)),
+            float("{0:.2f}".format(subreddit.average_is_mod)),
+            float("{0:.2f}".format(subreddit.average_is_admin)),
+            float("{0:.2f}".format(subreddit.average_is_special)),
+        ]
+
+        # gilded
+        gilded_submission = [
+            submission.gilded_silver,
+            submission.gilded_gold,
+            submission.gilded_platinum
+        ]
+        gilded_comments = [
+            comments.get('gilded_silver') or 0,
+            comments.get('gilded_gold') or 0,
+            comments.get('gilded_platinum') or 0,
+        ]
+        gilded_subreddit = [
+            float("{0:.2f}".format(subreddit.average_gilded_silver)),
+            float("{0:.2f}".format(subreddit.average_gilded_gold)),
+            float("{0:.2f}".format(subreddit.average_gilded_platinum))
+        ]
+
+        # polarity
+        polarity_submission = [
+            float("{0:.4f}".format(submission.polarity)),
+            float("{0:.4f}".format(comments.get('polarity') or 0))
+        ]
+        polarity_subreddit = [
+            float("{0:.4f}".format(subreddit.average_submission_polarity)),
+            float("{0:.4f}".format(subreddit.average_comments_polarity))
+        ]
+
+        # subjectivity
+        subjectivity_submission = [
+            float("{0:.4f}".format(submission.subjectivity)),
+            float("{0:.4f}".format(comments.get('subjectivity') or 0))
+        ]
+        subjectivity_subreddit = [
+            float("{0:.4f}".format(subreddit.average_submission_subjectivity)),
+            float("{0:.4f}".format(subreddit.average_comments_subjectivity))
+        ]
+
+        computed["submission_data_%s" % id] = {
+            'activity': {
+                'scores': score_tallies.get(id, []),
+                'comments': comment_tallies.get(id, [])
+            },
+            'upvote_ratio': {
+                'upvote_ratios': upvote_ratios.get(id, []),
+                'average_upvote_ratio': float("{0:.2f}".format(subreddit.average_upvote_ratio))
+            },
+            'special_users': {
+                'submission': special_users_submission,
+                'subreddit': special_users_subreddit
+            },
+            'gilded': {
+                'submission': gilded_submission,
+                'comments': gilded_comments,
+                'subreddit': gilded_subreddit
+            },
+            'polarity': {
+                'submission': polarity_submission,
+                'subreddit': polarity_subreddit
+            },
+            'subjectivity': {
+                'submission': subjectivity_submission,
+                'subreddit': subjectivity_subreddit
+            }
+        }
 
     # cache for 20 minutes
-    cache.set("submission_data_%s" % id, data, 1200)
+    cache.set_many(computed, 1200)
 
+    for key, value in computed.items():
+        data[keys[key]] = value
     return data
 
 
@@ -154,97 +262,132 @@ def subreddit(request) -> dict:
 
     Args:
         request: a standard HttpRequest;
-        id: (HTTP parameter) the name of the subreddit
+        id: (HTTP parameter) the name of the subreddit;
+        points: (HTTP parameter) if given, the maximum number of points in
+            each series
 
     Returns:
         dict: data needed to generate graphs for the submission page.
     """
     id = request.GET.get('id', '')
+    points = points_parameter(request)
 
-    try:
-        subreddit = Subreddit.objects.get(name=id)
-    except Subreddit.DoesNotExist:
+    data = subreddits([id], points)[id]
+    if data is None:
         raise Http404("Submission was not found")
+    return data
 
-    # try to get full data variable from cache
-    data = cache.get("subreddit_data_%s" % id)
-    if data is not None and settings.DEBUG is False:
-        return data
 
-    subreddit_scores = SubredditScore.objects.filter(
-        subreddit=subreddit).order_by('timestamp')
-    subreddit_num_comments = SubredditNumComments.objects.filter(
-        subreddit=subreddit).order_by('timestamp')
+def subreddits(ids, points=None) -> dict:
+    """Retrieves graph data for many subreddits at once.
+
+    Cached data for all subreddits is retrieved with a single cache lookup.
+    Data for the remaining subreddits is computed with one query per table
+    rather than one set of queries per subreddit, and is then cached.
+
+    Args:
+        ids: a list of subreddit names;
+        points: if given, the maximum number of points in each series
 
-    # activity
-    score_tallies_raw = [
-        [timestamp_to_ms(s.timestamp), s.score] for s in subreddit_scores]
-    comment_tallies_raw = [
-        [timestamp_to_ms(c.timestamp), c.num_comments] for c in subreddit_num_comments]
+    Returns:
+        dict: the data of each subreddit (see subreddit()) keyed by name, or
+            None for names which don't match a subreddit
+    """
+    if points:
+        return downsampled(ids, "subreddit_points_%d_%s", points, subreddits,
+                           1200)
 
-    # throw out tallies within the same day
-    time_difference = 86400000  # 24 hours in ms
+    data = {id: None for id in ids}
 
-    score_tallies = remove_near_elements(score_tallies_raw, time_difference, 0)
-    comment_tallies = remove_near_elements(
-        comment_tallies_raw, time_difference, 0)
+    # try to get data variables from cache
+    keys = {"subreddit_data_%s" % id: id for id in ids}
+    if settings.DEBUG is False:
+        for key, value in cache.get_many(list(keys)).items():
+            data[keys[key]] = value
+
+    missing = [id for id, value in data.items() if value is None]
+    subreddit_objs = Subreddit.objects.in_bulk(missing)
+    if not subreddit_objs:
+        return data
 
-    # calculate differentials
-    score_differentials = []
-    comment_differentials = []
-    for i in range(1, len(score_tallies)):
-        score_differentials.append(
-            [score_tallies[i][0], score_tallies[i][1] - score_tallies[i-1][1]])
-        comment_differentials.append(
-            [comment_tallies[i][0], comment_tallies[i][1] - comment_tallies[i-1][1]])
+    score_tallies_raw = group_tallies(SubredditScore.objects.filter(
+        subreddit__in=subreddit_objs).order_by('timestamp')
+        .values_list('subreddit', 'timestamp', 'score'))
+    comment_tallies_raw = group_tallies(SubredditNumComments.objects.filter(
+        subreddit__in=subreddit_objs).order_by('timestamp')
+        .values_list('subreddit', 'timestamp', 'num_comments'))
 
-    subreddits = Subreddit.objects.all()
-    num_subreddits = Subreddit.objects.count()
+    overall = Subreddit.objects.aggregate(
+        submission_polarity=Avg('average_submission_polarity'),
+        comments_polarity=Avg('average_comments_polarity'),
+        submission_subjectivity=Avg('average_submission_subjectivity'),
+        comments_subjectivity=Avg('average_comments_subjectivity'))
 
     # polarity
-    polarity_subreddit = [
-        float("{0:.4f}".format(subreddit.average_submission_polarity)),
-        float("{0:.4f}".format(subreddit.average_comments_polarity))
-    ]
     polarity_overall = [
-        float("{0:.4f}".format(
-            sum(s.average_submission_polarity for s in subreddits) / num_subreddits)),
-        float("{0:.4f}".format(
-            sum(s.average_comments_polarity for s in subreddits) / num_subreddits))
+        float("{0:.4f}".format(overall['submission_polarity'])),
+        float("{0:.4f}".format(overall['comments_polarity']))
     ]
 
     # subjectivity
-    subjectivity_subreddit = [
-        float("{0:.4f}".format(subreddit.average_submission_subjectivity)),
-        float("{0:.4f}".format(subreddit.average_comments_subjectivity))
-    ]
     subjectivity_overall = [
-        float("{0:.4f}".format(
-            sum(s.average_submission_subjectivity for s in subreddits) / num_subreddits)),
-        float("{0:.4f}".format(
-            sum(s.average_comments_subjectivity for s in subreddits) / num_subreddits))
+        float("{0:.4f}".format(overall['submission_subjectivity'])),
+        float("{0:.4f}".format(overall['comments_subjectivity']))
     ]
 
-    data = {
-        'activity': {
-            # 'scores': score_tallies,
-            # 'comments': comment_tallies,
-            'score_differentials': score_differentials[-12:],
-            'comment_differentials': comment_differentials[-12:]
-        },
-        'polarity': {
-            'subreddit': polarity_subreddit,
-            'overall': polarity_overall
-        },
-        'subjectivity': {
-            'subreddit': subjectivity_subreddit,
-            'overall': subjectivity_overall
+    computed = {}
+    for id, subreddit in subreddit_objs.items():
+        # throw out tallies within the same day
+        time_difference = 86400000  # 24 hours in ms
+
+        score_tallies = remove_near_elements(
+            score_tallies_raw.get(id, []), time_difference, 0)
+        comment_tallies = remove_near_elements(
+            comment_tallies_raw.get(id, []), time_difference, 0)
+
+        # calculate differentials
+        score_differentials = []
+        comment_differentials = []
+        for i in range(1, len(score_tallies)):
+            score_differentials.append(
+                [score_tallies[i][0], score_tallies[i][1] - score_tallies[i-1][1]])
+            comment_differentials.append(
+                [comment_tallies[i][0], comment_tallies[i][1] - comment_tallies[i-1][1]])
+
+        # polarity
+        polarity_subreddit = [
+            float("{0:.4f}".format(subreddit.average_submission_polarity)),
+            float("{0:.4f}".format(subreddit.average_comments_polarity))
+        ]
+
+        # subjectivity
+        subjectivity_subreddit = [
+            float("{0:.4f}".format(subreddit.average_submission_subjectivity)),
+            float("{0:.4f}".format(subreddit.average_comments_subjectivity))
+        ]
+
+        computed["subreddit_data_%s" % id] = {
+            'activity': {
+                # 'scores': score_tallies,
+                # 'comments': comment_tallies,
+                'score_differentials': score_differentials[-12:],
+                'comment_differentials': comment_differentials[-12:]
+            },
+            'polarity': {
+                'subreddit': polarity_subreddit,
+                'overall': polarity_overall
+            },
+            'subjectivity': {
+                'subreddit': subjectivity_subreddit,
+                'overall': subjectivity_overall
+            }
         }
-    }
 
     # cache for 20 minutes
-    cache.set("subreddit_data_%s" % id, data, 1200)
+    cache.set_many(computed, 1200)
 
+    for key, value in computed.items():
+        data[keys[key]] = value
     return data
 
 
@@ -262,33 +405,54 @@ def cumulative(request) -> dict:
     Args:
         request: a standard HttpRequest
         timerange: (HTTP parameter) the time range to retrieve data from, can
-            be: day; week; fortnight; month; year
+            be: day; week; fortnight; month; year;
+        points: (HTTP parameter) if given, the maximum number of points in
+            each series
 
     Returns:
         dict: data needed to generate graphs for the main page.
     """
     timerange = request.GET.get('timerange', '')
-    if timerange not in ['day', 'week', 'fortnight', 'month', 'year']:
+    if timerange not in TIMERANGES:
         # should probably be 400
         raise Http404("Invalid timerange parameter")
 
+    points = points_parameter(request)
+    if points:
+        return downsampled([timerange], "cumulative_points_%d_%s", points,
+                           cumulative_timeranges, 3600)[timerange]
+    return cumulative_timeranges([timerange])[timerange]
+
+
+def cumulative_timeranges(timeranges) -> dict:
+    """Retrieves the data of cumulative() for each of the given timeranges.
+
+    Args:
+        timeranges: a list of names of timeranges in TIMERANGES
+
+    Returns:
+        dict: the data of each timerange keyed by its name
+    """
+    return {timerange: cumulative_timerange(timerange)
+            for timerange in timeranges}
+
+
+def cumulative_timerange(timerange) -> dict:
+    """Retrieves the data of cumulative() for a single timerange.
+
+    Args:
+        timerange: the name of a timerange in TIMERANGES
+
+    Returns:
+        dict: data needed to generate graphs for the main page.
+    """
     # try to get full data variable from cache
     data = cache.get("cumulative_data_%s" % timerange)
     if data is not None and settings.DEBUG is False:
         return data
 
     # get datetime object for earliest possible date based on range
-    now = datetime.datetime.now()
-    if timerange == 'day':
-        start_date = now - datetime.timedelta(hours=24)
-    elif timerange == 'week':
-        start_date = now - datetime.timedelta(weeks=1)
-    elif timerange == 'fortnight':
-        start_date = now - datetime.timedelta(weeks=2)
-    elif timerange == 'month':
-        start_date = now - datetime.timedelta(weeks=4)
-    elif timerange == 'year':
-        start_date = now - datetime.timedelta(weeks=52)
+    start_date = timerange_start(timerange)
 
     total_scores = TotalScore.objects.filter(
         timestamp__gt=start_date).order_by('timestamp')
@@ -0,0 +1,126 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+# how much more a new comment counts than a point of score, when measuring
+# how quickly a submission is moving
+COMMENT_WEIGHT = 10
+
+
+def schedule_key() -> str:
+    """Gets the Redis key of the sorted set of submissions by due time."""
+    return cache.make_key("poll_schedule")
+
+
+def polls_key() -> str:
+    """Gets the Redis key of the hash of each submission's last poll."""
+    return cache.make_key("poll_last")
+
+
+def poll_interval(score_change, num_comments_change, elapsed) -> float:
+    """Determines how long to wait before polling a submission again.
+
+    Submissions are polled often enough that each poll sees about
+    settings.POLL_TARGET_CHANGE points of activity at their recent rate,
+    within settings.POLL_MIN_INTERVAL and settings.POLL_MAX_INTERVAL.
+
+    Args:
+        score_change: the change in score since the last poll;
+        num_comments_change: the change in number of comments since the last
+            poll;
+        elapsed: the number of seconds since the last poll
+
+    Returns:
+        float: the number of seconds until the next poll
+    """
+    activity = abs(score_change) + COMMENT_WEIGHT * abs(num_comments_change)
+    if activity <= 0 or elapsed <= 0:
+        return settings.POLL_MAX_INTERVAL
+    interval = settings.POLL_TARGET_CHANGE * elapsed / activity
+    return min(max(interval, settings.POLL_MIN_INTERVAL),
+               settings.POLL_MAX_INTERVAL)
+
+
+def polled(id, score, num_comments, now=None) -> float:
+    """Records a poll of a submission, and determines when to poll it next.
+
+    The submission's activity is measured against its last poll, rather than
+    its stats in the database, which the listing also updates every cycle.
+
+    Args:
+        id: the id of the submission;
+        score: the score the poll saw;
+        num_comments: the number of comments the poll saw;
+        now: the current Unix time, defaults to time.time()
+
+    Returns:
+        float: the number of seconds until the next poll, see poll_interval();
+            settings.POLL_MIN_INTERVAL if it wasn't polled before
+    """
+    now = time.time() if now is None else now
+    connection = get_redis_connection('default')
+    last = connection.hget(polls_key(), id)
+    connection.hset(polls_key(), id,
+                    '%d:%d:%f' % (score, num_comments, now))
+    if last is None:
+        return settings.POLL_MIN_INTERVAL
+    last_score, last_num_comments, last_time = last.decode().split(':')
+    return poll_interval(score - int(last_score),
+                         num_comments - int(last_num_comments),
+                         now - float(last_time))
+
+
+def schedule(intervals, now=None, replace=True):
+    """Sets when submissions are next due to be polled.
+
+    Args:
+        intervals: the number of seconds until each submission is due, keyed
+            by submission id;
+        now: the current Unix time, defaults to time.time();
+        replace: whether to reschedule submissions which are already
+            scheduled, rather than leaving them as they are
+    """
+    if not intervals:
+        return
+    now = time.time() if now is None else now
+    get_redis_connection('default').zadd(schedule_key(), {
+        id: now + interval for id, interval in intervals.items()},
+        nx=not replace)
+
+
+def unschedule(ids):
+    """Stops polling submissions, such as when they leave the top 100.
+
+    Args:
+        ids: the ids of the submissions
+    """
+    if ids:
+        pipeline = get_redis_connection('default').pipeline()
+        pipeline.zrem(schedule_key(), *ids)
+        pipeline.hdel(polls_key(), *ids)
+        pipeline.execute()
+
+
+def due(limit, now=None) -> list:
+    """Claims the submissions which are due to be polled, most overdue first.
+
+    Claimed submissions are pushed back by settings.POLL_MAX_INTERVAL, so
+    they aren't dispatched again while being polled. If the poll fails, they
+    are retried then.
+
+    Args:
+        limit: the most submissions to claim;
+        now: the current Unix time, defaults to time.time()
+
+    Returns:
+        list: the ids of the claimed submissions
+    """
+    now = time.time() if now is None else now
+    connection = get_redis_connection('default')
+    ids = [id.decode() for id in connection.zrangebyscore(
+        schedule_key(), '-inf', now, start=0, num=limit)]
+    if ids:
+        connection.zadd(schedule_key(), {
+            id: now + settings.POLL_MAX_INTERVAL for id in ids}, xx=True)
+    return ids
@@ -1,174 +1,405 @@
 import datetime
-import os
 import string
-from celery import Celery
-import praw
+import uuid
+from celery import Celery, Task
 import prawcore
 from textblob import TextBlob
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
 from django.core.cache import cache
+from django.db import OperationalError, transaction
+from django.db.models import F
 from .helpers import *
 from .models import *
+from . import cycles, frontpage, leaderboards, ratelimit, scheduler
+from .fetcher import Fetcher, create_client
 
 app = Celery('tasks')
 app.config_from_object('django.conf:settings')
 
-reddit = praw.Reddit(client_id=os.environ['PRAW_CLIENT_ID'],
-                     client_secret=os.environ['PRAW_CLIENT_SECRET'],
-                     username=os.environ['PRAW_REDDIT_USERNAME'],
-                     password=os.environ['PRAW_REDDIT_PASSWORD'],
-                     user_agent=os.environ['PRAW_USER_AGENT'])
+reddit = create_client()
 
+# fetches comment trees for many submissions at once, see fetch_submissions
+submission_fetcher = Fetcher()
+
+# errors which stages of the ingestion pipeline are retried after
+RETRY_FOR = (prawcore.exceptions.RequestException, OperationalError)
+
+# fields of a models.Submission object which polls update
+POLLED_FIELDS = ['score', 'num_comments', 'link_flair_text', 'upvote_ratio',
+                 'stickied', 'over_18', 'spoiler', 'locked', 'gilded_silver',
+                 'gilded_gold', 'gilded_platinum']
 
-def create_submission_obj(submission, rank) -> Submission:
-    """Creates a models.Submission object from a Praw submission object.
+
+def update_site_stats(**changes):
+    """Adds to the running totals in the models.SiteStats row.
+
+    Should be called within the same transaction as the change it counts.
 
     Args:
-        submission: the source Praw submission object;
-        rank: the current rank (1-100) of the submission
+        changes: the amount to add to each SiteStats field, by field name
+    """
+    updated = SiteStats.objects.filter(id=1).update(
+        **{field: F(field) + value for field, value in changes.items()})
+    if not updated:
+        SiteStats.objects.create(id=1, **changes)
+
+
+def listing_data(submission) -> dict:
+    """Gets the stats of a submission in the top 100 which are listed.
+
+    Args:
+        submission: the source Praw submission object, from a listing
 
     Returns:
-        Submission: the created models.Submission object
+        dict: the JSON-serializable id and listed stats of the submission
     """
-    created_at = datetime.datetime.utcfromtimestamp(submission.created_utc)
-    created_at = created_at.replace(tzinfo=datetime.timezone.utc)
+    return {'id': submission.id,
+            'score': submission.score,
+            'num_comments': submission.num_comments,
+            'upvote_ratio': submission.upvote_ratio}
 
-    # get subreddit
-    try:
-        subreddit = Subreddit.objects.get(name=submission.subreddit)
-    except Subreddit.DoesNotExist:
-        # subreddit obj doesn't exist; create it
-        subreddit = Subreddit.objects.create(name=submission.subreddit)
-        subreddit.title = submission.subreddit.title
-        if hasattr(submission.subreddit, 'public_description'):
-            subreddit.description = submission.subreddit.public_description
-        else:
-            subreddit.description = ''
-        subreddit.save()
 
+def submission_data(submission) -> dict:
+    """Gets the fields which are stored from a Praw submission object.
+
+    Args:
+        submission: the source Praw submission object
+
+    Returns:
+        dict: the JSON-serializable fields of the submission
+    """
     author = ''
-    if hasattr(submission, 'author'):
-        if submission.author is not None:
-            author = submission.author.name
+    if getattr(submission, 'author', None) is not None:
+        author = submission.author.name
+
+    return {'id': submission.id,
+            'subreddit': str(submission.subreddit),
+            'title': submission.title,
+            'author': author,
+            'score': submission.score,
+            'num_comments': submission.num_comments,
+            'domain': submission.domain,
+            'link_flair_text': submission.link_flair_text,
+            'upvote_ratio': submission.upvote_ratio,
+            'stickied': submission.stickied,
+            'over_18': submission.over_18,
+            'spoiler': submission.spoiler,
+            'locked': submission.locked,
+            'gildings': dict(submission.gildings),
+            'created_utc': submission.created_utc}
+
+
+def subreddit_data(subreddit) -> dict:
+    """Gets the fields which are stored for a new subreddit.
+
+    Reading them costs a request, so they are only read for subreddits which
+    aren't in the database yet, see unknown_subreddits.
 
-    # perform sentiment analysis on submission title
-    blob = TextBlob(submission.title)
-    polarity = blob.polarity
-    subjectivity = blob.subjectivity
+    Args:
+        subreddit: the source Praw subreddit object
 
-    # create Submission object
-    submission_obj = Submission(id=submission.id,
-                                subreddit=subreddit,
-                                title=submission.title,
-                                author=author,
-                                rank=rank,
-                                rank_previous=rank,
-                                rank_peak=rank,
-                                score=submission.score,
-                                num_comments=submission.num_comments,
-                                polarity=polarity,
-                                subjectivity=subjectivity,
-                                domain=submission.domain,
-                                link_flair_text=submission.link_flair_text or '',
-                                upvote_ratio=submission.upvote_ratio,
-                                stickied=submission.stickied,
-                                over_18=submission.over_18,
-                                spoiler=submission.spoiler,
-                                locked=submission.locked,
-                                gilded_silver=submission.gildings['gid_1'],
-                                gilded_gold=submission.gildings['gid_2'],
-                                gilded_platinum=submission.gildings['gid_3'],
-                                created_at=created_at)
-    submission_obj.save()
+    Returns:
+        dict: the subreddit's title and description, keyed as they are added
+            to submission_data()
+    """
+    return {'subreddit_title': subreddit.title,
+            'subreddit_description': getattr(subreddit, 'public_description',
+                                             '')}
+
+
+def unknown_subreddits(submissions) -> set:
+    """Finds the subreddits of fetched submissions which aren't in the database.
+
+    Args:
+        submissions: the submission_data() of each submission
+
+    Returns:
+        set: the names of the subreddits
+    """
+    names = set(data['subreddit'] for data in submissions)
+    return names - set(Subreddit.objects.filter(name__in=names)
+                       .values_list('name', flat=True))
+
+
+def comment_data(comment) -> dict:
+    """Gets the fields which are stored from a Praw comment object.
+
+    Args:
+        comment: the source Praw comment object
+
+    Returns:
+        dict: the JSON-serializable fields of the comment, with a body of None
+            if the comment has been deleted
+    """
+    author = None
+    if comment.author is not None:
+        author = comment.author.name
+
+    return {'id': comment.id,
+            'body': getattr(comment, 'body', None),
+            'author': author,
+            'distinguished': comment.distinguished,
+            'score': comment.score,
+            'is_root': comment.is_root,
+            'gildings': dict(comment.gildings),
+            'created_utc': comment.created_utc}
 
-    # create Comment objects
+
+def fetch_submission_data(submission, client=None) -> dict:
+    """Fetches a submission's comment tree, along with the submission itself.
+
+    Makes no database queries, so can be called from any thread.
+
+    Args:
+        submission: the source Praw submission object, which may be lazy;
+        client: the Reddit client to fetch older comments with, defaults to
+            the shared one
+
+    Returns:
+        dict: the submission_data() of the submission, with the comment_data()
+            of each of its comments under 'comments'
+    """
     submission.comments.replace_more(limit=0)
     comments = submission.comments.list()
 
     if submission.num_comments > 500:
         # get the submission again, sorted by oldest comments
-        submission.comment_sort = 'old'
-        submission = reddit.submission(id=submission.id)
-        submission.comments.replace_more(limit=0)
+        older = (client or reddit).submission(id=submission.id)
+        older.comment_sort = 'old'
+        older.comments.replace_more(limit=0)
         # append new flattened comments to comments array
-        comments += submission.comments.list()
+        comments += older.comments.list()
 
-    for comment in comments:
-        create_comment_obj(comment, submission_obj)
+    data = submission_data(submission)
+    unique = {comment.id: comment for comment in comments}
+    data['comments'] = [comment_data(comment) for comment in unique.values()]
+    return data
 
-    return submission_obj
 
+def fetch_submission_by_id(client, id) -> dict:
+    """Fetches a submission and its comment tree, see fetch_submission_data."""
+    return fetch_submission_data(client.submission(id=id), client)
 
-def update_submission_obj(submission, rank) -> Submission:
-    """Updates an existing models.Submission object from a Praw submission object.
+
+def fetch_subreddit_by_name(client, name) -> dict:
+    """Fetches a subreddit's subreddit_data()."""
+    return subreddit_data(client.subreddit(name))
+
+
+def analyze_comment_data(comment) -> dict:
+    """Performs sentiment analysis and counts the words of a comment.
 
     Args:
-        submission: the source Praw submission object;
+        comment: the comment_data() of a comment which hasn't been deleted
+
+    Returns:
+        dict: the comment's data, with the results added
+    """
+    blob = TextBlob(comment['body'])
+    comment['polarity'] = blob.polarity
+    comment['subjectivity'] = blob.subjectivity
+    comment['characters'] = sum(c in string.ascii_letters
+                                for c in comment['body'])
+    comment['words'] = len(blob.words)
+    comment['sentences'] = len(blob.sentences)
+    return comment
+
+
+def analyze_submission_data(data) -> dict:
+    """Performs sentiment analysis on a submission's title and new comments.
+
+    Comments which are already in the database were analyzed when they were
+    created, so are skipped.
+
+    Args:
+        data: the fetch_submission_data() of a submission
+
+    Returns:
+        dict: the submission's data, with the results added
+    """
+    blob = TextBlob(data['title'])
+    data['polarity'] = blob.polarity
+    data['subjectivity'] = blob.subjectivity
+
+    existing = set(Comment.objects.filter(
+        id__in=[comment['id'] for comment in data['comments']]
+    ).values_list('id', flat=True))
+    for comment in data['comments']:
+        if comment['id'] not in existing and comment['body'] is not None:
+            analyze_comment_data(comment)
+
+    return data
+
+
+def create_submission(data, rank) -> Submission:
+    """Creates a models.Submission object, along with its comments.
+
+    Args:
+        data: the analyze_submission_data() of the submission;
         rank: the current rank (1-100) of the submission
 
     Returns:
-        Submission: the updated models.Submission object
+        Submission: the created models.Submission object
     """
-    submission_obj = Submission.objects.get(id=submission.id)
+    created_at = datetime.datetime.utcfromtimestamp(data['created_utc'])
+    created_at = created_at.replace(tzinfo=datetime.timezone.utc)
 
-    # determine rank on /r/all
+    # get subreddit, or create it; another worker may be creating it too, so
+    # only the one which does counts it
+    with transaction.atomic():
+        subreddit, created = Subreddit.objects.get_or_create(
+            name=data['subreddit'],
+            defaults={
+                'title': data.get('subreddit_title', ''),
+                'description': data.get('subreddit_description') or ''})
+        if created:
+            update_site_stats(subreddits=1)
+    if created:
+        leaderboards.update_subreddit(subreddit)
+
+        # forget that the subreddit was missing, see views.subreddit_names
+        cache.delete("subreddit_name_%s" % subreddit.name.lower())
+
+    # create Submission object
+    submission_obj = Submission(id=data['id'],
+                                subreddit=subreddit,
+                                title=data['title'],
+                                author=data['author'],
+                                rank=rank,
+                                rank_previous=rank,
+                                rank_peak=rank,
+                                score=data['score'],
+                                num_comments=data['num_comments'],
+                                polarity=data['polarity'],
+                                subjectivity=data['subjectivity'],
+                                domain=data['domain'],
+                                link_flair_text=data['link_flair_text'] or '',
+                                upvote_ratio=data['upvote_ratio'],
+                                stickied=data['stickied'],
+                                over_18=data['over_18'],
+                                spoiler=data['spoiler'],
+                                locked=data['locked'],
+                                gilded_silver=data['gildings']['gid_1'],
+                                gilded_gold=data['gildings']['gid_2'],
+                                gilded_platinum=data['gildings']['gid_3'],
+                                created_at=created_at)
+    with transaction.atomic():
+        submission_obj.save()
+        update_site_stats(submissions=1)
+
+    # index title for full text search
+    Submission.objects.filter(id=submission_obj.id).update(
+        search_vector=SearchVector('title'))
+
+    for comment in data['comments']:
+        save_comment(comment, submission_obj)
+
+    return submission_obj
+
+
+def set_rank(submission_obj, rank):
+    """Records a models.Submission object's new rank on /r/all.
+
+    Args:
+        submission_obj: the models.Submission object;
+        rank: the current rank (1-100) of the submission
+    """
     submission_obj.rank_previous = submission_obj.rank
     submission_obj.rank = rank
     if rank < submission_obj.rank_peak:
         submission_obj.rank_peak = rank
 
-    # update Submission obj
-    submission.comments.replace_more(limit=0)
-    comments = submission.comments.list()
+
+def rerank_submission_obj(data, rank) -> Submission:
+    """Updates the rank and listed stats of an existing models.Submission object.
+
+    Unlike update_submission, this doesn't need the submission's comments,
+    which are left to poll_submissions.
+
+    Args:
+        data: the listing_data() of the submission;
+        rank: the current rank (1-100) of the submission
+
+    Returns:
+        Submission: the updated models.Submission object
+    """
+    submission_obj = Submission.objects.get(id=data['id'])
+    set_rank(submission_obj, rank)
+    submission_obj.score = data['score']
+    submission_obj.num_comments = data['num_comments']
+    submission_obj.upvote_ratio = data['upvote_ratio']
+    return submission_obj
+
+
+def update_submission(submission_obj, data, rank=None) -> Submission:
+    """Updates and saves an existing models.Submission object and its comments.
+
+    Args:
+        submission_obj: the models.Submission object;
+        data: the analyze_submission_data() of the submission;
+        rank: the current rank (1-100) of the submission, or None to leave it
+            unchanged
+
+    Returns:
+        Submission: the updated models.Submission object
+    """
+    # determine rank on /r/all
+    if rank is not None:
+        set_rank(submission_obj, rank)
 
     # update submission details
-    submission_obj.score = submission.score
-    submission_obj.num_comments = submission.num_comments
-    if submission.link_flair_text is not None:
-        submission_obj.link_flair_text = submission.link_flair_text
-    submission_obj.upvote_ratio = submission.upvote_ratio
-    submission_obj.stickied = submission.stickied
-    submission_obj.over_18 = submission.over_18
-    submission_obj.spoiler = submission.spoiler
-    submission_obj.locked = submission.locked
-    submission_obj.gilded_silver = submission.gildings['gid_1']
-    submission_obj.gilded_gold = submission.gildings['gid_2']
-    submission_obj.gilded_platinum = submission.gildings['gid_3']
+    submission_obj.score = data['score']
+    submission_obj.num_comments = data['num_comments']
+    if data['link_flair_text'] is not None:
+        submission_obj.link_flair_text = data['link_flair_text']
+    submission_obj.upvote_ratio = data['upvote_ratio']
+    submission_obj.stickied = data['stickied']
+    submission_obj.over_18 = data['over_18']
+    submission_obj.spoiler = data['spoiler']
+    submission_obj.locked = data['locked']
+    submission_obj.gilded_silver = data['gildings']['gid_1']
+    submission_obj.gilded_gold = data['gildings']['gid_2']
+    submission_obj.gilded_platinum = data['gildings']['gid_3']
+    if rank is None:
+        # leave the rank to the listing and finalize_cycle, which may have
+        # changed it since the submission was read
+        submission_obj.save(update_fields=POLLED_FIELDS)
+    else:
+        submission_obj.save()
 
     # create new Comment objects if necessary
-    if submission.num_comments > 500:
-        # get the submission again, sorted by oldest comments
-        submission = reddit.submission(id=submission.id)
-        submission.comment_sort = 'old'
-        submission.comments.replace_more(limit=0)
-        # append new flattened comments to comments array
-        comments += submission.comments.list()
-
-    for comment in comments:
-        create_comment_obj(comment, submission_obj)
+    for comment in data['comments']:
+        save_comment(comment, submission_obj)
 
     return submission_obj
 
 
-def create_comment_obj(comment, submission_obj):
-    """Creates a models.Comment object from a Praw comment object.
+def save_comment(comment, submission_obj):
+    """Creates or updates a models.Comment object.
 
     Args:
-        comment: the source Praw comment object;
+        comment: the comment_data() of the comment, analyzed by
+            analyze_comment_data() if the comment is new;
         submission_obj: the models.Submission object parent to the comment
     """
     # check if comment already exists in db
-    if not Comment.objects.filter(id=comment.id).exists():
+    if not Comment.objects.filter(id=comment['id']).exists():
         # check if comment has been deleted
-        if not hasattr(comment, 'body'):
+        if comment['body'] is None:
             return
 
+        if 'polarity' not in comment:
+            # created since it was analyzed; analyze it now
+            analyze_comment_data(comment)
+
         # determine comment distinguised properties
-        if comment.author is not None:
-            is_op = comment.author.name == submission_obj.author
-            if comment.distinguished:
-                is_mod = 'moderator' in comment.distinguished
-                is_admin = 'admin' in comment.distinguished
-                is_special = 'special' in comment.distinguished
+        if comment['author'] is not None:
+            is_op = comment['author'] == submission_obj.author
+            if comment['distinguished']:
+                is_mod = 'moderator' in comment['distinguished']
+                is_admin = 'admin' in comment['distinguished']
+                is_special = 'special' in comment['distinguished']
             else:
                 is_mod = False
                 is_admin = False
@@ -180,32 +411,25 @@ def create_comment_obj(comment, submission_obj):
             is_admin = None
             is_special = None
 
-        # perform sentiment analysis on comment
-        blob = TextBlob(comment.body)
-        polarity = blob.polarity
-        subjectivity = blob.subjectivity
-
-        num_characters = sum(c in string.ascii_letters for c in comment.body)
-
-        created_at = datetime.datetime.utcfromtimestamp(comment.created_utc)
+        created_at = datetime.datetime.utcfromtimestamp(comment['created_utc'])
         created_at = created_at.replace(tzinfo=datetime.timezone.utc)
 
-        comment_obj = Comment(id=comment.id,
+        comment_obj = Comment(id=comment['id'],
                               submission=submission_obj,
-                              score=comment.score,
-                              is_root=comment.is_root,
+                              score=comment['score'],
+                              is_root=comment['is_root'],
                               is_op=is_op,
                               is_mod=is_mod,
                               is_admin=is_admin,
                               is_special=is_special,
-                              gilded_silver=comment.gildings['gid_1'],
-                              gilded_gold=comment.gildings['gid_2'],
-                              gilded_platinum=comment.gildings['gid_3'],
-                              characters=num_characters,
-                              words=len(blob.words),
-                              sentences=len(blob.sentences),
-                              polarity=polarity,
-                              subjectivity=subjectivity,
+                              gilded_silver=comment['gildings']['gid_1'],
+                              gilded_gold=comment['gildings']['gid_2'],
+                              gilded_platinum=comment['gildings']['gid_3'],
+                              characters=comment['characters'],
+                              words=comment['words'],
+                              sentences=comment['sentences'],
+                              polarity=comment['polarity'],
+                              subjectivity=comment['subjectivity'],
                               created_at=created_at)
         comment_obj.save()
 
@@ -213,25 +437,71 @@ def create_comment_obj(comment, submission_obj):
         subreddit = comment_obj.submission.subreddit
         subreddit.average_comments_polarity = update_average(
             subreddit.average_comments_polarity,
-            polarity,
+            comment['polarity'],
             subreddit.tracked_comments)
         subreddit.average_comments_subjectivity = update_average(
             subreddit.average_comments_subjectivity,
-            subjectivity,
+            comment['subjectivity'],
             subreddit.tracked_comments)
         subreddit.tracked_comments = subreddit.tracked_comments + 1
         subreddit.save()
 
     else:
         # comment already exists in db
-        comment_obj = Comment.objects.get(id=comment.id)
-        comment_obj.score = comment.score
-        comment_obj.gilded_silver = comment.gildings['gid_1']
-        comment_obj.gilded_gold = comment.gildings['gid_2']
-        comment_obj.gilded_platinum = comment.gildings['gid_3']
+        comment_obj = Comment.objects.get(id=comment['id'])
+        comment_obj.score = comment['score']
+        comment_obj.gilded_silver = comment['gildings']['gid_1']
+        comment_obj.gilded_gold = comment['gildings']['gid_2']
+        comment_obj.gilded_platinum = comment['gildings']['gid_3']
         comment_obj.save()
 
 
+def create_submission_obj(submission, rank) -> Submission:
+    """Creates a models.Submission object from a Praw submission object.
+
+    Runs the fetch, analyze and persist stages of the pipeline in-process.
+
+    Args:
+        submission: the source Praw submission object;
+        rank: the current rank (1-100) of the submission
+
+    Returns:
+        Submission: the created models.Submission object
+    """
+    data = fetch_submission_data(submission)
+    if unknown_subreddits([data]):
+        data.update(subreddit_data(submission.subreddit))
+    return create_submission(analyze_submission_data(data), rank)
+
+
+def update_submission_obj(submission, rank=None) -> Submission:
+    """Updates an existing models.Submission object from a Praw submission object.
+
+    Runs the fetch, analyze and persist stages of the pipeline in-process.
+
+    Args:
+        submission: the source Praw submission object;
+        rank: the current rank (1-100) of the submission, or None to leave it
+            unchanged
+
+    Returns:
+        Submission: the updated models.Submission object
+    """
+    data = analyze_submission_data(fetch_submission_data(submission))
+    return update_submission(Submission.objects.get(id=submission.id), data,
+                             rank)
+
+
+def create_comment_obj(comment, submission_obj):
+    """Creates a models.Comment object from a Praw comment object.
+
+    Args:
+        comment: the source Praw comment object;
+        submission_obj: the models.Submission object parent to the comment
+    """
+    save_comment(comment_data(comment), submission_obj)
+
+
 def update_subreddit_obj(submission_obj) -> Subreddit:
     """Updates an existing models.Subreddit object with a submission's stats.
 
@@ -297,34 +567,42 @@ def update_subreddit_obj(submission_obj) -> Subreddit:
     subreddit.num_comments = subreddit.num_comments + submission_obj.num_comments
     subreddit.tracked_submissions = subreddit.tracked_submissions + 1
     subreddit.save()
+    leaderboards.update_subreddit(subreddit)
 
     return subreddit
 
 
-def create_submission_tracker_objs(submission_obj, submission):
+def create_submission_tracker_objs(submission_obj):
     """Creates tracker objects for a given submission.
 
     Creates the following objects in the database for this submission:
         SubmissionScore, SubmissionNumComments, SubmissionUpvoteRatio
 
     Args:
-        submission_obj: the source models.Submission object;
-        submission: the source Praw submission object
+        submission_obj: the source models.Submission object, once updated
     """
     submission_score = SubmissionScore(
         submission=submission_obj,
-        score=submission.score)
+        score=submission_obj.score)
     submission_num_comments = SubmissionNumComments(
         submission=submission_obj,
-        num_comments=submission.num_comments)
+        num_comments=submission_obj.num_comments)
     submission_upvote_ratio = SubmissionUpvoteRatio(
         submission=submission_obj,
-        upvote_ratio=submission.upvote_ratio)
+        upvote_ratio=submission_obj.upvote_ratio)
 
     submission_score.save()
     submission_num_comments.save()
     submission_upvote_ratio.save()
 
+    # keep the submission's tracking window up to date
+    if submission_obj.first_seen_at is None:
+        submission_obj.first_seen_at = submission_score.timestamp
+    submission_obj.last_seen_at = submission_score.timestamp
+    Submission.objects.filter(id=submission_obj.id).update(
+        first_seen_at=submission_obj.first_seen_at,
+        last_seen_at=submission_obj.last_seen_at)
+
 
 def create_cumulative_tracker_objs(submission_obj):
     """Creates cumulative tracker objects from a given submission.
@@ -351,8 +629,11 @@ def create_cumulative_tracker_objs(submission_obj):
     total_num_comments = TotalNumComments(
         num_comments=latest_num_comments + submission_obj.num_comments)
 
-    total_score.save()
-    total_num_comments.save()
+    with transaction.atomic():
+        total_score.save()
+        total_num_comments.save()
+        update_site_stats(score=submission_obj.score,
+                          num_comments=submission_obj.num_comments)
 
 
 def create_subreddit_tracker_objs(subreddit):
@@ -375,77 +656,360 @@ def create_subreddit_tracker_objs(subreddit):
     subreddit_num_comments.save()
 
 
-@app.task
-def get_top_submissions():
-    """Retrieves the top 100 posts on /r/all and creates appropriate DB objs.
+def cycle_done(cycle, id):
+    """Checkpoints one of an ingestion cycle's new submissions as done.
 
-    This function is the main driver for collecting stats. It retrieves a list
-    of the top submissions and creates corresponding objects in the database.
+    Once all of them are done, whether saved or given up on, the cycle is
+    finalized.
 
-    Subreddit and cumulative tracker objects are created when submissions leave
-    the top 100, as a way to ensure they are only tallied once.
+    Args:
+        cycle: the id of the cycle;
+        id: the id of the submission
+    """
+    if cycles.done(cycle, id):
+        finalize_cycle.delay(cycle)
+
+
+def resumes(cycle, id) -> bool:
+    """Checks whether a stage should go on with one of a cycle's submissions.
+
+    Tasks are acknowledged late, so a stage may be redelivered after its
+    submission was saved, or after its cycle was abandoned for a newer one.
+
+    Args:
+        cycle: the id of the cycle, or None if the submission is being polled;
+        id: the id of the submission
+
+    Returns:
+        bool: whether the submission still needs saving
+    """
+    if cycle is None:
+        return True
+    return cycles.heartbeat(cycle) and cycles.is_pending(cycle, id)
+
+
+class SubmissionStage(Task):
+    """A stage of the pipeline which submissions pass through.
+
+    Each stage's first argument is a submission's id, its data, or a list of
+    submission ids. If the stage fails for good, its submissions are counted
+    as done, so that their cycle is still finalized.
     """
-    subreddit = reddit.subreddit('all')
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        if kwargs.get('cycle') is not None:
+            if isinstance(args[0], list):
+                ids = args[0]
+            else:
+                ids = [args[0] if isinstance(args[0], str) else args[0]['id']]
+            for id in ids:
+                cycle_done(kwargs['cycle'], id)
+
+
+@app.task(autoretry_for=RETRY_FOR, retry_backoff=True)
+def get_top_submissions():
+    """Retrieves the top 100 posts on /r/all, starting an ingestion cycle.
+
+    This function is the main driver for collecting stats. Ingestion is split
+    into stages, each on its own queue (see task_routes in settings.py) so
+    that workers can be scaled per stage:
+        fetch: get_top_submissions, fetch_submissions, fetch_submission,
+            poll_submissions
+        analyze: analyze_submission
+        persist: persist_listing, persist_submission
+        finalize: finalize_cycle
+
+    Stages pass JSON-serializable payloads to each other, and are retried
+    independently when Reddit or the database are briefly unavailable.
+
+    Only one cycle runs at a time, see cycles.py. If the previous cycle is
+    still running, this one is skipped.
+    """
+    cycle = uuid.uuid4().hex
+    if not cycles.acquire(cycle):
+        return
 
-    # get current top 100 submissions
     try:
-        submissions = [submission for submission in subreddit.hot(limit=100)]
-    except prawcore.exceptions.RequestException:
-        # reddit api is likely unavailable
+        with ratelimit.prioritized(ratelimit.LISTING):
+            subreddit = reddit.subreddit('all')
+            listing = [listing_data(submission)
+                       for submission in subreddit.hot(limit=100)]
+    except Exception:
+        cycles.release(cycle)
+        raise
+    persist_listing.delay(listing, cycle)
+
+
+@app.task(autoretry_for=RETRY_FOR, retry_backoff=True)
+def persist_listing(listing, cycle):
+    """Updates the ranks of the top 100, and sends new submissions to be fetched.
+
+    Submissions already in the database only have their ranks updated here;
+    they are otherwise polled on their own schedule by poll_submissions.
+
+    If this is redelivered, only the new submissions which are still to be
+    saved are sent again.
+
+    Args:
+        listing: the listing_data() of each submission in the top 100, in
+            order;
+        cycle: the id of the ingestion cycle
+    """
+    if not cycles.heartbeat(cycle):
         return
 
-    # create/update db submission objects
-    rank = 0
-    submission_objs = []
-    frontpage_score = 0
-    frontpage_num_comments = 0
-    for submission in submissions:
-        rank += 1
-
-        # track running variables
-        frontpage_score += submission.score
-        frontpage_num_comments += submission.num_comments
-
-        try:
-            # check if this submission already exists in the db
-            if Submission.objects.filter(id=submission.id):
-                submission_obj = update_submission_obj(submission, rank)
-            else:
-                submission_obj = create_submission_obj(submission, rank)
-            submission_objs.append(submission_obj)
-            create_submission_tracker_objs(submission_obj, submission)
-        except prawcore.exceptions.RequestException:
-            # reddit api is likely unavailable
-            continue
+    if cache.get("cycle_%s" % cycle) is None:
+        ids = [data['id'] for data in listing]
+        existing = set(Submission.objects.filter(id__in=ids)
+                       .values_list('id', flat=True))
+        new = [data['id'] for data in listing if data['id'] not in existing]
+
+        with transaction.atomic():
+            for rank, data in enumerate(listing, 1):
+                if data['id'] in existing:
+                    submission_obj = rerank_submission_obj(data, rank)
+                    submission_obj.save()
+                    leaderboards.update_submission(submission_obj)
+
+        cycles.start(cycle, new)
+        cache.set("cycle_%s" % cycle, {
+            'ids': ids,
+            'created': len(new),
+            'score': sum(data['score'] for data in listing),
+            'num_comments': sum(data['num_comments'] for data in listing),
+            'averaged': False
+        }, settings.PIPELINE_CYCLE_TIMEOUT)
+
+    pending = cycles.pending(cycle)
+    if not pending:
+        finalize_cycle.delay(cycle)
+        return
+    ranks = {data['id']: rank for rank, data in enumerate(listing, 1)}
+    fetch_submissions.delay(pending, ranks={id: ranks[id] for id in pending},
+                            cycle=cycle)
 
-    # reset rank for submissions no longer in top 100
-    submission_ids = [submission.id for submission in submissions]
-    modified_subreddits = []
-    for submission_obj in Submission.objects.filter(rank__gt=0):
-        if submission_obj.id not in submission_ids:
-            create_cumulative_tracker_objs(submission_obj)
-            subreddit = update_subreddit_obj(submission_obj)
 
-            if subreddit not in modified_subreddits:
-                modified_subreddits.append(subreddit)
+@app.task(base=SubmissionStage, autoretry_for=RETRY_FOR, retry_backoff=True)
+def fetch_submission(id, rank=None, cycle=None, priority=ratelimit.HOT):
+    """Fetches a submission and its comments, and sends them to be analyzed.
+
+    Args:
+        id: the id of the submission;
+        rank: the current rank (1-100) of the submission, or None if it's
+            being polled;
+        cycle: the id of the ingestion cycle, or None if it's being polled;
+        priority: the priority of the requests, see ratelimit.py
+    """
+    if not resumes(cycle, id):
+        return
+    with ratelimit.prioritized(priority):
+        data = fetch_submission_by_id(reddit, id)
+        if unknown_subreddits([data]):
+            data.update(fetch_subreddit_by_name(reddit, data['subreddit']))
+    analyze_submission.delay(data, rank=rank, cycle=cycle)
+
+
+@app.task(base=SubmissionStage, autoretry_for=RETRY_FOR, retry_backoff=True)
+def fetch_submissions(ids, ranks=None, cycle=None, priority=ratelimit.HOT):
+    """Fetches many submissions and their comments concurrently, and sends
+    each to be analyzed.
+
+    Up to settings.FETCH_MAX_IN_FLIGHT requests are made at once. Submissions
+    which couldn't be fetched are sent to fetch_submission, to be retried on
+    their own.
 
-            submission_obj.rank = -1
-            submission_obj.save()
+    Args:
+        ids: the ids of the submissions;
+        ranks: the current rank (1-100) of each submission keyed by id, or
+            None if they're being polled;
+        cycle: the id of the ingestion cycle, or None if they're being polled;
+        priority: the priority of the requests, see ratelimit.py
+    """
+    ranks = ranks or {}
+    ids = [id for id in ids if resumes(cycle, id)]
+
+    fetched = {}
+    for id, data, error in submission_fetcher.fetch(
+            fetch_submission_by_id, ids, priority):
+        if error is not None:
+            fetch_submission.delay(id, rank=ranks.get(id), cycle=cycle,
+                                   priority=priority)
+        else:
+            fetched[id] = data
+        if cycle is not None and not cycles.heartbeat(cycle):
+            return
+
+    # describe new subreddits, also concurrently
+    subreddits = {}
+    for name, description, error in submission_fetcher.fetch(
+            fetch_subreddit_by_name,
+            unknown_subreddits(fetched.values()), priority):
+        if error is None:
+            subreddits[name] = description
+
+    for id, data in fetched.items():
+        data.update(subreddits.get(data['subreddit'], {}))
+        analyze_submission.delay(data, rank=ranks.get(id), cycle=cycle)
+
+
+@app.task(base=SubmissionStage, autoretry_for=RETRY_FOR, retry_backoff=True)
+def analyze_submission(data, rank=None, cycle=None):
+    """Analyzes a fetched submission, and sends it to be saved.
+
+    Args:
+        data: the fetch_submission_data() of the submission;
+        rank: see fetch_submission;
+        cycle: see fetch_submission
+    """
+    if not resumes(cycle, data['id']):
+        return
+    persist_submission.delay(analyze_submission_data(data), rank=rank,
+                             cycle=cycle)
+
+
+@app.task(base=SubmissionStage, autoretry_for=RETRY_FOR, retry_backoff=True)
+def persist_submission(data, rank=None, cycle=None):
+    """Saves an analyzed submission, and schedules when it's next polled.
+
+    Args:
+        data: the analyze_submission_data() of the submission;
+        rank: see fetch_submission;
+        cycle: see fetch_submission
+    """
+    if not resumes(cycle, data['id']):
+        return
+
+    submission_obj = Submission.objects.filter(id=data['id']).first()
+    if submission_obj is not None:
+        update_submission(submission_obj, data, rank)
+        create_submission_tracker_objs(submission_obj)
+        leaderboards.update_submission(submission_obj)
+
+        interval = scheduler.polled(data['id'], data['score'],
+                                    data['num_comments'])
+        if rank is None and submission_obj.rank > 0:
+            scheduler.schedule({submission_obj.id: interval})
+    elif rank is not None:
+        submission_obj = create_submission(data, rank)
+        create_submission_tracker_objs(submission_obj)
+        leaderboards.update_submission(submission_obj)
+        scheduler.schedule({submission_obj.id: scheduler.polled(
+            data['id'], data['score'], data['num_comments'])})
+
+    if cycle is not None:
+        cycle_done(cycle, data['id'])
+
+
+def retire_submission_obj(submission_obj) -> Subreddit:
+    """Tallies a submission which has left the top 100, exactly once.
+
+    The submission's rank is reset in the same transaction as its cumulative
+    and subreddit stats are added, and only if it's still ranked, so that
+    retiring it again has no effect.
+
+    Args:
+        submission_obj: the models.Submission object
+
+    Returns:
+        Subreddit: the updated models.Subreddit object, or None if the
+            submission was already retired
+    """
+    with transaction.atomic():
+        retired = Submission.objects.filter(
+            id=submission_obj.id, rank__gt=0).update(rank=-1)
+        if not retired:
+            return None
+        submission_obj.rank = -1
+        create_cumulative_tracker_objs(submission_obj)
+        return update_subreddit_obj(submission_obj)
+
+
+@app.task(autoretry_for=RETRY_FOR, retry_backoff=True)
+def finalize_cycle(cycle):
+    """Tallies submissions which left the top 100, and publishes the cycle.
+
+    Subreddit and cumulative tracker objects are created when submissions leave
+    the top 100, as a way to ensure they are only tallied once. Each step can
+    be safely repeated if this is redelivered.
+
+    Args:
+        cycle: the id of the ingestion cycle
+    """
+    summary = cache.get("cycle_%s" % cycle)
+    if summary is None or not cycles.heartbeat(cycle):
+        # the cycle was finalized already, or abandoned
+        return
+    submission_ids = summary['ids']
+
+    # reset rank for submissions no longer in top 100
+    modified_subreddits = []
+    exited_ids = []
+    for submission_obj in Submission.objects.filter(rank__gt=0) \
+            .exclude(id__in=submission_ids):
+        exited_ids.append(submission_obj.id)
+        subreddit = retire_submission_obj(submission_obj)
+        if subreddit is not None and subreddit not in modified_subreddits:
+            modified_subreddits.append(subreddit)
 
     for subreddit in modified_subreddits:
         create_subreddit_tracker_objs(subreddit)
 
-    # create new frontpage tracker objects
-    average_score = AverageScore(score=frontpage_score/100)
-    average_score.save()
-    average_num_comments = AverageNumComments(
-        num_comments=frontpage_num_comments/100)
-    average_num_comments.save()
-
-    # save all submission db objects
-    for submission_obj in submission_objs:
-        submission_obj.save()
+    if not summary['averaged']:
+        # create new frontpage tracker objects, unless they were created
+        # before this was redelivered
+        with transaction.atomic():
+            if not AverageScore.objects.filter(cycle=cycle).exists():
+                average_score = AverageScore(score=summary['score']/100,
+                                             cycle=cycle)
+                average_score.save()
+                average_num_comments = AverageNumComments(
+                    num_comments=summary['num_comments']/100, cycle=cycle)
+                average_num_comments.save()
+        summary['averaged'] = True
+        cache.set("cycle_%s" % cycle, summary,
+                  settings.PIPELINE_CYCLE_TIMEOUT)
+
+        # move searches on to a new generation of cache keys
+        if summary['created']:
+            try:
+                cache.incr("search_generation")
+            except ValueError:
+                cache.set("search_generation", 1, None)
+
+    # poll any submissions not yet scheduled straight away
+    scheduler.unschedule(exited_ids)
+    scheduler.schedule({id: 0 for id in submission_ids}, replace=False)
+
+    # push changes to the top 100 to clients of /stream
+    frontpage.publish_cycle()
 
     # delete cached page responses
     cache.delete("home_response")
     cache.delete("subreddits_response")
+
+    cache.delete("cycle_%s" % cycle)
+    cycles.release(cycle)
+
+
+@app.task
+def poll_submissions():
+    """Sends the submissions in the top 100 which are due to be polled to be
+    fetched, see scheduler.py.
+
+    Each submission is polled at an interval suited to how quickly its score
+    and comments have recently been changing, so fast risers are sampled
+    more often than stale submissions. persist_submission schedules the next
+    poll.
+    """
+    ids = scheduler.due(settings.POLL_BATCH_SIZE)
+    ranks = dict(Submission.objects.filter(id__in=ids, rank__gt=0)
+                 .values_list('id', 'rank'))
+    scheduler.unschedule([id for id in ids if id not in ranks])
+
+    # submissions near the top are fetched before the rest
+    hot = [id for id in ids
+           if id in ranks and ranks[id] <= settings.RATELIMIT_HOT_RANK]
+    cold = [id for id in ids if id in ranks and id not in hot]
+    if hot:
+        fetch_submissions.delay(hot, priority=ratelimit.HOT)
+    if cold:
+        fetch_submissions.delay(cold, priority=ratelimit.COLD)
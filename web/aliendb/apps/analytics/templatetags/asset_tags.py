@@ -0,0 +1,25 @@
+from django import template
+from django.conf import settings
+import json
+
+register = template.Library()
+
+# the asset manifest written by compress.sh, loaded once per process
+_manifest = None
+
+
+def manifest() -> dict:
+    """Loads the asset manifest, which is empty if assets aren't built."""
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(settings.ASSET_MANIFEST) as manifest_file:
+                _manifest = json.load(manifest_file)
+        except (IOError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+@register.simple_tag
+def asset(path):
+    return settings.STATIC_URL + manifest().get(path, path)
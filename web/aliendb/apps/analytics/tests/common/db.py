@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVector
 from ...models import *
 from ...views import *
 import datetime
@@ -37,6 +38,8 @@ def create_dummy_models():
         gilded_gold=2,
         gilded_platinum=3,
         created_at=datetime.datetime(2017, 10, 11, 12, 13, 14))
+    Submission.objects.filter(id=submission.id).update(
+        search_vector=SearchVector('title'))
     comment = Comment.objects.create(
         id="000002",
         submission=submission,
@@ -64,3 +67,5 @@ def create_dummy_models():
     upvote_ratio = SubmissionUpvoteRatio.objects.create(
         submission=submission,
         upvote_ratio=submission.upvote_ratio)
+    Submission.objects.filter(id=submission.id).update(
+        first_seen_at=score.timestamp, last_seen_at=score.timestamp)
@@ -0,0 +1,17 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from ...cache import isolated_settings
+
+
+class IsolatedCacheRunner(DiscoverRunner):
+    """Runs tests against a cache of their own, since many flush it, so that
+    tests run alongside the site leave its cache alone."""
+
+    def setup_test_environment(self, **kwargs):
+        super(IsolatedCacheRunner, self).setup_test_environment(**kwargs)
+        self.cache_settings = override_settings(**isolated_settings())
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        super(IsolatedCacheRunner, self).teardown_test_environment(**kwargs)
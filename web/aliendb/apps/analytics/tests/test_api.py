@@ -1,5 +1,7 @@
+from django.core.cache import cache
 from django.test import TestCase, Client
 from django.test.utils import override_settings
+from ..models import Submission, SubmissionScore
 from .common.db import create_dummy_models
 
 
@@ -10,6 +12,7 @@ class APITest(TestCase):
     def setUp(self):
         self.client = Client()
         create_dummy_models()
+        cache.clear()
 
     def test_api_submission_200(self):
         # run twice to hit the cache
@@ -40,3 +43,59 @@ class APITest(TestCase):
                 '/api?name=cumulative&timerange=%s' % timerange
             )
             self.assertEqual(response.status_code, 200)
+
+    def test_api_submissions_batch(self):
+        single = self.client.get('/api?name=submission&id=000001').json()
+        cache.clear()
+        response = self.client.get(
+            '/api?name=submission&ids=000001,222222,000001')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(list(data), ['000001', '222222'])
+        self.assertEqual(data['000001'], single)
+        self.assertIsNone(data['222222'])
+
+    def test_api_submissions_batch_cached(self):
+        response1 = self.client.get('/api?name=submission&ids=000001')
+        with self.assertNumQueries(0):
+            response2 = self.client.get('/api?name=submission&ids=000001')
+        self.assertEqual(response1.content, response2.content)
+
+    def test_api_subreddits_batch(self):
+        single = self.client.get('/api?name=subreddit&id=testsubreddit').json()
+        cache.clear()
+        response = self.client.get(
+            '/api?name=subreddit&ids=testsubreddit,emptysubreddit,notreal')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['testsubreddit'], single)
+        self.assertIsNotNone(data['emptysubreddit'])
+        self.assertIsNone(data['notreal'])
+
+    def test_api_invalid_name_404(self):
+        response = self.client.get('/api?name=notaname')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api?name=cumulative&ids=day')
+        self.assertEqual(response.status_code, 404)
+
+    def test_api_points(self):
+        submission = Submission.objects.get(id='000001')
+        for score in range(100):
+            SubmissionScore.objects.create(submission=submission, score=score)
+        response = self.client.get('/api?name=submission&id=000001&points=10')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['activity']['scores']), 10)
+        assert cache.get("submission_points_10_000001") is not None
+
+        response = self.client.get('/api?name=submission&id=000001')
+        self.assertEqual(len(response.json()['activity']['scores']), 101)
+
+        response = self.client.get('/api?name=submission&ids=000001&points=5')
+        self.assertEqual(
+            len(response.json()['000001']['activity']['scores']), 5)
+
+    def test_api_points_404(self):
+        for points in ['2', 'abc', '100000']:
+            response = self.client.get(
+                '/api?name=cumulative&timerange=day&points=%s' % points)
+            self.assertEqual(response.status_code, 404)
@@ -0,0 +1,29 @@
+import json
+import os
+import tempfile
+from django.test import TestCase
+from django.test.utils import override_settings
+from ..templatetags import asset_tags
+
+
+class AssetTagsTest(TestCase):
+    def setUp(self):
+        asset_tags._manifest = None
+
+    def tearDown(self):
+        asset_tags._manifest = None
+
+    def test_asset(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'manifest.json')
+            with open(path, 'w') as manifest_file:
+                json.dump({'js/main.min.js': 'js/main.min.0123456789ab.js'},
+                          manifest_file)
+            with override_settings(ASSET_MANIFEST=path):
+                self.assertEqual(asset_tags.asset('js/main.min.js'),
+                                 '/js/main.min.0123456789ab.js')
+
+    def test_asset_unbuilt(self):
+        with override_settings(ASSET_MANIFEST='/nonexistent/manifest.json'):
+            self.assertEqual(asset_tags.asset('js/main.min.js'),
+                             '/js/main.min.js')
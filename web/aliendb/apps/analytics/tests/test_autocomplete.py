@@ -0,0 +1,58 @@
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.test.utils import override_settings
+from .. import autocomplete
+from ..autocomplete import PrefixTrie
+from ..models import Subreddit
+from .common.db import create_dummy_models
+
+
+class PrefixTrieTest(TestCase):
+    def test_complete(self):
+        trie = PrefixTrie([('pics', 5), ('Python', 20), ('pcmasterrace', 1),
+                           ('politics', 10)], 2)
+        self.assertEqual(trie.complete('p'), ['Python', 'politics'])
+        self.assertEqual(trie.complete('P'), ['Python', 'politics'])
+        self.assertEqual(trie.complete('pi'), ['pics'])
+        self.assertEqual(trie.complete('pics'), ['pics'])
+        self.assertEqual(trie.complete('picsx'), [])
+
+
+@override_settings(DEBUG=True)
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        create_dummy_models()
+        cache.clear()
+        autocomplete._trie = None
+
+    def test_autocomplete(self):
+        response = self.client.get('/autocomplete?q=Test')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'subreddits': ['testsubreddit'],
+            'submissions': []
+        })
+
+    def test_autocomplete_titles(self):
+        response = self.client.get('/autocomplete?q=TITLE')
+        self.assertEqual(response.json()['submissions'],
+                         [{'id': '000001', 'title': 'mytitle'}])
+
+    def test_autocomplete_similar(self):
+        response = self.client.get('/autocomplete?q=testsubredit')
+        self.assertEqual(response.json()['subreddits'], ['testsubreddit'])
+
+    def test_autocomplete_empty(self):
+        response = self.client.get('/autocomplete')
+        self.assertEqual(response.json(),
+                         {'subreddits': [], 'submissions': []})
+
+    def test_trie_refreshed(self):
+        self.assertEqual(autocomplete.subreddits('new'), [])
+        Subreddit.objects.create(name='newsubreddit')
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.subreddit_trie().complete('new'),
+                             [])
+        cache.incr("search_generation")
+        self.assertEqual(autocomplete.subreddits('new'), ['newsubreddit'])
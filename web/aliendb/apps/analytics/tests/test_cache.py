@@ -1,7 +1,12 @@
 from django.test import TestCase, Client
 from django.test.utils import override_settings
 from django.core.cache import cache
+from django_redis.exceptions import CompressorError
+from ..cache import (LocalTier, SeriesSerializer, ThresholdCompressor,
+                     _MISSING)
 from .common.db import create_dummy_models
+import pickle
+import time
 
 
 @override_settings(DEBUG=False)
@@ -30,3 +35,138 @@ class CacheTest(TestCase):
         response = self.client.get('/subreddit/testsubreddit')
         cached = cache.get("subreddit_response_testsubreddit")
         self.assertEqual(response.content, cached.content)
+
+
+class TwoTierCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache.reset_stats()
+
+    def test_local_hit(self):
+        cache.set("two_tier_key", {'value': 1})
+        self.assertEqual(cache.get("two_tier_key"), {'value': 1})
+        self.assertEqual(cache.stats()['local']['hits'], 1)
+        self.assertEqual(cache.stats()['redis']['hits'], 0)
+
+    def test_local_copies(self):
+        # each read gets its own copy, as it would from Redis
+        cache.set("two_tier_key", {'value': [1]})
+        value = cache.get("two_tier_key")
+        value['value'].append(2)
+        self.assertEqual(cache.get("two_tier_key"), {'value': [1]})
+        self.assertIsNot(cache.get("two_tier_key"), cache.get("two_tier_key"))
+
+        # immutable values are shared rather than copied
+        cache.set("two_tier_key", 'value' * 100)
+        self.assertIs(cache.get("two_tier_key"), cache.get("two_tier_key"))
+
+    def test_redis_fallback(self):
+        cache.set("two_tier_key", {'value': 1})
+        cache.local.clear()
+        self.assertEqual(cache.get("two_tier_key"), {'value': 1})
+        self.assertEqual(cache.get("two_tier_key"), {'value': 1})
+        stats = cache.stats()
+        self.assertEqual(stats['local'], {'hits': 1, 'misses': 1})
+        self.assertEqual(stats['redis'], {'hits': 1, 'misses': 0})
+
+    def test_get_many(self):
+        cache.set_many({"two_tier_a": 1, "two_tier_b": 2})
+        cache.local.delete(cache._local_key("two_tier_b"))
+        values = cache.get_many(["two_tier_a", "two_tier_b", "two_tier_c"])
+        self.assertEqual(values, {"two_tier_a": 1, "two_tier_b": 2})
+        stats = cache.stats()
+        self.assertEqual(stats['local'], {'hits': 1, 'misses': 2})
+        self.assertEqual(stats['redis'], {'hits': 1, 'misses': 1})
+
+    def test_delete(self):
+        cache.set("two_tier_key", 'value')
+        cache.delete("two_tier_key")
+        self.assertIsNone(cache.get("two_tier_key"))
+
+    def test_remote_invalidation(self):
+        cache.set_many({"two_tier_a": 1, "two_tier_b": 2})
+        local_keys = [cache._local_key("two_tier_a"),
+                      cache._local_key("two_tier_b")]
+
+        # simulate another process changing the keys, in one message
+        cache.client.get_client().publish(
+            cache._channel, "otherprocess:%s" % '\n'.join(local_keys))
+        for _ in range(50):
+            if cache.local.get(local_keys[1]) is _MISSING:
+                break
+            time.sleep(0.05)
+        self.assertIs(cache.local.get(local_keys[0]), _MISSING)
+        self.assertIs(cache.local.get(local_keys[1]), _MISSING)
+
+    def test_own_invalidation_ignored(self):
+        cache.set("two_tier_key", 'value')
+        time.sleep(0.2)
+        self.assertEqual(cache.get("two_tier_key"), 'value')
+        self.assertEqual(cache.stats()['local']['hits'], 1)
+
+    def test_lru_eviction(self):
+        tier = LocalTier(max_entries=2, timeout=10)
+        tier.set('a', 1)
+        tier.set('b', 2)
+        tier.get('a')
+        tier.set('c', 3)
+        self.assertEqual(tier.get('a'), 1)
+        self.assertIs(tier.get('b'), _MISSING)
+        self.assertEqual(tier.get('c'), 3)
+
+    def test_local_expiry(self):
+        tier = LocalTier(max_entries=2, timeout=0.05)
+        tier.set('a', 1, timeout=1200)
+        time.sleep(0.1)
+        self.assertIs(tier.get('a'), _MISSING)
+
+
+class SerializerTest(TestCase):
+    def setUp(self):
+        self.serializer = SeriesSerializer({})
+        self.compressor = ThresholdCompressor({'COMPRESS_MIN_LENGTH': 64})
+
+    def test_series_roundtrip(self):
+        data = {
+            'activity': {
+                'scores': [[1119484800000.0 + i * 1200000, 100 + i * 7]
+                           for i in range(50)],
+                'comments': [[1119484800000.0, 3], [1119486000000.0, 5]]
+            },
+            'upvote_ratio': {
+                'upvote_ratios': [[1119484800000.0 + i, 0.5 + i / 100]
+                                  for i in range(50)],
+                'average_upvote_ratio': 0.91
+            },
+            'mixed': [[float(i), i if i % 2 else float(i)] for i in range(50)],
+            'totals': [[float(i), 2 ** 62 + i] for i in range(50)]
+        }
+        loaded = self.serializer.loads(self.serializer.dumps(data))
+        self.assertEqual(loaded, data)
+        self.assertEqual(
+            [[type(t), type(v)] for t, v in loaded['mixed']],
+            [[type(t), type(v)] for t, v in data['mixed']])
+        self.assertIs(type(loaded['activity']['scores'][0][1]), int)
+        self.assertIs(type(loaded['activity']['scores'][0][0]), float)
+
+    def test_series_smaller_than_pickle(self):
+        data = {'scores': [[1119484800000.0 + i * 1200000, 100 + i * 7]
+                           for i in range(500)]}
+        packed = self.compressor.compress(self.serializer.dumps(data))
+        self.assertLess(len(packed), len(pickle.dumps(data, -1)) / 4)
+
+    def test_compress_threshold(self):
+        small = b'\x80' + b'a' * 10
+        large = b'\x80' + b'a' * 1000
+        self.assertEqual(self.compressor.compress(small), small)
+        compressed = self.compressor.compress(large)
+        self.assertLess(len(compressed), len(large))
+        self.assertEqual(self.compressor.decompress(compressed), large)
+        self.assertRaises(CompressorError, self.compressor.decompress, small)
+
+    def test_cache_roundtrip(self):
+        # values pickled before compression was enabled must still load
+        data = {'scores': [[float(i), i] for i in range(100)]}
+        legacy = pickle.dumps(data, -1)
+        self.assertEqual(cache.client.decode(legacy), data)
+        self.assertEqual(cache.client.decode(cache.client.encode(data)), data)
@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from django.test import TestCase
+from .. import cycles
+
+
+class CyclesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_lock(self):
+        assert cycles.acquire('first')
+        assert not cycles.acquire('second')
+        assert cycles.heartbeat('first')
+        assert not cycles.heartbeat('second')
+
+        # only the cycle holding the lock can release it
+        cycles.release('second')
+        assert not cycles.acquire('second')
+        cycles.release('first')
+        assert not cycles.heartbeat('first')
+        assert cycles.acquire('second')
+
+    def test_checkpoints(self):
+        cycles.start('cycle', ['a', 'b'])
+        cycles.start('empty', [])
+        self.assertEqual(cycles.pending('cycle'), ['a', 'b'])
+        self.assertEqual(cycles.pending('empty'), [])
+
+        assert not cycles.done('cycle', 'a')
+        assert not cycles.is_pending('cycle', 'a')
+        assert cycles.is_pending('cycle', 'b')
+
+        # the last submission finishes the cycle, even if repeated
+        assert cycles.done('cycle', 'b')
+        assert not cycles.done('cycle', 'b')
+        assert not cycles.done('cycle', 'a')
+        self.assertEqual(cycles.pending('cycle'), [])
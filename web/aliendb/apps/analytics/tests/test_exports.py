@@ -0,0 +1,69 @@
+from django.test import TestCase, Client
+from ..models import *
+from .common.db import create_dummy_models
+import csv
+import io
+import json
+
+
+class ExportsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        create_dummy_models()
+        submission = Submission.objects.get(id='000001')
+        for score in range(1, 6):
+            SubmissionScore.objects.create(submission=submission, score=score)
+
+    def content(self, response) -> str:
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        response = self.client.get(
+            '/export?name=submission&id=000001&series=scores')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line)
+                for line in self.content(response).splitlines()]
+        self.assertEqual([row['value'] for row in rows],
+                         [10000, 1, 2, 3, 4, 5])
+        self.assertTrue(all(row['series'] == 'scores' for row in rows))
+
+    def test_export_csv(self):
+        response = self.client.get(
+            '/export?name=submission&id=000001&format=csv')
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(io.StringIO(self.content(response))))
+        self.assertEqual(rows[0], ['series', 'timestamp', 'value'])
+        series = [row[0] for row in rows[1:]]
+        self.assertEqual(series.count('scores'), 6)
+        self.assertEqual(series.count('comments'), 1)
+        self.assertEqual(series.count('upvote_ratios'), 1)
+
+    def test_export_cumulative(self):
+        TotalScore.objects.create(score=5)
+        response = self.client.get(
+            '/export?name=cumulative&series=total_scores&timerange=day')
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line)
+                for line in self.content(response).splitlines()]
+        self.assertEqual([row['value'] for row in rows], [5])
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="cumulative_day.ndjson"')
+
+        # ids aren't used for cumulative data, so aren't put in the header
+        response = self.client.get(
+            '/export?name=cumulative&timerange=day&id=a%22b%0Ac')
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="cumulative_day.ndjson"')
+
+    def test_export_404(self):
+        urls = [
+            '/export?name=submission&id=222222',
+            '/export?name=subreddit&id=notarealsubreddit',
+            '/export?name=submission&id=000001&series=notaseries',
+            '/export?name=cumulative&timerange=notatimerange',
+            '/export?name=submission&id=000001&format=xml',
+            '/export?name=notaname'
+        ]
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 404)
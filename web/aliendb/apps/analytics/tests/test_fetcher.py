@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from ..fetcher import Fetcher
+from ..replay import FakeRedditServer
+from ..tasks import fetch_submission_by_id, fetch_subreddit_by_name
+
+GILDINGS = {'gid_1': 0, 'gid_2': 0, 'gid_3': 0}
+
+
+class FetcherTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.server = FakeRedditServer()
+        self.server.start()
+        self.server.subreddits['pics'] = {'display_name': 'pics',
+                                          'title': 'Pictures',
+                                          'public_description': 'Pics'}
+        for i in range(12):
+            id = 's%d' % i
+            self.server.submissions[id] = {
+                'id': id, 'subreddit': 'pics', 'title': 'title %d' % i,
+                'author': 'author', 'score': i, 'num_comments': 2,
+                'domain': 'i.redd.it', 'link_flair_text': None,
+                'upvote_ratio': 0.9, 'stickied': False, 'over_18': False,
+                'spoiler': False, 'locked': False, 'gildings': GILDINGS,
+                'created_utc': 1500000000.0}
+            self.server.comments[id] = [{
+                'id': '%sc%d' % (id, j), 'body': 'comment %d' % j,
+                'author': 'commenter', 'distinguished': None, 'score': j,
+                'gildings': GILDINGS, 'created_utc': 1500000000.0}
+                for j in range(2)]
+        self.fetcher = Fetcher(max_in_flight=4, oauth_url=self.server.url,
+                               reddit_url=self.server.url,
+                               check_for_updates=False)
+
+    def tearDown(self):
+        self.fetcher.shutdown()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fetch(self):
+        self.server.latency = 0.05
+        results = {id: (data, error) for id, data, error in self.fetcher.fetch(
+            fetch_submission_by_id, ['s%d' % i for i in range(12)])}
+
+        self.assertEqual(len(results), 12)
+        data, error = results['s3']
+        self.assertIsNone(error)
+        self.assertEqual(data['title'], 'title 3')
+        self.assertEqual(data['subreddit'], 'pics')
+        self.assertEqual([c['id'] for c in data['comments']],
+                         ['s3c0', 's3c1'])
+        self.assertTrue(data['comments'][0]['is_root'])
+
+        # requests overlap, but no more than max_in_flight at once
+        self.assertGreater(self.server.max_in_flight, 1)
+        self.assertLessEqual(self.server.max_in_flight, 4)
+
+    def test_fetch_error(self):
+        results = {id: (data, error) for id, data, error in self.fetcher.fetch(
+            fetch_submission_by_id, ['s1', 'missing'])}
+        self.assertIsNone(results['s1'][1])
+        self.assertIsNone(results['missing'][0])
+        self.assertIsNotNone(results['missing'][1])
+
+    def test_fetch_subreddit(self):
+        results = list(self.fetcher.fetch(fetch_subreddit_by_name, ['pics']))
+        self.assertEqual(results, [('pics', {
+            'subreddit_title': 'Pictures',
+            'subreddit_description': 'Pics'}, None)])
@@ -0,0 +1,126 @@
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.test.utils import override_settings
+from django_redis import get_redis_connection
+from .. import frontpage
+from ..models import Submission
+from .common.db import create_dummy_models
+
+
+class FrontpageTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        create_dummy_models()
+        cache.clear()
+
+    def test_diff(self):
+        old = {'a': [1, 100, 10], 'b': [2, 50, 5], 'c': [3, 10, 1]}
+        new = {'a': [1, 100, 10], 'b': [3, 60, 5], 'd': [2, 70, 7]}
+        self.assertEqual(frontpage.diff(old, new), {
+            'changed': {'b': [3, 60, 5]},
+            'entered': {'d': [2, 70, 7]},
+            'exited': ['c']
+        })
+
+    def test_publish_cycle(self):
+        pubsub = get_redis_connection('default').pubsub(
+            ignore_subscribe_messages=True)
+        pubsub.subscribe(settings.FRONTPAGE_CHANNEL)
+        pubsub.get_message(timeout=1)
+
+        frontpage.publish_cycle()
+        changes = json.loads(pubsub.get_message(timeout=1)['data'].decode())
+        self.assertEqual(changes['entered'], {'000001': [1, 10000, 200]})
+        self.assertEqual(changes['details']['000001']['title'], 'mytitle')
+
+        Submission.objects.filter(id='000001').update(score=10001)
+        frontpage.publish_cycle()
+        changes = json.loads(pubsub.get_message(timeout=1)['data'].decode())
+        self.assertEqual(changes['changed'], {'000001': [1, 10001, 200]})
+        self.assertEqual(changes['entered'], {})
+        pubsub.close()
+
+    @override_settings(STREAM_DURATION=1, STREAM_KEEPALIVE=0.2)
+    def test_stream(self):
+        response = self.client.get('/stream')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = iter(response.streaming_content)
+        self.assertEqual(next(events), b'retry: 5000\n\n')
+
+        frontpage.publish_cycle()
+        self.assertTrue(next(events).startswith(
+            b'event: frontpage\ndata: {"changed":{}'))
+        self.assertEqual(next(events), b': keepalive\n\n')
+        self.assertGreater(len(list(events)), 0)
+
+    def test_versions(self):
+        # before the first cycle, the top 100 is read from the database
+        response = self.client.get('/frontpage')
+        self.assertIsNone(response.json()['version'])
+        self.assertEqual(response.json()['submissions'],
+                         {'000001': [1, 10000, 200]})
+
+        frontpage.publish_cycle()
+        first = self.client.get('/frontpage').json()['version']
+        Submission.objects.filter(id='000001').update(num_comments=201)
+        frontpage.publish_cycle()
+
+        response = self.client.get('/frontpage')
+        second = response.json()['version']
+        epoch = first.split(':')[0]
+        self.assertEqual((first, second), (epoch + ':1', epoch + ':2'))
+        self.assertEqual(response.json()['submissions'],
+                         {'000001': [1, 10000, 201]})
+        self.assertEqual(
+            response.json()['details']['000001']['subreddit'],
+            'testsubreddit')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/frontpage?since=' + first)
+        self.assertEqual(response.json(), {
+            'version': second,
+            'changed': {'000001': [1, 10000, 201]},
+            'entered': {},
+            'exited': [],
+            'details': {}
+        })
+
+        response = self.client.get('/frontpage?since=' + second)
+        self.assertEqual(response.json()['changed'], {})
+
+        # unknown versions get the full top 100
+        response = self.client.get('/frontpage?since=%s:99' % epoch)
+        self.assertIn('submissions', response.json())
+
+    def test_versions_flushed(self):
+        for i in range(2):
+            frontpage.publish_cycle()
+        version = self.client.get('/frontpage').json()['version']
+
+        # once the cache is flushed, versions count up again in a new epoch,
+        # so clients' old versions aren't mistaken for new ones
+        cache.clear()
+        Submission.objects.filter(id='000001').update(num_comments=201)
+        for i in range(2):
+            frontpage.publish_cycle()
+        response = self.client.get('/frontpage?since=' + version).json()
+        self.assertNotEqual(response['version'], version)
+        self.assertEqual(response['submissions'],
+                         {'000001': [1, 10000, 201]})
+
+    @override_settings(FRONTPAGE_VERSIONS=2)
+    def test_versions_expire(self):
+        for i in range(4):
+            frontpage.publish_cycle()
+        epoch = self.client.get('/frontpage').json()['version'].split(':')[0]
+        self.assertIn('changed', self.client.get(
+            '/frontpage?since=%s:3' % epoch).json())
+        self.assertIn('submissions', self.client.get(
+            '/frontpage?since=%s:2' % epoch).json())
+        self.assertIsNone(cache.get("frontpage_snapshot_%s:2" % epoch))
+
+    def test_versions_invalid(self):
+        response = self.client.get('/frontpage?since=abc')
+        self.assertEqual(response.status_code, 404)
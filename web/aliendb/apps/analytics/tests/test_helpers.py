@@ -14,3 +14,44 @@ class HelpersTest(TestCase):
         date = datetime.datetime(2005, 6, 23)
         date_in_ms = timestamp_to_ms(date)
         self.assertEqual(date_in_ms, 1119484800000.0)
+
+    def test_lttb(self):
+        data = [[float(x), 0] for x in range(100)]
+        data[42][1] = 1000
+        sampled = lttb(data, 10)
+        self.assertEqual(len(sampled), 10)
+        self.assertEqual(sampled[0], data[0])
+        self.assertEqual(sampled[-1], data[-1])
+        self.assertIn([42.0, 1000], sampled)
+        self.assertEqual(sampled, sorted(sampled))
+
+    def test_lttb_short(self):
+        data = [[0.0, 1], [1.0, 2], [2.0, 3]]
+        self.assertEqual(lttb(data, 10), data)
+        self.assertEqual(lttb(data, 2), data)
+
+    def test_downsample(self):
+        data = {
+            'activity': {'scores': [[float(x), x] for x in range(50)]},
+            'special_users': {'submission': [1, 2, 3, 4]}
+        }
+        sampled = downsample(data, 5)
+        self.assertEqual(len(sampled['activity']['scores']), 5)
+        self.assertEqual(sampled['special_users'], data['special_users'])
+
+    def test_search_cache_key(self):
+        key = search_cache_key(3, 'My  Title', 'karma', 'all', 'b, A')
+        self.assertTrue(key.startswith('search_3_'))
+        self.assertEqual(
+            key, search_cache_key(3, ' my title ', 'karma', 'all', 'a,b,'))
+        self.assertNotEqual(
+            key, search_cache_key(4, 'my title', 'karma', 'all', 'a,b'))
+        self.assertNotEqual(
+            key, search_cache_key(3, 'my title', 'comments', 'all', 'a,b'))
+
+    def test_format_duration(self):
+        self.assertEqual(format_duration(None), '00:00:00')
+        self.assertEqual(format_duration(
+            datetime.timedelta(days=2, minutes=3, seconds=4)), '48:03:04')
+        self.assertEqual(format_duration(
+            datetime.timedelta(seconds=-5)), '00:00:00')
@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.test import TestCase
+from .. import leaderboards
+from ..models import Submission, Subreddit
+from .common.db import create_dummy_models
+
+
+class LeaderboardsTest(TestCase):
+    def setUp(self):
+        create_dummy_models()
+        cache.clear()
+
+    def test_top_subreddits(self):
+        with self.assertNumQueries(2):
+            lists = leaderboards.top_subreddits()
+        self.assertEqual(
+            [s.name for s in lists['subreddits']],
+            ['testsubreddit', 'emptysubreddit'])
+        self.assertEqual(lists['agreeable_subreddits'], [])
+
+        # once built, only the listed rows are read
+        with self.assertNumQueries(1):
+            leaderboards.top_subreddits()
+
+    def test_update_subreddit(self):
+        leaderboards.top_subreddits()
+        subreddit = Subreddit.objects.get(name='emptysubreddit')
+        subreddit.tracked_submissions = 30
+        subreddit.average_upvote_ratio = 0.5
+        subreddit.save()
+        leaderboards.update_subreddit(subreddit)
+        lists = leaderboards.top_subreddits()
+        self.assertEqual(lists['subreddits'][0], subreddit)
+        self.assertEqual(lists['agreeable_subreddits'], [subreddit])
+        self.assertEqual(lists['controversial_subreddits'], [subreddit])
+
+    def test_top_submissions(self):
+        lists = leaderboards.top_submissions('testsubreddit')
+        self.assertEqual([s.id for s in lists['top_submissions']], ['000001'])
+
+        submission = Submission.objects.get(id='000001')
+        submission.id = '000003'
+        submission.score = 20000
+        submission.upvote_ratio = 0.1
+        submission.save()
+        leaderboards.update_submission(submission)
+        lists = leaderboards.top_submissions('testsubreddit')
+        self.assertEqual([s.id for s in lists['top_submissions']],
+                         ['000003', '000001'])
+        self.assertEqual([s.id for s in lists['controversial_submissions']],
+                         ['000003', '000001'])
+
+    def test_top_submissions_empty(self):
+        lists = leaderboards.top_submissions('emptysubreddit')
+        self.assertEqual(lists['top_submissions'], [])
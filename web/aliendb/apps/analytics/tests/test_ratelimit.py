@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from .. import ratelimit
+
+
+@override_settings(RATELIMIT_REQUESTS=10, RATELIMIT_PERIOD=10,
+                   RATELIMIT_BURST=10, RATELIMIT_RESERVE=(0, 2, 5))
+class RateLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_take(self):
+        for i in range(5):
+            self.assertEqual(ratelimit.take(ratelimit.COLD, now=1000), 0)
+
+        # the rest of the burst is kept for higher priorities
+        self.assertEqual(ratelimit.take(ratelimit.COLD, now=1000), 1)
+        for i in range(3):
+            self.assertEqual(ratelimit.take(ratelimit.HOT, now=1000), 0)
+        self.assertEqual(ratelimit.take(ratelimit.HOT, now=1000), 1)
+        for i in range(2):
+            self.assertEqual(ratelimit.take(ratelimit.LISTING, now=1000), 0)
+        self.assertEqual(ratelimit.take(ratelimit.LISTING, now=1000), 1)
+
+        # tokens are refilled over time, up to the burst
+        self.assertEqual(ratelimit.take(ratelimit.LISTING, now=1001), 0)
+        self.assertEqual(ratelimit.take(ratelimit.COLD, now=1003), 4)
+        self.assertEqual(ratelimit.take(ratelimit.COLD, now=2000), 0)
+        self.assertEqual(ratelimit.stats()['tokens'], 9)
+
+    def test_acquire(self):
+        self.assertEqual(ratelimit.stats()['tokens'], 10)
+        ratelimit.acquire(ratelimit.LISTING)
+        ratelimit.acquire(ratelimit.HOT)
+        ratelimit.acquire(ratelimit.HOT)
+
+        stats = ratelimit.stats()
+        self.assertEqual(stats['listing']['requests'], 1)
+        self.assertEqual(stats['hot']['requests'], 2)
+        self.assertEqual(stats['cold']['requests'], 0)
+        self.assertEqual(stats['cold']['average_wait'], 0)
+        self.assertLess(stats['tokens'], 8)
+
+        ratelimit.reset_stats()
+        self.assertEqual(ratelimit.stats()['hot']['requests'], 0)
+
+    def test_prioritized(self):
+        self.assertEqual(ratelimit.current_priority(), ratelimit.COLD)
+        with ratelimit.prioritized(ratelimit.LISTING):
+            self.assertEqual(ratelimit.current_priority(), ratelimit.LISTING)
+            with ratelimit.prioritized(ratelimit.HOT):
+                self.assertEqual(ratelimit.current_priority(), ratelimit.HOT)
+            self.assertEqual(ratelimit.current_priority(), ratelimit.LISTING)
+        self.assertEqual(ratelimit.current_priority(), ratelimit.COLD)
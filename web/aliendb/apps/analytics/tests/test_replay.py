@@ -0,0 +1,65 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from ..models import Comment, Submission
+from ..replay import Replay, SyntheticReddit
+
+
+class SyntheticRedditTest(TestCase):
+    def test_seed(self):
+        first = SyntheticReddit(submissions=10, comments=20, seed=1)
+        second = SyntheticReddit(submissions=10, comments=20, seed=1)
+        other = SyntheticReddit(submissions=10, comments=20, seed=2)
+
+        self.assertEqual(first.hot, second.hot)
+        self.assertEqual(first.submissions, second.submissions)
+        self.assertEqual(first.comments, second.comments)
+        self.assertNotEqual(first.submissions, other.submissions)
+
+    def test_advance(self):
+        synthetic = SyntheticReddit(submissions=10, comments=20,
+                                    max_comments=50)
+        hot = list(synthetic.hot)
+        scores = {id: synthetic.submissions[id]['score'] for id in hot}
+        comments = {id: len(synthetic.comments[id]) for id in hot}
+
+        synthetic.advance(turnover=3)
+
+        self.assertEqual(len(synthetic.hot), 10)
+        self.assertEqual(len(set(synthetic.hot) - set(hot)), 3)
+        for id in set(synthetic.hot) & set(hot):
+            self.assertGreater(synthetic.submissions[id]['score'], scores[id])
+            self.assertGreaterEqual(len(synthetic.comments[id]), comments[id])
+            self.assertLessEqual(len(synthetic.comments[id]), 50)
+            self.assertEqual(synthetic.submissions[id]['num_comments'],
+                             len(synthetic.comments[id]))
+
+
+@override_settings(RATELIMIT_REQUESTS=10 ** 6, RATELIMIT_BURST=10 ** 6)
+class ReplayTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_run(self):
+        synthetic = SyntheticReddit(submissions=5, comments=3,
+                                    max_comments=10, subreddits=2)
+        results = Replay(synthetic, max_in_flight=2).run(2, turnover=1)
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(Submission.objects.count(), 6)
+        self.assertEqual(Submission.objects.filter(rank__gt=0).count(), 5)
+        for id in synthetic.hot:
+            self.assertEqual(
+                Comment.objects.filter(submission_id=id).count(),
+                len(synthetic.comments[id]))
+
+        for metrics in results:
+            self.assertGreater(metrics.wall, 0)
+            self.assertGreater(metrics.requests, 0)
+            self.assertGreater(metrics.stages['persist']['queries'], 0)
+            self.assertGreater(metrics.stages['persist']['rows'], 0)
+            self.assertEqual(metrics.stages['finalize']['tasks'], 1)
+            # each submission in /r/all/hot is analyzed once, whether it came
+            # from the listing or was polled
+            self.assertEqual(metrics.stages['analyze']['tasks'], 5)
+            self.assertEqual(metrics.stages['analyze']['queries'],
+                             metrics.stages['analyze']['tasks'])
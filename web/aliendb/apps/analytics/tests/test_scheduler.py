@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from .. import scheduler
+
+
+class SchedulerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_poll_interval(self):
+        # quiet submissions are polled least often
+        self.assertEqual(scheduler.poll_interval(0, 0, 600),
+                         settings.POLL_MAX_INTERVAL)
+        self.assertEqual(scheduler.poll_interval(10, 0, 0),
+                         settings.POLL_MAX_INTERVAL)
+
+        # fast risers are polled most often
+        self.assertEqual(scheduler.poll_interval(100000, 0, 600),
+                         settings.POLL_MIN_INTERVAL)
+
+        # comments count for more than score
+        self.assertLess(scheduler.poll_interval(0, 50, 600),
+                        scheduler.poll_interval(50, 0, 600))
+        self.assertEqual(scheduler.poll_interval(-500, 0, 600), 600)
+
+    def test_polled(self):
+        # the first poll is followed soon by another, to measure activity
+        self.assertEqual(scheduler.polled('a', 100, 10, now=1000),
+                         settings.POLL_MIN_INTERVAL)
+
+        # later polls are measured against the last poll
+        self.assertEqual(scheduler.polled('a', 100, 10, now=1600),
+                         settings.POLL_MAX_INTERVAL)
+        self.assertEqual(scheduler.polled('a', 600, 10, now=2200),
+                         scheduler.poll_interval(500, 0, 600))
+
+        # unscheduled submissions start over
+        scheduler.unschedule(['a'])
+        self.assertEqual(scheduler.polled('a', 600, 10, now=2800),
+                         settings.POLL_MIN_INTERVAL)
+
+    def test_due(self):
+        scheduler.schedule({'a': 0, 'b': 10, 'c': 100}, now=1000)
+        self.assertEqual(scheduler.due(10, now=1050), ['a', 'b'])
+
+        # claimed submissions aren't dispatched again until the claim lapses
+        self.assertEqual(scheduler.due(10, now=1050), [])
+        self.assertEqual(scheduler.due(10, now=1100), ['c'])
+        self.assertEqual(scheduler.due(
+            10, now=1050 + settings.POLL_MAX_INTERVAL), ['a', 'b'])
+
+    def test_due_limit(self):
+        scheduler.schedule({'a': 30, 'b': 10, 'c': 20}, now=1000)
+        self.assertEqual(scheduler.due(2, now=1050), ['b', 'c'])
+
+    def test_schedule_replace(self):
+        scheduler.schedule({'a': 100}, now=1000)
+        scheduler.schedule({'a': 0, 'b': 0}, now=1000, replace=False)
+        self.assertEqual(scheduler.due(10, now=1050), ['b'])
+
+    def test_unschedule(self):
+        scheduler.schedule({'a': 0, 'b': 0}, now=1000)
+        scheduler.unschedule(['a'])
+        scheduler.unschedule([])
+        self.assertEqual(scheduler.due(10, now=1000), ['b'])
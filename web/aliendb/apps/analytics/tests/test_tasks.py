@@ -1,8 +1,16 @@
+from django.db.models.query import QuerySet
 from django.test import TestCase
 from ..models import Submission
+from .. import tasks
+from ..fetcher import Fetcher
+from ..replay import FakeRedditServer
 from ..tasks import *
 from .common.db import create_dummy_models
+import json
+import os
 import pickle
+import time
+from unittest import mock
 
 
 class TasksTest(TestCase):
@@ -50,7 +58,7 @@ class TasksTest(TestCase):
         with open(self.my_dir + '/data/submission_%s.pk1' % submission_id, 'rb') as obj_file:
             submission = pickle.load(obj_file)
         submission_obj = create_submission_obj(submission, 1)
-        create_submission_tracker_objs(submission_obj, submission)
+        create_submission_tracker_objs(submission_obj)
         assert SubmissionScore.objects.filter(
             submission=submission_obj).exists()
         assert SubmissionNumComments.objects.filter(
@@ -75,3 +83,255 @@ class TasksTest(TestCase):
         assert SubredditScore.objects.filter(subreddit=subreddit).exists()
         assert SubredditNumComments.objects.filter(
             subreddit=subreddit).exists()
+
+    def test_site_stats(self):
+        submission_id = '8djsdf'
+        with open(self.my_dir + '/data/submission_%s.pk1' % submission_id, 'rb') as obj_file:
+            submission = pickle.load(obj_file)
+        submission_obj = create_submission_obj(submission, 1)
+        create_cumulative_tracker_objs(submission_obj)
+        stats = SiteStats.objects.get(id=1)
+        assert stats.submissions == 1
+        assert stats.subreddits == 1
+        assert stats.score == submission_obj.score
+        assert stats.num_comments == submission_obj.num_comments
+
+    def test_create_submission_subreddit_race(self):
+        create_dummy_models()
+        submission_id = '8djsdf'
+        with open(self.my_dir + '/data/submission_%s.pk1' % submission_id, 'rb') as obj_file:
+            submission = pickle.load(obj_file)
+        data = analyze_submission_data(fetch_submission_data(submission))
+        data['subreddit'] = 'testsubreddit'
+        subreddits = Subreddit.objects.count()
+
+        # another worker creates the subreddit between the lookup and insert
+        get = QuerySet.get
+        calls = []
+
+        def racing_get(queryset, *args, **kwargs):
+            if queryset.model is Subreddit and not calls:
+                calls.append(kwargs)
+                raise Subreddit.DoesNotExist()
+            return get(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'get', autospec=True,
+                               side_effect=racing_get):
+            submission_obj = create_submission(data, 1)
+        assert calls
+        assert submission_obj.subreddit.name == 'testsubreddit'
+        assert Subreddit.objects.count() == subreddits
+        assert not SiteStats.objects.filter(subreddits__gt=0).exists()
+
+    def test_seen_at(self):
+        submission_id = '8djsdf'
+        with open(self.my_dir + '/data/submission_%s.pk1' % submission_id, 'rb') as obj_file:
+            submission = pickle.load(obj_file)
+        submission_obj = create_submission_obj(submission, 1)
+        create_submission_tracker_objs(submission_obj)
+        first_seen_at = submission_obj.first_seen_at
+        create_submission_tracker_objs(submission_obj)
+        submission_obj = Submission.objects.get(id=submission_id)
+        assert submission_obj.first_seen_at == first_seen_at
+        assert submission_obj.last_seen_at == SubmissionScore.objects.filter(
+            submission=submission_obj).latest('timestamp').timestamp
+
+    def test_persist_submission(self):
+        submission_id = '8djsdf'
+        with open(self.my_dir + '/data/submission_%s.pk1' % submission_id, 'rb') as obj_file:
+            submission = pickle.load(obj_file)
+        cache.clear()
+        data = analyze_submission_data(fetch_submission_data(submission))
+        json.dumps(data)
+
+        # new submissions are only created as part of a cycle
+        persist_submission(data)
+        assert not Submission.objects.filter(id=submission_id).exists()
+        persist_submission(data, rank=1)
+        submission_obj = Submission.objects.get(id=submission_id)
+        assert submission_obj.rank == 1
+        assert scheduler.due(10) == []
+
+        # polls update the submission and schedule the next one
+        data['score'] += 1000
+        persist_submission(data)
+        submission_obj = Submission.objects.get(id=submission_id)
+        assert submission_obj.score == data['score']
+        assert submission_obj.rank == 1
+        assert SubmissionScore.objects.filter(
+            submission=submission_obj).count() == 2
+        assert scheduler.due(10) == []
+        assert scheduler.due(
+            10, now=time.time() + settings.POLL_MAX_INTERVAL) == [submission_id]
+
+        # a fast riser's activity is measured since its last poll, even if
+        # the listing has since updated its score
+        Submission.objects.filter(id=submission_id).update(
+            score=data['score'] + 99000)
+        data['score'] += 100000
+        with mock.patch.object(scheduler, 'schedule') as schedule:
+            persist_submission(data)
+        schedule.assert_called_once_with(
+            {submission_id: settings.POLL_MIN_INTERVAL})
+
+        # polls don't overwrite a rank changed while they were running
+        submission_obj = Submission.objects.get(id=submission_id)
+        Submission.objects.filter(id=submission_id).update(rank=-1)
+        update_submission(submission_obj, data)
+        assert Submission.objects.get(id=submission_id).rank == -1
+
+    def test_pipeline(self):
+        create_dummy_models()
+        submission_id = '8djsdf'
+        with open(self.my_dir + '/data/submission_%s.pk1' % submission_id, 'rb') as obj_file:
+            submission = pickle.load(obj_file)
+        cache.clear()
+        cache.set("home_response", 'response')
+
+        # serve the submission from a local stand-in for reddit
+        server = FakeRedditServer()
+        server.start()
+        data = fetch_submission_data(submission)
+        server.submissions[submission_id] = data
+        server.comments[submission_id] = data.pop('comments')
+        server.subreddits[data['subreddit'].lower()] = {
+            'display_name': data['subreddit'], 'title': 'Title',
+            'public_description': 'Description'}
+        fetcher = Fetcher(oauth_url=server.url, reddit_url=server.url,
+                          check_for_updates=False)
+
+        assert cycles.acquire('cycle')
+        app.conf.update(task_always_eager=True, task_eager_propagates=True)
+        try:
+            with mock.patch.object(tasks, 'submission_fetcher', fetcher):
+                persist_listing([listing_data(submission)], 'cycle')
+        finally:
+            app.conf.update(task_always_eager=False,
+                            task_eager_propagates=False)
+            fetcher.shutdown()
+            server.shutdown()
+            server.server_close()
+
+        submission_obj = Submission.objects.get(id=submission_id)
+        assert submission_obj.rank == 1
+        assert submission_obj.subreddit.title == 'Title'
+        assert Comment.objects.filter(submission=submission_obj).count() == \
+            len(server.comments[submission_id])
+        assert Submission.objects.get(id='000001').rank == -1
+        assert AverageScore.objects.get().score == submission.score // 100
+        assert cache.get("home_response") is None
+        assert cache.get("cycle_cycle") is None
+        assert scheduler.due(10) == []
+        # the next cycle can start
+        assert cycles.acquire('next')
+
+    def test_pipeline_redelivered(self):
+        create_dummy_models()
+        submission_id = '8djsdf'
+        with open(self.my_dir + '/data/submission_%s.pk1' % submission_id, 'rb') as obj_file:
+            submission = pickle.load(obj_file)
+        cache.clear()
+        cycles.acquire('cycle')
+        cycles.start('cycle', [submission_id])
+
+        # saved submissions aren't saved again
+        cycles.done('cycle', submission_id)
+        with mock.patch.object(reddit, 'submission') as reddit_submission:
+            fetch_submission(submission_id, rank=1, cycle='cycle')
+        reddit_submission.assert_not_called()
+
+        # nor is anything saved once a cycle is abandoned
+        cycles.start('cycle', [submission_id])
+        cycles.release('cycle')
+        with mock.patch.object(reddit, 'submission') as reddit_submission:
+            fetch_submission(submission_id, rank=1, cycle='cycle')
+        reddit_submission.assert_not_called()
+
+    def test_acks_late(self):
+        # tasks of a worker which dies are only redelivered if acked late
+        from aliendb.celery import app as worker_app
+        assert app.conf.task_acks_late
+        assert worker_app.conf.task_acks_late
+        assert worker_app.conf.worker_prefetch_multiplier == 1
+
+    def test_get_top_submissions_overlap(self):
+        cache.clear()
+        cycles.acquire('running')
+        with mock.patch.object(reddit, 'subreddit') as subreddit:
+            get_top_submissions()
+        subreddit.assert_not_called()
+
+    def test_finalize_cycle_redelivered(self):
+        create_dummy_models()
+        cache.clear()
+        cycles.acquire('cycle')
+        summary = {'ids': ['000001'], 'created': 0, 'score': 500,
+                   'num_comments': 300, 'averaged': False}
+        cache.set("cycle_cycle", summary)
+        averages = AverageScore.objects.count()
+
+        # the worker died after saving the averages, before recording that
+        AverageScore.objects.create(score=5, cycle='cycle')
+        AverageNumComments.objects.create(num_comments=3, cycle='cycle')
+        finalize_cycle('cycle')
+        assert AverageScore.objects.count() == averages + 1
+        assert AverageNumComments.objects.filter(cycle='cycle').count() == 1
+
+        # otherwise, the averages are saved once
+        cycles.acquire('next')
+        cache.set("cycle_next", summary)
+        finalize_cycle('next')
+        assert AverageScore.objects.get(cycle='next').score == 5
+
+    def test_fetch_submissions_failure(self):
+        cache.clear()
+        cycles.acquire('cycle')
+        cycles.start('cycle', ['a', 'b'])
+
+        # submissions which can't be fetched at all still let the cycle end
+        with mock.patch.object(tasks.submission_fetcher, 'fetch',
+                               side_effect=ValueError), \
+                mock.patch.object(finalize_cycle, 'delay') as delay:
+            result = fetch_submissions.apply(args=(['a', 'b'],),
+                                             kwargs={'cycle': 'cycle'})
+        assert result.failed()
+        assert cycles.pending('cycle') == []
+        delay.assert_called_once_with('cycle')
+
+    def test_retire_submission_obj(self):
+        create_dummy_models()
+        submission_obj = Submission.objects.get(id='000001')
+        subreddit = retire_submission_obj(submission_obj)
+        assert subreddit.tracked_submissions == 1
+        assert retire_submission_obj(submission_obj) is None
+        assert Submission.objects.get(id='000001').rank == -1
+        assert TotalScore.objects.count() == 1
+        assert Subreddit.objects.get(
+            name=subreddit.name).tracked_submissions == 1
+
+    def test_poll_submissions(self):
+        create_dummy_models()
+        cache.clear()
+        scheduler.schedule({'000001': 0})
+        with mock.patch.object(fetch_submissions, 'delay') as delay:
+            poll_submissions()
+        delay.assert_called_once_with(['000001'], priority=ratelimit.HOT)
+        # not due again while being polled
+        assert scheduler.due(10) == []
+
+        # submissions further down are polled at a lower priority
+        Submission.objects.filter(id='000001').update(rank=50)
+        scheduler.schedule({'000001': 0})
+        with mock.patch.object(fetch_submissions, 'delay') as delay:
+            poll_submissions()
+        delay.assert_called_once_with(['000001'], priority=ratelimit.COLD)
+
+    def test_poll_submissions_untracked(self):
+        create_dummy_models()
+        cache.clear()
+        Submission.objects.filter(id='000001').update(rank=-1)
+        scheduler.schedule({'000001': 0})
+        with mock.patch.object(fetch_submissions, 'delay') as delay:
+            poll_submissions()
+        delay.assert_not_called()
+        assert scheduler.due(10, now=time.time() + 86400) == []
@@ -1,5 +1,15 @@
+import datetime
+from unittest import mock
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection
+from django.db.models.signals import post_init
 from django.test import TestCase, Client
 from django.test.utils import override_settings
+from django.contrib.postgres.search import SearchVector
+from django.utils.timesince import timesince
+from ..models import SiteStats, Submission
+from ..views import canonical_subreddit, subreddit_names
 from .common.db import create_dummy_models
 
 
@@ -8,11 +18,47 @@ class ViewsTest(TestCase):
     def setUp(self):
         self.client = Client()
         create_dummy_models()
+        cache.clear()
 
     def test_home_200(self):
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
 
+    def test_home_stats(self):
+        SiteStats.objects.update_or_create(id=1, defaults={
+            'submissions': 2, 'subreddits': 3, 'score': 4, 'num_comments': 5})
+        response = self.client.get('/')
+        self.assertEqual(response.context['cumulative_stats'], {
+            'submissions': 2, 'subreddits': 3, 'score': 4, 'comments': 5})
+
+    def test_home_fragments(self):
+        submission = Submission.objects.get(id='000001')
+        age = timesince(submission.created_at)
+        self.client.get('/')
+        key = make_template_fragment_key('home_submission',
+                                         ['000001', 1, 2, age])
+        self.assertIn('mytitle', cache.get(key))
+
+        # a row is rendered again once its rank changes
+        Submission.objects.filter(id='000001').update(rank=3)
+        response = self.client.get('/')
+        self.assertIn('mytitle', cache.get(make_template_fragment_key(
+            'home_submission', ['000001', 3, 2, age])))
+        self.assertContains(response, '<td id="rank">3</td>')
+        self.assertContains(response, 'submitted %s ago' % age)
+
+        # rows are read and written with one cache call each, and only the
+        # changed row is rendered again
+        Submission.objects.filter(id='000001').update(rank=4)
+        with mock.patch.object(cache, 'get_many',
+                               wraps=cache.get_many) as get_many, \
+                mock.patch.object(cache, 'set_many',
+                                  wraps=cache.set_many) as set_many:
+            self.client.get('/')
+        get_many.assert_called_once()
+        set_many.assert_called_once()
+        self.assertEqual(len(set_many.call_args[0][0]), 1)
+
     def test_subreddits_200(self):
         response = self.client.get('/subreddits')
         self.assertEqual(response.status_code, 200)
@@ -25,6 +71,16 @@ class ViewsTest(TestCase):
         response = self.client.get('/submission/000001')
         self.assertEqual(response.status_code, 200)
 
+    def test_submission_times(self):
+        Submission.objects.filter(id='000001').update(
+            created_at=datetime.datetime(2017, 10, 11, 12, 0, 0),
+            first_seen_at=datetime.datetime(2017, 10, 11, 13, 0, 0),
+            last_seen_at=datetime.datetime(2017, 10, 13, 14, 5, 6))
+        with self.assertNumQueries(1):
+            response = self.client.get('/submission/000001')
+        self.assertEqual(response.context['lifetime'], '49:05:06')
+        self.assertEqual(response.context['rise_time'], '01:00:00')
+
     def test_submission_404(self):
         response = self.client.get('/submission/222222')
         self.assertEqual(response.status_code, 404)
@@ -49,3 +105,128 @@ class ViewsTest(TestCase):
         response = self.client.get(
             '/search?q=mytitle&order_by=karma&time=all&subreddits=testsubreddit')
         self.assertContains(response, "Found 1 match")
+
+    def test_search_relevance(self):
+        submission = Submission.objects.get(id='000001')
+        submission.id = '000003'
+        submission.title = 'mytitle mytitle and mytitle'
+        submission.save()
+        Submission.objects.filter(id='000003').update(
+            search_vector=SearchVector('title'))
+        response = self.client.get('/search?q=mytitle')
+        self.assertContains(response, "Found 2 match")
+        self.assertEqual(
+            [s.id for s in response.context['submissions']],
+            ['000003', '000001'])
+
+    @override_settings(SEARCH_PAGE_SIZE=1)
+    def test_search_pagination(self):
+        submission = Submission.objects.get(id='000001')
+        submission.id = '000003'
+        submission.save()
+        Submission.objects.filter(id='000003').update(
+            search_vector=SearchVector('title'))
+        response = self.client.get('/search?q=mytitle&order_by=karma&page=2')
+        self.assertContains(response, "Found 2 match")
+        self.assertContains(response, "Page 2 of 2")
+        self.assertEqual(len(response.context['submissions']), 1)
+
+    def test_search_relevant_subreddits(self):
+        response = self.client.get('/search?q=mytitle')
+        self.assertEqual(response.context['relevant_subreddits'],
+                         ['testsubreddit'])
+
+    def test_search_from_subreddits(self):
+        response = self.client.get(
+            '/search?q=mytitle&from_subreddits=TestSubreddit,missing')
+        self.assertContains(response, "Found 1 match")
+        response = self.client.get(
+            '/search?q=mytitle&from_subreddits=emptysubreddit')
+        self.assertContains(response, "Found 0 match")
+
+    def test_subreddit_names(self):
+        with self.assertNumQueries(1):
+            names = subreddit_names(['TESTSUBREDDIT', 'missing', 'mytitle'])
+        self.assertEqual(names, {'testsubreddit': 'testsubreddit'})
+
+        # terms which couldn't be subreddit names aren't looked up or cached
+        cache.clear()
+        with self.assertNumQueries(0):
+            names = subreddit_names(['', 'a', "what's", 'x' * 22])
+        self.assertEqual(names, {})
+        self.assertEqual(cache.get_many(['subreddit_name_a',
+                                         "subreddit_name_what's"]), {})
+
+    @override_settings(DEBUG=False)
+    def test_search_cached(self):
+        cache.clear()
+        self.client.get('/search?q=mytitle')
+        with self.assertNumQueries(1):
+            response = self.client.get('/search?q=MyTitle')
+        self.assertContains(response, "Found 1 match")
+
+        # new submissions are found once the generation moves on
+        submission = Submission.objects.get(id='000001')
+        submission.id = '000003'
+        submission.save()
+        Submission.objects.filter(id='000003').update(
+            search_vector=SearchVector('title'))
+        response = self.client.get('/search?q=mytitle')
+        self.assertContains(response, "Found 1 match")
+        cache.incr("search_generation")
+        response = self.client.get('/search?q=mytitle')
+        self.assertContains(response, "Found 2 match")
+
+    def test_search_time(self):
+        response = self.client.get('/search?q=mytitle&time=week')
+        self.assertEqual(response.status_code, 200)
+
+    def test_subreddit_case_variant(self):
+        response = self.client.get('/subreddit/TestSubreddit')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['subreddit'].name, 'testsubreddit')
+
+    @override_settings(DEBUG=False)
+    def test_canonical_subreddit_cached(self):
+        cache.clear()
+        self.assertEqual(canonical_subreddit('TESTSUBREDDIT'), 'testsubreddit')
+        self.assertIsNone(canonical_subreddit('missing'))
+        with self.assertNumQueries(0):
+            self.assertEqual(canonical_subreddit('TestSubreddit'),
+                             'testsubreddit')
+            self.assertIsNone(canonical_subreddit('Missing'))
+
+    def test_subreddit_large(self):
+        # copy the dummy submission 50,000 times in one statement
+        with connection.cursor() as cursor:
+            columns = [f.column for f in Submission._meta.concrete_fields
+                       if f.column not in ('id', 'score', 'upvote_ratio')]
+            cursor.execute(
+                'INSERT INTO analytics_submission (id, score, upvote_ratio, '
+                '{0}) SELECT to_hex(1048576 + i), i, (i %% 100) / 100.0, '
+                '{0} FROM analytics_submission, generate_series(0, 49999) i '
+                'WHERE id = %s'.format(', '.join(columns)), ['000001'])
+
+        # the first request builds the rankings
+        with self.assertNumQueries(5):
+            response = self.client.get('/subreddit/testsubreddit')
+        self.assertEqual(response.status_code, 200)
+
+        # the page stays fast as the subreddit grows: a fixed number of
+        # queries, which load only the submissions shown
+        loaded = []
+
+        def count(sender, **kwargs):
+            loaded.append(sender)
+
+        post_init.connect(count, sender=Submission)
+        try:
+            with self.assertNumQueries(4):
+                response = self.client.get('/subreddit/testsubreddit')
+        finally:
+            post_init.disconnect(count, sender=Submission)
+        self.assertLessEqual(len(loaded), 100)
+        self.assertEqual(len(response.context['top_submissions']), 50)
+        self.assertEqual(response.context['top_submissions'][0].score, 49999)
+        self.assertEqual(
+            response.context['controversial_submissions'][0].upvote_ratio, 0)
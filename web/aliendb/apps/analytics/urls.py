@@ -9,6 +9,10 @@ urlpatterns = [
     url(r'^subreddits$', views.subreddits),
     url(r'^about$', views.about),
     url(r'^api$', views.api),
+    url(r'^export$', views.export),
+    url(r'^autocomplete$', views.suggest),
+    url(r'^stream$', views.stream),
+    url(r'^frontpage$', views.ranks),
     url(r'^submission/(?P<id>[\w]+)$', views.submission),
     url(r'^subreddit/(?P<subreddit>[\w]+)$', views.subreddit),
     url(r'^search$', views.search)
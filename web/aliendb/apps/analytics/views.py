@@ -1,13 +1,185 @@
+import re
+from collections import OrderedDict
 from datetime import datetime, timedelta
-import time
 
 from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from django.core.cache import cache
-from django.db.models import Q, Count
-from django.http import JsonResponse, Http404, HttpRequest, HttpResponse
+from django.core.cache.utils import make_template_fragment_key
+from django.core.paginator import Paginator
+from django.db.models import F, Count
+from django.db.models.functions import Lower
+from django.http import JsonResponse, Http404, HttpRequest, HttpResponse, \
+    StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.timesince import timesince
+from .helpers import format_duration, search_cache_key
 from .models import *
-from . import reports
+from . import autocomplete, exports, frontpage, leaderboards, reports
+
+# what Reddit allows subreddit names to be
+SUBREDDIT_NAME = re.compile(r'^[A-Za-z0-9_]{2,21}$')
+
+
+def subreddit_names(names) -> dict:
+    """Finds the stored names of subreddits, ignoring case.
+
+    Names are cached by their lowercase form, so every case variant of a name
+    shares one cache entry. Those not cached are looked up in one query
+    against LOWER(name), which is indexed (see migration 0006), rather than
+    with name__iexact, which compares UPPER(name) and so has to scan the
+    whole table for every name. Names which couldn't be those of subreddits,
+    such as most search terms, are neither looked up nor cached.
+
+    Args:
+        names: an iterable of subreddit names in any case
+
+    Returns:
+        dict: the stored name of each subreddit found, keyed by the lowercased
+            name
+    """
+    keys = {"subreddit_name_%s" % name.lower(): name.lower()
+            for name in names if SUBREDDIT_NAME.match(name)}
+    if not keys:
+        return {}
+
+    # try to get names from cache, where '' marks a missing subreddit
+    cached = cache.get_many(list(keys)) if settings.DEBUG is False else {}
+    found = {keys[key]: name for key, name in cached.items() if name}
+    missing = set(keys[key] for key in keys if key not in cached)
+
+    if missing:
+        stored = dict(Subreddit.objects.annotate(lower_name=Lower('name'))
+                      .filter(lower_name__in=missing)
+                      .values_list('lower_name', 'name'))
+        found.update(stored)
+        cache.set_many({"subreddit_name_%s" % name: stored[name]
+                        for name in stored}, 86400)
+        cache.set_many({"subreddit_name_%s" % name: ''
+                        for name in missing if name not in stored}, 60)
+    return found
+
+
+def canonical_subreddit(name) -> str:
+    """Finds the stored name of a subreddit, ignoring case.
+
+    Args:
+        name: a subreddit name in any case
+
+    Returns:
+        str: the stored name, or None if there is no such subreddit
+    """
+    return subreddit_names([name]).get(name.lower())
+
+
+def search_results(query, order_by, time, from_subreddits) -> dict:
+    """Runs a search, for the search view to cache and paginate.
+
+    Args:
+        query: the search query;
+        order_by: how to sort the resulting submissions;
+        time: time frame which submissions must be within;
+        from_subreddits: comma separated list of subreddits
+
+    Returns:
+        dict: the ordered ids of up to settings.SEARCH_MAX_RESULTS matching
+            submissions, the total number of matches and a list of relevant
+            subreddit names
+    """
+    # get all matching submissions
+    search_query = SearchQuery(query)
+    submissions = Submission.objects.filter(search_vector=search_query)
+
+    # remove submissions not in time frame
+    if time and time != 'all':
+        current_time = datetime.utcnow()
+        if time == 'today':
+            prev_time = current_time - timedelta(days=1)
+        elif time == 'week':
+            prev_time = current_time - timedelta(weeks=1)
+        elif time == 'month':
+            prev_time = current_time - timedelta(days=30)
+        elif time == 'year':
+            prev_time = current_time - timedelta(days=365)
+        else:
+            prev_time = current_time
+        submissions = submissions.filter(created_at__gte=prev_time)
+
+    # resolve requested and mentioned subreddits all at once
+    requested = [name.strip() for name in from_subreddits.split(',')]
+    terms = query.split(' ')
+    names = subreddit_names(requested + terms)
+
+    # remove submissions not in requested subreddits
+    if any(requested):
+        submissions = submissions.filter(subreddit__in=[
+            names[name.lower()] for name in requested
+            if name.lower() in names])
+
+    # get relevant subreddits
+    relevant_subreddits = []
+    for term in terms:
+        name = names.get(term.lower())
+        if name is not None and name not in relevant_subreddits:
+            relevant_subreddits.append(name)
+    top_subreddits = submissions.order_by() \
+        .values_list('subreddit') \
+        .annotate(count=Count('id')) \
+        .order_by('-count', 'subreddit')[:8]
+    for subreddit, count in top_subreddits:
+        if subreddit not in relevant_subreddits:
+            relevant_subreddits.append(subreddit)
+
+    # order submissions
+    if order_by == 'karma':
+        submissions = submissions.order_by('-score', 'id')
+    elif order_by == 'comments':
+        submissions = submissions.order_by('-num_comments', 'id')
+    else:
+        submissions = submissions.order_by(SearchRank(
+            F('search_vector'), search_query).desc(), 'id')
+
+    # only the ids are kept, and only as many as can be paged through
+    limit = settings.SEARCH_MAX_RESULTS
+    ids = list(submissions.values_list('id', flat=True)[:limit + 1])
+    count = len(ids) if len(ids) <= limit else submissions.count()
+
+    return {
+        'ids': ids[:limit],
+        'count': count,
+        'relevant_subreddits': relevant_subreddits[:8]
+    }
+
+
+def home_rows(submissions) -> list:
+    """Renders the rows of the top 100 table, reusing cached rows.
+
+    Each row is cached under what it shows which changes between cycles: its
+    rank, previous rank and age. So only rows which look different are
+    rendered again, and every row is read, and written, in one cache call.
+
+    Args:
+        submissions: the models.Submission objects, with the delta_color and
+            delta_string set by the home view
+
+    Returns:
+        list: the HTML of each row, from templates/home_row.html
+    """
+    keys = OrderedDict()
+    for submission in submissions:
+        submission.age = timesince(submission.created_at)
+        keys[make_template_fragment_key('home_submission', [
+            submission.id, submission.rank, submission.rank_previous,
+            submission.age])] = submission
+
+    cached = cache.get_many(list(keys))
+    rendered = {key: render_to_string('home_row.html',
+                                      {'submission': submission})
+                for key, submission in keys.items() if key not in cached}
+    cache.set_many(rendered, settings.FRAGMENT_CACHE_TIMEOUT)
+    return [mark_safe(cached.get(key) or rendered[key]) for key in keys]
 
 
 def home(request) -> HttpResponse:
@@ -30,11 +202,13 @@ def home(request) -> HttpResponse:
 
     submissions = Submission.objects.filter(rank__gt=0).order_by('rank')
 
+    # running totals are kept up to date by ingest, see tasks.py
+    stats = SiteStats.objects.filter(id=1).first() or SiteStats()
     cumulative_stats = {
-        'submissions': Submission.objects.all().count(),
-        'score': TotalScore.objects.latest('timestamp').score if TotalScore.objects.count() > 0 else 0,
-        'comments': TotalNumComments.objects.latest('timestamp').num_comments if TotalNumComments.objects.count() > 0 else 0,
-        'subreddits': Subreddit.objects.all().count()
+        'submissions': stats.submissions,
+        'score': stats.score,
+        'comments': stats.num_comments,
+        'subreddits': stats.subreddits
     }
 
     # calculate rank deltas
@@ -58,6 +232,7 @@ def home(request) -> HttpResponse:
     response = render(request, 'home.html', {
         'page_category': 'posts',
         'submissions': submissions,
+        'rows': home_rows(submissions[:100]),
         'cumulative_stats': cumulative_stats
     })
     cache.set("home_response", response, 1200)
@@ -82,23 +257,13 @@ def subreddits(request) -> HttpResponse:
     if response is not None and settings.DEBUG is False:
         return response
 
-    subreddits = Subreddit.objects.order_by('-tracked_submissions')[:50]
-    agreeable_subreddits = Subreddit.objects \
-        .exclude(tracked_submissions__lt=30) \
-        .order_by('-average_upvote_ratio')[:5]
-    controversial_subreddits = Subreddit.objects \
-        .exclude(tracked_submissions__lt=30) \
-        .order_by('average_upvote_ratio')[:5]
-    recent_subreddits = Subreddit.objects \
-        .order_by('-created_at')[:10]
-
-    response = render(request, 'subreddits.html', {
-        'page_category': 'subreddits',
-        'subreddits': subreddits,
-        'agreeable_subreddits': agreeable_subreddits,
-        'controversial_subreddits': controversial_subreddits,
-        'recent_subreddits': recent_subreddits
-    })
+    # rankings are kept in Redis sorted sets, see leaderboards.py
+    context = leaderboards.top_subreddits()
+    context['page_category'] = 'subreddits'
+
+    # rows are cached as fragments, see templates/subreddits.html
+    context['fragment_timeout'] = settings.FRAGMENT_CACHE_TIMEOUT
+    response = render(request, 'subreddits.html', context)
     cache.set("subreddits_response", response, 1200)
     return response
 
@@ -120,26 +285,157 @@ def about(request) -> HttpResponse:
 def api(request) -> JsonResponse:
     """View for accessing the public API.
 
+    Submissions and subreddits can be requested in bulk by giving a comma
+    separated list of identifiers with the ids parameter instead of id, in
+    which case the response is a JSON object of each item's data keyed by its
+    identifier (null for identifiers which weren't found).
+
     Args:
         request: a standard HttpRequest;
         name: (HTTP parameter) type of data to retrieve;
-        id: (HTTP parameter) identifier for the data, if applicable
+        id: (HTTP parameter) identifier for the data, if applicable;
+        ids: (HTTP parameter) comma separated list of identifiers, if
+            applicable;
+        points: (HTTP parameter) if given, the maximum number of points in
+            each series, which are downsampled with helpers.lttb
 
     Returns:
         JsonResponse: a JSON formatted data set
     """
     name = request.GET.get('name', '')
-
-    if name == 'submission':
+    ids = request.GET.get('ids', '')
+
+    if ids:
+        # remove duplicate and empty ids, keeping the requested order
+        ids = list(OrderedDict.fromkeys(id for id in ids.split(',') if id))
+        ids = ids[:settings.API_MAX_IDS]
+
+        points = reports.points_parameter(request)
+        if name == 'submission':
+            data = reports.submissions(ids, points)
+        elif name == 'subreddit':
+            data = reports.subreddits(ids, points)
+        else:
+            raise Http404("Invalid name parameter")
+    elif name == 'submission':
         data = reports.submission(request)
     elif name == 'subreddit':
         data = reports.subreddit(request)
     elif name == 'cumulative':
         data = reports.cumulative(request)
+    else:
+        raise Http404("Invalid name parameter")
 
     return JsonResponse(data)
 
 
+def ranks(request) -> JsonResponse:
+    """View for polling the top 100.
+
+    Args:
+        request: a standard HttpRequest;
+        since: (HTTP parameter) the version of the top 100 the client already
+            has, if any
+
+    Returns:
+        JsonResponse: the submissions whose rank, score or number of comments
+            changed since that version, those which entered and those which
+            exited, or the full top 100 if the version is unknown; each with
+            the current version
+    """
+    version = request.GET.get('since', '') or None
+
+    # versions are "<epoch>:<number>", see frontpage.next_version
+    if version is not None and not re.match(r'^[0-9a-f]+:[0-9]+$', version):
+        # should probably be 400
+        raise Http404("Invalid since parameter")
+
+    return JsonResponse(frontpage.since(version))
+
+
+def stream(request) -> StreamingHttpResponse:
+    """View for live updates of the home page.
+
+    Sends a server-sent event with the changes to the top 100 whenever ingest
+    finishes a cycle (see frontpage.publish_cycle), so that clients can update
+    the page in place rather than reloading it.
+
+    Args:
+        request: a standard HttpRequest
+
+    Returns:
+        StreamingHttpResponse: a text/event-stream which closes after
+            settings.STREAM_DURATION seconds
+    """
+    response = StreamingHttpResponse(frontpage.events(),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def suggest(request) -> JsonResponse:
+    """View for search box autocompletion.
+
+    Completes subreddit names from an in-process trie, and submission titles
+    from a trigram index, without running a full search.
+
+    Args:
+        request: a standard HttpRequest;
+        q: (HTTP parameter) the partially typed query
+
+    Returns:
+        JsonResponse: matching subreddit names, and the ids and titles of
+            matching submissions
+    """
+    query = request.GET.get('q', '').strip()[:100]
+    if not query:
+        return JsonResponse({'subreddits': [], 'submissions': []})
+
+    return JsonResponse({
+        'subreddits': autocomplete.subreddits(query),
+        'submissions': autocomplete.submissions(query)
+    })
+
+
+def export(request) -> StreamingHttpResponse:
+    """View for exporting complete time series.
+
+    Unlike the API, rows are streamed to the client as they are read from the
+    database, so memory use doesn't grow with the length of the series.
+
+    Args:
+        request: a standard HttpRequest;
+        format: (HTTP parameter) the output format, ndjson (default) or csv;
+        (see exports.series_querysets for the remaining parameters)
+
+    Returns:
+        StreamingHttpResponse: one row per line, in the requested format
+    """
+    format = request.GET.get('format', 'ndjson')
+    querysets = exports.series_querysets(request)
+
+    if format == 'csv':
+        response = StreamingHttpResponse(exports.csv_lines(querysets),
+                                         content_type='text/csv')
+    elif format == 'ndjson':
+        response = StreamingHttpResponse(exports.ndjson(querysets),
+                                         content_type='application/x-ndjson')
+    else:
+        raise Http404("Invalid format parameter")
+
+    # ids are only checked for the data sets which use them, so leave them
+    # out otherwise, and keep anything else out of the header
+    name = request.GET.get('name', '')
+    filename = '_'.join(filter(None, [
+        name, request.GET.get('id', '') if name != 'cumulative' else '',
+        request.GET.get('timerange', '')]))
+    filename = re.sub(r'[^\w-]', '_', filename)
+    response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (
+        filename, format)
+    return response
+
+
 def submission(request, id) -> HttpResponse:
     """View for an individual submission's page.
 
@@ -155,7 +451,7 @@ def submission(request, id) -> HttpResponse:
         HttpResponse: a standard HttpResponse from templates/submission.html
     """
     try:
-        submission = Submission.objects.get(id=id)
+        submission = Submission.objects.select_related('subreddit').get(id=id)
     except Submission.DoesNotExist:
         raise Http404("Submission was not found")
 
@@ -164,16 +460,13 @@ def submission(request, id) -> HttpResponse:
     if response is not None and settings.DEBUG is False:
         return response
 
-    submission_scores = SubmissionScore.objects.filter(
-        submission=submission).order_by('timestamp')
-
-    # lifetime and rise time
-    lifetime_delta = submission_scores[len(
-        submission_scores) - 1].timestamp - submission_scores[0].timestamp
-    lifetime = time.strftime('%H:%M:%S', time.gmtime(lifetime_delta.seconds))
-
-    rise_time_delta = submission_scores[0].timestamp - submission.created_at
-    rise_time = time.strftime('%H:%M:%S', time.gmtime(rise_time_delta.seconds))
+    # lifetime and rise time, from the tracking window kept by ingest
+    lifetime = rise_time = format_duration(None)
+    if submission.first_seen_at is not None:
+        lifetime = format_duration(
+            submission.last_seen_at - submission.first_seen_at)
+        rise_time = format_duration(
+            submission.first_seen_at - submission.created_at)
 
     response = render(request, 'submission.html', {
         'page_category': 'posts',
@@ -199,33 +492,29 @@ def subreddit(request, subreddit) -> HttpResponse:
     Returns:
         HttpResponse: a standard HttpResponse from templates/subreddit.html
     """
-    try:
-        subreddit = Subreddit.objects.get(name__iexact=subreddit)
-    except Subreddit.DoesNotExist:
+    name = canonical_subreddit(subreddit)
+    if name is None:
         raise Http404("Subreddit was not found")
 
     # try to get response from cache
-    response = cache.get("subreddit_response_%s" % subreddit.name)
+    response = cache.get("subreddit_response_%s" % name)
     if response is not None and settings.DEBUG is False:
         return response
 
-    submissions = Submission.objects.filter(subreddit=subreddit)
-    top_submissions = submissions.order_by('-score')[:50]
-    recent_submissions = submissions.order_by('-created_at')[:10]
-    agreeable_submissions = submissions.order_by('-upvote_ratio')[:5]
-    controversial_submissions = submissions.order_by('upvote_ratio')[:5]
+    try:
+        subreddit = Subreddit.objects.get(name=name)
+    except Subreddit.DoesNotExist:
+        raise Http404("Subreddit was not found")
 
-    if len(submissions) == 0:
+    if not Submission.objects.filter(subreddit=subreddit).exists():
         raise Http404("Subreddit has no recorded submissions")
 
-    response = render(request, 'subreddit.html', {
-        'page_category': 'subreddits',
-        'subreddit': subreddit,
-        'top_submissions': top_submissions,
-        'recent_submissions': recent_submissions,
-        'agreeable_submissions': agreeable_submissions,
-        'controversial_submissions': controversial_submissions
-    })
+    # rankings are kept in Redis sorted sets, see leaderboards.py
+    context = leaderboards.top_submissions(subreddit.name)
+    context['page_category'] = 'subreddits'
+    context['subreddit'] = subreddit
+
+    response = render(request, 'subreddit.html', context)
     cache.set("subreddit_response_%s" % subreddit.name, response, 1200)
     return response
 
@@ -237,12 +526,19 @@ def search(request) -> HttpResponse:
     submissions which wholly contain the given query. Additionally retrieves
     a list of subreddits based on the subreddit of top results.
 
+    The ids of the results are briefly cached under the normalized query and
+    filters. The cache key includes a generation number which ingest
+    increments whenever it adds submissions, so new submissions are found
+    straight away.
+
     Args:
         request: a standard HttpRequest;
         query: (HTTP parameter) the search query;
         order_by: (HTTP parameter) how to sort the resulting submissions;
         time: (HTTP parameter) time frame which submissions must be within;
-        from_subreddits: (HTTP parameter) comma separated list of subreddits
+        from_subreddits: (HTTP parameter) comma separated list of subreddits;
+        page: (HTTP parameter) the page of results to show, with
+            settings.SEARCH_PAGE_SIZE results per page
 
     Returns:
         HttpResponse: a standard HttpResponse from templates/search.html
@@ -268,65 +564,42 @@ def search(request) -> HttpResponse:
         return redirect('/submission/%s' % submission_id)
     else:
         if len(query) < 300:
-            # get all matching submissions
-            submissions = Submission.objects.filter(title__search=query)
-
-            # order submissions
-            # order_by == 'relevance' is just the default order
-            if order_by == 'karma':
-                submissions = submissions.order_by('-score')
-            elif order_by == 'comments':
-                submissions = submissions.order_by('-num_comments')
-
-            # remove submissions not in time frame
-            if time and time != 'all':
-                current_time = datetime.utcnow()
-                if time == 'today':
-                    prev_time = current_time - timedelta(days=1)
-                elif time == 'week':
-                    prev_time = current_time - timedelta(weeks=1)
-                elif time == 'month':
-                    prev_time = current_time - timedelta(days=30)
-                elif time == 'year':
-                    prev_time = current_time - timedelta(days=365)
-                else:
-                    prev_time = current_time
-                submissions = submissions.filter(created_at__gte=prev_time)
-
-            # remove submissions not in requested subreddits
-            if from_subreddits is not None and from_subreddits is not '':
-                subreddit_objs = ['']
-                for from_subreddit in from_subreddits.split(','):
-                    try:
-                        subreddit_objs.append(Subreddit.objects.get(
-                            name__iexact=from_subreddit))
-                    except Subreddit.DoesNotExist:
-                        continue
-
-                # create query which ORs subreddit matches
-                query_objs = Q()
-                for subreddit in subreddit_objs:
-                    query_objs.add(Q(subreddit=subreddit), Q.OR)
-
-                submissions = submissions.filter(query_objs)
-
-            # get relevant subreddits
+            # try to get the ids of matching submissions from cache
+            key = search_cache_key(cache.get_or_set("search_generation", 0,
+                                                    None),
+                                   query, order_by, time, from_subreddits)
+            results = cache.get(key)
+            if results is None or settings.DEBUG is True:
+                results = search_results(query, order_by, time,
+                                         from_subreddits)
+                cache.set(key, results, settings.SEARCH_CACHE_TIMEOUT)
+            count = results['count']
+            relevant_subreddits = results['relevant_subreddits']
+
+            # only retrieve the submissions on the requested page
+            paginator = Paginator(results['ids'], settings.SEARCH_PAGE_SIZE)
+            page = paginator.get_page(request.GET.get('page'))
+            submissions = Submission.objects.in_bulk(page.object_list)
+            submissions = [submissions[id] for id in page.object_list
+                           if id in submissions]
+        else:
+            count = 0
+            page = None
+            submissions = []
             relevant_subreddits = []
-            for term in query.split(' '):
-                try:
-                    subreddit = Subreddit.objects.get(name__iexact=term)
-                    relevant_subreddits.append(subreddit.name)
-                except Subreddit.DoesNotExist:
-                    continue
-            for submission in submissions:
-                if submission.subreddit.name not in relevant_subreddits:
-                    relevant_subreddits.append(submission.subreddit.name)
+
+        # query string of the current search, for links to other pages
+        parameters = request.GET.copy()
+        parameters.pop('page', None)
 
         return render(request, 'search.html', {
+            'count': count,
+            'page': page,
             'submissions': submissions,
+            'parameters': parameters.urlencode(),
             'query': query,
             'order_by': order_by,
             'time': time,
             'from_subreddits': from_subreddits,
-            'relevant_subreddits': relevant_subreddits[:8]
+            'relevant_subreddits': relevant_subreddits
         })
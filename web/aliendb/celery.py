@@ -21,5 +21,10 @@ app.conf.beat_schedule = {
         'schedule': 1200.0,
         'args': ()
     },
+    'poll-submissions': {
+        'task': 'aliendb.apps.analytics.tasks.poll_submissions',
+        'schedule': float(settings.POLL_DISPATCH_INTERVAL),
+        'args': ()
+    },
 }
 app.conf.timezone = 'UTC'
@@ -56,7 +56,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -64,6 +63,16 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # compile each template once per process, except when debugging
+            'loaders': [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ] if DEBUG else [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -102,29 +111,138 @@ STATICFILES_FINDERS = (
     'django.contrib.staticfiles.finders.AppDirectoriesFinder',
 )
 
+# maps built assets to their fingerprinted names, written by compress.sh
+ASSET_MANIFEST = os.path.join(STATIC_ROOT, 'manifest.json')
+
 # Caching
 
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "aliendb.apps.analytics.cache.TwoTierRedisCache",
         "LOCATION": "redis://redis:6379/1",
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            # pack report series and compress large values
+            "SERIALIZER": "aliendb.apps.analytics.cache.SeriesSerializer",
+            "COMPRESSOR": "aliendb.apps.analytics.cache.ThresholdCompressor",
+            "COMPRESS_MIN_LENGTH": 1024,
+            # in-process LRU tier kept in front of redis by each worker
+            "LOCAL_MAX_ENTRIES": 256,
+            "LOCAL_TIMEOUT": 10,
+            "INVALIDATION_CHANNEL": "cache_invalidation",
         }
     }
 }
 
+# redis database which tests and benchmark_ingest use instead, since they
+# flush it, see cache.isolated_settings
+TEST_CACHE_LOCATION = "redis://redis:6379/2"
+TEST_RUNNER = 'aliendb.apps.analytics.tests.common.runner.IsolatedCacheRunner'
+
+# API
+
+# maximum number of items which can be requested at once with ?ids=
+API_MAX_IDS = 100
+
+# maximum number of points which series can be downsampled to with ?points=
+API_MAX_POINTS = 2000
+
+# number of results on each page of /search
+SEARCH_PAGE_SIZE = 50
+
+# maximum number of results which can be paged through for a search, and how
+# long (in seconds) the results of a search are cached for
+SEARCH_MAX_RESULTS = 1000
+SEARCH_CACHE_TIMEOUT = 120
+
+# number of seconds rendered rows of listing pages are cached for; rows are
+# keyed by the values they show, so changed rows are rendered again sooner
+FRAGMENT_CACHE_TIMEOUT = 1200
+
+# maximum number of suggestions of each kind returned by /autocomplete
+AUTOCOMPLETE_LIMIT = 10
+
+# redis channel which ingest publishes changes to the top 100 on, and how
+# long (in seconds) /stream keeps each connection open, sends keepalives and
+# tells clients to wait (in ms) before reconnecting
+FRONTPAGE_CHANNEL = "frontpage"
+
+# number of recent versions of the top 100 which /frontpage?since= can send
+# just the changes from
+FRONTPAGE_VERSIONS = 12
+STREAM_DURATION = 300
+STREAM_KEEPALIVE = 15
+STREAM_RETRY = 5000
+
+# bounds (in seconds) of how often each submission in the top 100 is polled,
+# how much activity (see scheduler.poll_interval) each poll aims to see, how
+# often due submissions are dispatched and the most polled at once
+POLL_MIN_INTERVAL = 120
+POLL_MAX_INTERVAL = 3600
+POLL_TARGET_CHANGE = 500
+POLL_DISPATCH_INTERVAL = 60
+POLL_BATCH_SIZE = 100
+
+# number of seconds an ingestion cycle has to save its new submissions before
+# it is abandoned, see tasks.get_top_submissions
+PIPELINE_CYCLE_TIMEOUT = 3600
+
+# number of seconds an ingestion cycle keeps its lock without making progress,
+# after which the next cycle may start, see cycles.py
+CYCLE_LOCK_TIMEOUT = 300
+
+# most requests to Reddit which each fetch worker makes at once
+FETCH_MAX_IN_FLIGHT = 8
+
+# budget of requests to Reddit shared by all workers, see ratelimit.py:
+# RATELIMIT_REQUESTS every RATELIMIT_PERIOD seconds, in bursts of at most
+# RATELIMIT_BURST, keeping RATELIMIT_RESERVE tokens back from the listing, hot
+# and cold priorities; polled submissions ranked up to RATELIMIT_HOT_RANK are
+# hot
+RATELIMIT_REQUESTS = 60
+RATELIMIT_PERIOD = 60
+RATELIMIT_BURST = 60
+RATELIMIT_RESERVE = (0, 5, 20)
+RATELIMIT_HOT_RANK = 25
+
+# number of rows read from the database at a time by /export
+EXPORT_CHUNK_SIZE = 2000
+
 # Celery
 # create queues
 task_default_queue = 'default'
 task_queues = (
     Queue('default', Exchange('default'), routing_key='default'),
+    Queue('fetch', Exchange('fetch'), routing_key='fetch'),
+    Queue('analyze', Exchange('analyze'), routing_key='analyze'),
+    Queue('persist', Exchange('persist'), routing_key='persist'),
+    Queue('finalize', Exchange('finalize'), routing_key='finalize'),
 )
 
+# route each stage of ingestion to its own queue, see tasks.py
+task_routes = {
+    'aliendb.apps.analytics.tasks.get_top_submissions': {'queue': 'fetch'},
+    'aliendb.apps.analytics.tasks.poll_submissions': {'queue': 'fetch'},
+    'aliendb.apps.analytics.tasks.fetch_submissions': {'queue': 'fetch'},
+    'aliendb.apps.analytics.tasks.fetch_submission': {'queue': 'fetch'},
+    'aliendb.apps.analytics.tasks.analyze_submission': {'queue': 'analyze'},
+    'aliendb.apps.analytics.tasks.persist_listing': {'queue': 'persist'},
+    'aliendb.apps.analytics.tasks.persist_submission': {'queue': 'persist'},
+    'aliendb.apps.analytics.tasks.finalize_cycle': {'queue': 'finalize'},
+}
+
+# django.conf.settings only exposes upper case names, which celery reads as
+# its older setting names
+CELERY_QUEUES = task_queues
+CELERY_ROUTES = task_routes
+
 # sensible settings for celery
 task_always_eager = False
 task_acks_late = True
 task_publish_retry = True
+# tasks are acknowledged once they've run, so those of a worker that dies are
+# redelivered and resume where they stopped, see tasks.resumes()
+CELERY_ACKS_LATE = task_acks_late
 worker_disable_rate_limits = False
 
 # ignore result by default - can be changed at the task level
@@ -137,6 +255,7 @@ accept_content = ['application/json']
 
 worker_hijack_root_logger = False
 worker_prefetch_multiplier = 1
+CELERYD_PREFETCH_MULTIPLIER = worker_prefetch_multiplier
 worker_max_tasks_per_child = 1000
 
 # define rabbitmq broker
@@ -19,3 +19,8 @@ cat highcharts.js \
   bootstrap.min.js \
   custom.js \
   | python -m rjsmin > main.min.js
+
+# write content-hashed, precompressed copies and the manifest read by the
+# {% asset %} template tag
+cd $ROOT
+python fingerprint.py static css/main.min.css js/main.min.js
@@ -0,0 +1,60 @@
+"""Fingerprints built static assets for far-future caching.
+
+Copies each asset to a name containing a hash of its content, writes
+precompressed .gz (and, if brotli is installed, .br) siblings for nginx to
+serve as they are, and records the hashed names in a manifest which the
+{% asset %} template tag reads.
+
+Usage: python fingerprint.py STATIC_ROOT ASSET [ASSET ...]
+"""
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def fingerprint(root, path) -> str:
+    """Writes the fingerprinted and precompressed copies of an asset.
+
+    Args:
+        root: the static files directory;
+        path: the asset's path, relative to root
+
+    Returns:
+        str: the fingerprinted path, relative to root
+    """
+    with open(os.path.join(root, path), 'rb') as asset_file:
+        content = asset_file.read()
+
+    name, extension = os.path.splitext(path)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    hashed_path = '%s.%s%s' % (name, digest, extension)
+
+    hashed_file = os.path.join(root, hashed_path)
+    with open(hashed_file, 'wb') as output:
+        output.write(content)
+    with open(hashed_file + '.gz', 'wb') as output:
+        output.write(gzip.compress(content, 9))
+    if brotli is not None:
+        with open(hashed_file + '.br', 'wb') as output:
+            output.write(brotli.compress(content))
+
+    return hashed_path
+
+
+def main(root, paths):
+    manifest = {path: fingerprint(root, path) for path in paths}
+    with open(os.path.join(root, 'manifest.json'), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        sys.exit(__doc__)
+    main(sys.argv[1], sys.argv[2:])
@@ -622,4 +622,46 @@ function cumulative_activity_front_chart(data) {
             }]
         }
     });
-}
\ No newline at end of file
+}
+function frontpage_updates() {
+    if (!window.EventSource) {
+        return;
+    }
+
+    // apply changes to the top 100 as ingest publishes them
+    var source = new EventSource('/stream');
+    source.addEventListener('frontpage', function (event) {
+        var changes = JSON.parse(event.data);
+        var rows = $('#frontpage');
+
+        $.each(changes.exited, function (i, id) {
+            rows.find('tr[data-id="' + id + '"]').remove();
+        });
+
+        $.each(changes.entered, function (id, stats) {
+            var details = changes.details[id];
+            rows.append($('<tr>').attr('data-id', id).append(
+                $('<td id="rank">').text(stats[0]),
+                $('<td id="delta">').append($('<span>')),
+                $('<td id="title">').append(
+                    $('<a>').attr('href', '/submission/' + id).text(details.title),
+                    $('<br>'),
+                    $('<span>').text('submitted ' + moment(details.created_at).fromNow())),
+                $('<td id="subreddit" class="d-none d-md-table-cell">').append(
+                    $('<a>').attr('href', '/subreddit/' + details.subreddit).text('r/' + details.subreddit))));
+        });
+
+        $.each($.extend({}, changes.entered, changes.changed), function (id, stats) {
+            var row = rows.find('tr[data-id="' + id + '"]');
+            var delta = (parseInt(row.find('#rank').text()) || stats[0]) - stats[0];
+            var shape = delta > 0 ? '▲' : delta < 0 ? '▼' : '▬';
+            var color = delta > 0 ? 'green' : delta < 0 ? 'red' : 'orange';
+            row.find('#rank').text(stats[0]);
+            row.find('#delta span').attr('class', color).text(shape + delta);
+        });
+
+        rows.append(rows.children('tr').sort(function (a, b) {
+            return parseInt($(a).find('#rank').text()) - parseInt($(b).find('#rank').text());
+        }));
+    });
+}